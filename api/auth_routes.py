@@ -1,6 +1,8 @@
 """
 用户认证相关的API路由
 """
+import asyncio
+
 from fastapi import APIRouter, HTTPException, status, Response, Request
 from loguru import logger
 
@@ -29,7 +31,8 @@ async def register_user(request: UserRegisterRequest, response: Response):
         all_users = user_manager.get_all_users()
         is_first_user = len(all_users) == 0
 
-        result = user_manager.register_user(request.username, request.password)
+        # scrypt 计算耗时较长，放到线程池中执行，避免阻塞事件循环
+        result = await asyncio.to_thread(user_manager.register_user, request.username, request.password)
 
         if not result["success"]:
             raise HTTPException(status_code=400, detail=result["message"])
@@ -65,7 +68,8 @@ async def login_user(request: UserLoginRequest, response: Response):
     """用户登录"""
     try:
         user_manager = get_user_manager()
-        result = user_manager.login_user(request.username, request.password)
+        # 密码校验（包括用户不存在时的等耗时哈希）放到线程池中执行，避免阻塞事件循环
+        result = await asyncio.to_thread(user_manager.login_user, request.username, request.password)
 
         if not result.get("success"):
             # 根据错误类型返回不同的错误信息
@@ -108,7 +112,8 @@ async def regenerate_api_key(request: UserRegenerateApiKeyRequest):
     """重新生成API密钥"""
     try:
         user_manager = get_user_manager()
-        result = user_manager.regenerate_api_key(request.user_id, request.password)
+        # 需要校验密码（scrypt），放到线程池中执行，避免阻塞事件循环
+        result = await asyncio.to_thread(user_manager.regenerate_api_key, request.user_id, request.password)
 
         if not result:
             raise HTTPException(
@@ -182,6 +182,11 @@ class Pan123TokenResponse(BaseModel):
     message: Optional[str] = Field(None, description="提示信息")
 
 
+class Pan123ConcurrencyRequest(BaseModel):
+    """123云盘请求并发上限设置请求"""
+    limit: int = Field(..., description="并发上限", ge=1, le=100)
+
+
 # ========== 视频信息模型 ==========
 
 class VideoInfo(BaseModel):
@@ -216,3 +221,4 @@ class VideoListResponse(BaseModel):
     page: int = Field(1, description="当前页码")
     page_size: int = Field(20, description="每页数量")
     total_pages: int = Field(1, description="总页数")
+    next_cursor: Optional[str] = Field(None, description="下一页游标（传入 cursor 参数可跳过 OFFSET 扫描）")
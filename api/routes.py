@@ -21,12 +21,13 @@ from api.models import (
     FolderCheckResponse,
     FolderFileInfo,
     Pan123TokenResponse,
+    Pan123ConcurrencyRequest,
     VideoInfo,
     VideoCreateRequest,
     VideoListResponse
 )
 from services.task_manager import get_task_manager, TaskManager
-from services.pan123_service import Pan123AuthService, Pan123FolderService, Pan123AndroidFolderService, Pan123DownloadService
+from services.pan123_service import Pan123AuthService, Pan123FolderService, Pan123DownloadService, PAN123_LIMIT, get_android_folder_service
 from services.auth_manager import get_auth_manager
 from services.user_manager import get_user_manager
 from config import get_config, get_config_manager, get_user_config
@@ -91,7 +92,7 @@ async def delete_cloud_incomplete_video(
     只有当完善版本和不完善版本都存在于云盘时才删除不完善版本
     """
     try:
-        folder_service = Pan123AndroidFolderService(auth_service)
+        folder_service = get_android_folder_service(auth_service)
         
         # 查找文件夹
         folder_id = await folder_service.find_folder(series_name, 0)
@@ -170,7 +171,7 @@ async def submit_video(request: VideoSubmitRequest, user_id: str = Depends(requi
         auth_service = await auth_manager.get_auth_service(user_id)
 
         # 创建年月文件夹结构（使用 Android 客户端 API）
-        folder_service = Pan123AndroidFolderService(auth_service)
+        folder_service = get_android_folder_service(auth_service)
         root_dir_id = request.parent_dir_id or config.pan123.root_dir_id
 
         # 1. 查找或创建年份文件夹
@@ -539,7 +540,7 @@ async def check_folder(request: FolderCheckRequest, user_id: str = Depends(requi
         import re as regex_module
         folder_name_clean = regex_module.sub(r'\[中字後補\]\s*', '', request.folder_name).strip()
 
-        folder_service = Pan123AndroidFolderService(auth_service)
+        folder_service = get_android_folder_service(auth_service)
         parent_dir_id = request.parent_dir_id or config.pan123.root_dir_id
 
         # 记录用户日志：开始查找文件夹
@@ -880,6 +881,31 @@ async def update_config(request: ConfigUpdateRequest, user: dict = Depends(requi
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/admin/pan123-concurrency")
+async def set_pan123_concurrency(request: Pan123ConcurrencyRequest, user: dict = Depends(require_webui_auth)):
+    """运行时调整123云盘请求并发上限（仅管理员，重启后恢复为 PAN123_MAX_CONCURRENCY）"""
+    try:
+        user_manager = get_user_manager()
+        with user_manager.db.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT username FROM users WHERE user_id = ?", (user['user_id'],))
+            row = cursor.fetchone()
+            if not row:
+                raise HTTPException(status_code=404, detail="用户不存在")
+            if row["username"] != "admin":
+                raise HTTPException(status_code=403, detail="只有管理员可以调整并发上限")
+
+        await PAN123_LIMIT.set_limit(request.limit)
+        logger.info(f"123云盘请求并发上限已调整为 {PAN123_LIMIT.limit}")
+        return {"success": True, "limit": PAN123_LIMIT.limit, "active": PAN123_LIMIT.active}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"调整并发上限失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/config/reset")
 async def reset_config(user: dict = Depends(require_webui_auth)):
     """重置用户配置为默认值"""
@@ -891,14 +917,8 @@ async def reset_config(user: dict = Depends(require_webui_auth)):
         auth_manager = get_auth_manager()
         await auth_manager.get_auth_service(user_id, force_refresh=True)
 
-        # 删除用户配置，然后重新初始化为默认值
-        with user_manager.db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM user_configs WHERE user_id = ?", (user_id,))
-            conn.commit()
-
-        # 重新初始化用户配置
-        user_manager._init_user_config(user_id)
+        # 清空用户配置，然后重新初始化为默认值
+        user_manager.reset_user_config(user_id)
 
         logger.info(f"用户 {user_id} 配置已重置为默认值")
         return {"success": True, "message": "配置已重置为默认值"}
@@ -943,12 +963,12 @@ async def list_folders_public(
         auth_service = await auth_manager.get_auth_service(user_id)
 
         # 获取文件夹服务（使用 Android 客户端 API，无需开发者权益包）
-        folder_service = Pan123AndroidFolderService(auth_service)
+        folder_service = get_android_folder_service(auth_service)
 
         # 获取文件列表（支持大 limit）
-        # 如果 limit > 100，使用分批加载获取所有文件
+        # 如果 limit > 100，逐页加载所有文件，边取边过滤，只保留文件夹
         if limit > 100:
-            files = await folder_service.list_all_files(parent_id)
+            files = [f async for f in folder_service.iter_files(parent_id) if f.type == 1]
         else:
             files = await folder_service.list_files(parent_id, limit=limit)
 
@@ -997,12 +1017,12 @@ async def list_folders(
         auth_service = await auth_manager.get_auth_service(user_id)
 
         # 获取文件夹服务（使用 Android 客户端 API，无需开发者权益包）
-        folder_service = Pan123AndroidFolderService(auth_service)
+        folder_service = get_android_folder_service(auth_service)
 
         # 获取文件列表（支持大 limit）
-        # 如果 limit > 100，使用分批加载获取所有文件
+        # 如果 limit > 100，逐页加载所有文件，边取边过滤，只保留文件夹
         if limit > 100:
-            files = await folder_service.list_all_files(parent_id)
+            files = [f async for f in folder_service.iter_files(parent_id) if f.type == 1]
         else:
             files = await folder_service.list_files(parent_id, limit=limit)
 
@@ -1056,7 +1076,7 @@ async def create_folder(
         auth_service = await auth_manager.get_auth_service(user_id)
 
         # 获取文件夹服务（使用 Android 客户端 API，无需开发者权益包）
-        folder_service = Pan123AndroidFolderService(auth_service)
+        folder_service = get_android_folder_service(auth_service)
 
         # 创建文件夹
         dir_id = await folder_service.create_folder(name.strip(), parent_id)
@@ -1104,7 +1124,7 @@ async def trash_folder(
         auth_service = await auth_manager.get_auth_service(user_id)
 
         # 获取文件夹服务（使用 Android 客户端 API，无需开发者权益包）
-        folder_service = Pan123AndroidFolderService(auth_service)
+        folder_service = get_android_folder_service(auth_service)
 
         # 调用删除API（移至回收站）
         success = await folder_service.trash_files(file_ids)
@@ -1312,8 +1332,11 @@ async def get_pan123_token(user_id: str = Depends(require_user_id_from_any_sourc
         )
 
         # 强制获取新token（不使用缓存的旧token）
-        token = await auth_service.get_access_token()
-        expired_at = auth_service._token_expires_at
+        try:
+            token = await auth_service.get_access_token()
+            expired_at = auth_service._token_expires_at
+        finally:
+            await auth_service.aclose()
 
         if not token or not expired_at:
             return Pan123TokenResponse(
@@ -1419,9 +1442,9 @@ async def save_video_info(request: VideoCreateRequest, user_id: str = Depends(re
             "rename_name": request.rename_name
         }
 
-        success = db.create_or_update_video(video_data)
+        video = db.create_or_update_video(video_data)
 
-        if success:
+        if video:
             return {"success": True, "message": "视频信息保存成功"}
         else:
             raise HTTPException(status_code=500, detail="保存视频信息失败")
@@ -1646,9 +1669,13 @@ async def list_videos(
     year: Optional[str] = None,
     month: Optional[str] = None,
     time_range: Optional[str] = None,
+    cursor: Optional[str] = None,
     user_id: str = Depends(require_webui_auth)
 ):
-    """获取视频列表（显示所有用户的视频，支持搜索、分页、排序、时间筛选）"""
+    """获取视频列表（显示所有用户的视频，支持搜索、分页、排序、时间筛选）
+
+    传入上一页返回的 next_cursor 作为 cursor 时使用键集分页，深分页不再扫描跳过的行。
+    """
     try:
         from services.database import get_database
         db = get_database()
@@ -1672,7 +1699,8 @@ async def list_videos(
             page_size=page_size,
             sort_by=sort_by,
             sort_order=sort_order,
-            time_filter=time_filter
+            time_filter=time_filter,
+            after=cursor
         )
 
         # 检查本地covers文件夹，更新封面URL
@@ -1694,9 +1722,12 @@ async def list_videos(
             total=result["total"],
             page=result["page"],
             page_size=result["page_size"],
-            total_pages=result["total_pages"]
+            total_pages=result["total_pages"],
+            next_cursor=result["next_cursor"]
         )
 
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"获取视频列表失败: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1811,7 +1842,7 @@ async def push_video_cover(video_id: str, user: dict = Depends(require_webui_aut
             poster_filename = poster_filename[:250] + ".jpg"
 
         # 查找视频文件所在的目录（使用 Android 客户端 API）
-        folder_service = Pan123AndroidFolderService(auth_service)
+        folder_service = get_android_folder_service(auth_service)
         root_dir_id = config.pan123.root_dir_id
 
         target_folder_id = None
@@ -1855,7 +1886,7 @@ async def push_video_cover(video_id: str, user: dict = Depends(require_webui_aut
         # 在目标目录中上传封面
         upload_url = "https://openapi-upload.123242.com"
 
-        import aiohttp
+        from services.http_client import get_session
 
         data = aiohttp.FormData()
         data.add_field('parentFileID', str(target_folder_id))
@@ -1869,21 +1900,21 @@ async def push_video_cover(video_id: str, user: dict = Depends(require_webui_aut
             'Platform': 'open_platform'
         }
 
-        async with aiohttp.ClientSession() as session:
-            async with session.post(upload_url + '/upload/v2/file/single/create', data=data, headers=headers) as response:
-                result = await response.json()
+        session = await get_session()
+        async with session.post(upload_url + '/upload/v2/file/single/create', data=data, headers=headers) as response:
+            result = await response.json()
 
-                if result.get('code') == 0:
-                    logger.info(f"封面上传成功: {poster_filename}, 文件ID: {result['data']['fileID']}")
-                    return {
-                        "success": True,
-                        "message": f"封面上传成功: {poster_filename}",
-                        "file_id": result['data']['fileID']
-                    }
-                else:
-                    error_msg = result.get('message', '未知错误')
-                    logger.error(f"封面上传失败: {error_msg}")
-                    raise HTTPException(status_code=500, detail=f"上传失败: {error_msg}")
+            if result.get('code') == 0:
+                logger.info(f"封面上传成功: {poster_filename}, 文件ID: {result['data']['fileID']}")
+                return {
+                    "success": True,
+                    "message": f"封面上传成功: {poster_filename}",
+                    "file_id": result['data']['fileID']
+                }
+            else:
+                error_msg = result.get('message', '未知错误')
+                logger.error(f"封面上传失败: {error_msg}")
+                raise HTTPException(status_code=500, detail=f"上传失败: {error_msg}")
 
     except HTTPException:
         raise
@@ -1925,7 +1956,8 @@ async def export_videos(user: dict = Depends(require_webui_auth)):
         result = db.get_all_videos(
             user_id=None,  # 不限制用户，导出所有视频
             page=1,
-            page_size=100000  # 导出所有视频
+            page_size=100000,  # 导出所有视频
+            include_total=False
         )
 
         videos = result["videos"]
@@ -2040,6 +2072,7 @@ async def import_videos(request: VideoImportRequest, user: dict = Depends(requir
             cursor.execute("SELECT video_id FROM videos")
             existing_video_ids = {row[0] for row in cursor.fetchall()}
 
+        new_videos = []
         for video_data in request.videos:
             try:
                 video_id = video_data.get("video_id")
@@ -2071,14 +2104,10 @@ async def import_videos(request: VideoImportRequest, user: dict = Depends(requir
                     "incomplete": video_data.get("incomplete", 1)  # 旧数据默认为完善视频
                 }
 
-                # 保存视频
-                success = db.create_or_update_video(video)
-                if success:
-                    imported_count += 1
-                    # 添加到已存在列表，防止重复导入
-                    existing_video_ids.add(video_id)
-                else:
-                    failed_count += 1
+                # 加入待保存列表，循环结束后批量写入
+                new_videos.append(video)
+                # 添加到已存在列表，防止重复导入
+                existing_video_ids.add(video_id)
 
                 # 处理封面图片（如果有base64数据）
                 cover_data = video_data.get("cover_data")
@@ -2114,6 +2143,13 @@ async def import_videos(request: VideoImportRequest, user: dict = Depends(requir
                 logger.warning(f"导入视频失败: {video_data.get('video_id', 'unknown')}, 错误: {e}")
                 failed_count += 1
 
+        # 批量保存视频（单个事务）
+        if new_videos:
+            if db.create_or_update_videos_bulk(new_videos):
+                imported_count += len(new_videos)
+            else:
+                failed_count += len(new_videos)
+
         logger.info(f"视频导入完成: 导入 {imported_count}, 跳过 {skipped_count}, 失败 {failed_count}, 封面 {covers_imported}")
 
         return {
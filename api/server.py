@@ -16,8 +16,14 @@ import uvicorn
 
 from api import routes
 from api import auth_routes
-from config import get_config
+from config import get_config, get_config_manager
 from services.monitor_service import MonitorService
+from services.chinese_converter import warmup_converter
+from services.database import get_database
+from services.http_client import close_session
+from services.auth_manager import get_auth_manager
+from services.task_manager import get_task_manager
+from services.user_manager import get_user_manager
 
 
 # 禁用缓存的静态文件类
@@ -44,9 +50,17 @@ async def lifespan(app: FastAPI):
     config = get_config()
     logger.info(f"启动服务器: {config.server.host}:{config.server.port}")
 
+    # 后台预加载简繁体对照表，避免首次搜索时阻塞请求
+    warmup_converter()
+
     # 注意：不在启动时自动验证token，因为现在支持多用户
     # token会在用户首次调用API时按需加载和验证
 
+    # 启动配置合并写入任务
+    config_flusher = asyncio.create_task(get_config_manager().run_flusher())
+    # 启动最后登录时间合并写入任务
+    login_flusher = asyncio.create_task(get_user_manager().run_flusher())
+
     # 启动监控服务
     monitor_service = MonitorService()
     asyncio.create_task(monitor_service.start())
@@ -64,6 +78,16 @@ async def lifespan(app: FastAPI):
                 await monitor_service.stop()
             except Exception as e:
                 logger.error(f"停止监控服务时出错: {e}")
+        for flusher in (config_flusher, login_flusher):
+            flusher.cancel()
+            try:
+                await flusher
+            except asyncio.CancelledError:
+                pass
+        await get_task_manager().aclose()
+        await close_session()
+        await get_auth_manager().aclose_all()
+        get_database().close_all()
 
 
 # UI版本号 (每次更新UI时修改此值)
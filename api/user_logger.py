@@ -5,6 +5,7 @@
 from pathlib import Path
 from loguru import logger
 import os
+import threading
 
 # 确保用户日志目录存在
 _user_logs_dir = Path(__file__).parent.parent / "logs"
@@ -12,6 +13,8 @@ _user_logs_dir.mkdir(exist_ok=True)
 
 # 已添加的用户handler集合（存储handler_id）
 _added_user_handlers = {}  # {user_id: handler_id}
+# 保护 handler 的检查与添加，避免并发时为同一用户重复添加
+_handlers_lock = threading.Lock()
 
 
 def get_user_logger(user_id: str):
@@ -30,31 +33,36 @@ def get_user_logger(user_id: str):
 
 def add_user_log_handler(user_id: str):
     """为用户添加日志handler（只添加一次）"""
-    global _added_user_handlers
+    with _handlers_lock:
+        # 检查是否已经有这个handler
+        if user_id in _added_user_handlers:
+            logger.debug(f"用户日志handler已存在: {user_id}")
+            return  # 已经存在，不重复添加
 
-    # 检查是否已经有这个handler
-    if user_id in _added_user_handlers:
-        logger.debug(f"用户日志handler已存在: {user_id}")
-        return  # 已经存在，不重复添加
+        user_log_file = _user_logs_dir / f"user_{user_id}.log"
 
-    user_log_file = _user_logs_dir / f"user_{user_id}.log"
+        logger.debug(f"准备添加用户日志handler: {user_id}, 文件: {user_log_file}")
 
-    logger.debug(f"准备添加用户日志handler: {user_id}, 文件: {user_log_file}")
+        # 添加用户专属的日志handler
+        handler_id = logger.add(
+            user_log_file,
+            rotation="10 MB",
+            retention="7 days",
+            format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {message}",
+            filter=lambda record: record["extra"].get("user_id") == user_id,
+            enqueue=True  # 添加 enqueue=True 确保日志异步写入
+        )
 
-    # 添加用户专属的日志handler
-    handler_id = logger.add(
-        user_log_file,
-        rotation="10 MB",
-        retention="7 days",
-        format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {message}",
-        filter=lambda record: record["extra"].get("user_id") == user_id,
-        enqueue=True  # 添加 enqueue=True 确保日志异步写入
-    )
+        # 记录已添加的handler（保存handler_id）
+        _added_user_handlers[user_id] = handler_id
+        logger.debug(f"添加用户日志handler: {user_id}, 文件: {user_log_file}, handler_id: {handler_id}")
 
-    # 记录已添加的handler（保存handler_id）
-    _added_user_handlers[user_id] = handler_id
-    logger.debug(f"添加用户日志handler: {user_id}, 文件: {user_log_file}, handler_id: {handler_id}")
 
+def add_user_log_handler_background(user_id: str):
+    """在后台线程中为用户添加日志handler，不阻塞登录等请求（已添加时直接返回）"""
+    if user_id in _added_user_handlers:
+        return
+    threading.Thread(target=add_user_log_handler, args=(user_id,), name=f"user-log-{user_id}", daemon=True).start()
 
 
 def remove_user_log_handler(user_id: str):
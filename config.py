@@ -3,8 +3,10 @@
 负责加载、保存和管理应用程序配置
 使用 SQLite 数据库存储配置
 """
+import asyncio
 import json
 import os
+from collections import OrderedDict
 from pathlib import Path
 from typing import Optional, List
 from dataclasses import dataclass, asdict, field
@@ -38,6 +40,7 @@ class MonitoringConfig:
     check_interval: int = 3  # 检查间隔（秒）
     max_retries: int = 3
     download_timeout: int = 3600  # 下载超时（秒）
+    max_concurrency: int = 16  # 同时查询的任务数上限
 
 
 @dataclass
@@ -77,7 +80,8 @@ class Config:
         monitoring_config = MonitoringConfig(
             check_interval=monitoring_data.get("check_interval", 3),
             max_retries=monitoring_data.get("max_retries", 3),
-            download_timeout=monitoring_data.get("download_timeout", 3600)
+            download_timeout=monitoring_data.get("download_timeout", 3600),
+            max_concurrency=monitoring_data.get("max_concurrency", 16)
         )
 
         return cls(
@@ -90,8 +94,14 @@ class Config:
 class ConfigManager:
     """配置管理器 - 使用数据库存储"""
 
+    # 脏数据刷新间隔（秒）
+    FLUSH_INTERVAL = 1.0
+
     def __init__(self):
         self.config = Config()
+        self._dirty = False
+        # 配置版本号，配置被替换或更新时递增，供依赖全局配置的缓存判断是否失效
+        self.version = 0
         self.load()
 
     def load(self) -> Config:
@@ -101,11 +111,14 @@ class ConfigManager:
             db = get_database()
 
             # 尝试从数据库加载完整配置
-            config_json = db.get_config("app_config")
-            if config_json:
+            data = db.get_config("app_config")
+            if data:
                 try:
-                    data = json.loads(config_json)
+                    # 旧版本以字符串类型保存 JSON，需要再解析一次
+                    if isinstance(data, str):
+                        data = json.loads(data)
                     self.config = Config.from_dict(data)
+                    self.version += 1
                     logger.info("从数据库加载配置成功")
                     return self.config
                 except json.JSONDecodeError:
@@ -115,12 +128,14 @@ class ConfigManager:
 
             # 使用默认配置并保存到数据库
             self.config = Config()
+            self.version += 1
             self.save()
             return self.config
 
         except Exception as e:
             logger.error(f"加载配置失败，使用默认配置: {e}")
             self.config = Config()
+            self.version += 1
             return self.config
 
     def save(self) -> bool:
@@ -135,12 +150,37 @@ class ConfigManager:
             logger.error(f"保存配置失败: {e}")
             return False
 
-    def update(self, **kwargs):
-        """更新配置"""
-        for key, value in kwargs.items():
-            if hasattr(self.config, key):
-                setattr(self.config, key, value)
-        self.save()
+    def update(self, server: Optional[ServerConfig] = None, pan123: Optional[Pan123Config] = None,
+               monitoring: Optional[MonitoringConfig] = None):
+        """更新配置（标记为脏数据，由后台任务合并写入数据库）"""
+        if server is not None:
+            self.config.server = server
+        if pan123 is not None:
+            self.config.pan123 = pan123
+        if monitoring is not None:
+            self.config.monitoring = monitoring
+        self._dirty = True
+        self.version += 1
+
+    def flush(self) -> bool:
+        """如果配置有未保存的修改，写入数据库"""
+        if not self._dirty:
+            return True
+        self._dirty = False
+        if not self.save():
+            self._dirty = True
+            return False
+        return True
+
+    async def run_flusher(self):
+        """后台定期刷新脏配置，将频繁的更新合并为少量写入"""
+        try:
+            while True:
+                await asyncio.sleep(self.FLUSH_INTERVAL)
+                # 在线程池中写库，避免磁盘 I/O 阻塞事件循环
+                await asyncio.to_thread(self.flush)
+        finally:
+            self.flush()
 
     def get(self) -> Config:
         """获取当前配置"""
@@ -164,11 +204,29 @@ def get_config() -> Config:
     return get_config_manager().get()
 
 
+# 用户配置缓存 {user_id: (配置版本号, Config)}，按最近使用淘汰
+_user_config_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_USER_CONFIG_CACHE_SIZE = 128
+
+
 def get_user_config(user_id: str) -> Config:
     """获取用户配置"""
     from services.user_manager import get_user_manager
     user_manager = get_user_manager()
+
+    # 用户配置未变更时直接复用已构建的 Config 对象
+    version = user_manager.config_version
+    cached = _user_config_cache.get(user_id)
+    if cached is not None and cached[0] == version:
+        _user_config_cache.move_to_end(user_id)
+        return cached[1]
+
     user_config_data = user_manager.get_user_config(user_id)
 
     # 将用户配置转换为 Config 对象
-    return Config.from_dict(user_config_data)
+    config = Config.from_dict(user_config_data)
+    _user_config_cache[user_id] = (version, config)
+    _user_config_cache.move_to_end(user_id)
+    if len(_user_config_cache) > _USER_CONFIG_CACHE_SIZE:
+        _user_config_cache.popitem(last=False)
+    return config
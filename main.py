@@ -18,9 +18,14 @@ logger.add(
     logs_dir / "server.log",
     rotation="10 MB",
     retention="7 days",
-    format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}"
+    format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} - {message}",
+    enqueue=True  # 日志在后台线程写入，避免阻塞请求
+)
+logger.add(
+    sys.stderr,
+    format="<green>{time:HH:mm:ss}</green> | <level>{level: <8}</level> | {message}",
+    enqueue=True
 )
-logger.add(sys.stderr, format="<green>{time:HH:mm:ss}</green> | <level>{level: <8}</level> | {message}")
 
 
 def main():
@@ -42,7 +47,9 @@ def main():
     except Exception as e:
         logger.error(f"服务器运行出错: {e}")
         raise
-        raise
+    finally:
+        # 等待队列中的日志写入完成
+        logger.complete()
 
 
 if __name__ == "__main__":
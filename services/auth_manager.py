@@ -2,18 +2,31 @@
 认证服务管理器
 用于管理多个用户的认证服务实例，避免重复获取token
 """
-from typing import Optional, Dict
+import asyncio
+from typing import Optional, Dict, Set
 from services.pan123_service import Pan123AuthService
 from config import get_config
 from services.user_manager import get_user_manager
 from loguru import logger
 
 
+# 认证相关的 pan123 配置字段
+_PAN123_FIELDS = (
+    "client_id",
+    "client_secret",
+    "username",
+    "password",
+    "access_token",
+    "token_expires_at",
+)
+
+
 class AuthManager:
     """认证服务管理器（支持多用户）"""
 
     _instance: Optional['AuthManager'] = None
     _auth_services: Dict[str, Pan123AuthService] = {}  # {user_id: auth_service}
+    _closing_tasks: Set[asyncio.Task] = set()  # 正在关闭被丢弃实例的后台任务（保持引用防止被回收）
 
     def __new__(cls):
         if cls._instance is None:
@@ -29,24 +42,14 @@ class AuthManager:
 
             # 合并用户配置和全局配置（用户配置优先）
             pan123_config = user_config.get("pan123", {})
+            global_pan123 = global_config.pan123
             return {
-                "client_id": pan123_config.get("client_id", global_config.pan123.client_id),
-                "client_secret": pan123_config.get("client_secret", global_config.pan123.client_secret),
-                "username": pan123_config.get("username", global_config.pan123.username),
-                "password": pan123_config.get("password", global_config.pan123.password),
-                "access_token": pan123_config.get("access_token", global_config.pan123.access_token),
-                "token_expires_at": pan123_config.get("token_expires_at", global_config.pan123.token_expires_at)
+                key: pan123_config.get(key, getattr(global_pan123, key))
+                for key in _PAN123_FIELDS
             }
         else:
-            config = get_config()
-            return {
-                "client_id": config.pan123.client_id,
-                "client_secret": config.pan123.client_secret,
-                "username": config.pan123.username,
-                "password": config.pan123.password,
-                "access_token": config.pan123.access_token,
-                "token_expires_at": config.pan123.token_expires_at
-            }
+            global_pan123 = get_config().pan123
+            return {key: getattr(global_pan123, key) for key in _PAN123_FIELDS}
 
     async def get_auth_service(self, user_id: Optional[str] = None, force_refresh: bool = False) -> Pan123AuthService:
         """获取认证服务实例（支持多用户）
@@ -66,7 +69,7 @@ class AuthManager:
 
         # 如果强制刷新，清除缓存
         if force_refresh and cache_key in self._auth_services:
-            del self._auth_services[cache_key]
+            await self._auth_services.pop(cache_key).aclose()
             logger.debug(f"清除认证服务缓存 (user_id: {user_id or 'global'})")
 
         # 检查是否需要创建新实例
@@ -134,6 +137,10 @@ class AuthManager:
 
         return auth_service
 
+    def get_cached_auth_service(self, user_id: Optional[str] = None) -> Optional[Pan123AuthService]:
+        """获取当前缓存的认证服务实例（不创建、不刷新token），没有时返回 None"""
+        return self._auth_services.get(user_id if user_id else "global")
+
     async def validate_and_refresh_token(self, user_id: Optional[str] = None) -> bool:
         """校验并刷新token（启动时调用）
 
@@ -146,23 +153,27 @@ class AuthManager:
             logger.warning("123云盘未配置，无法校验token")
             return False
 
-        try:
-            # 创建认证服务实例
-            auth_service = Pan123AuthService(
-                client_id=config["client_id"],
-                client_secret=config["client_secret"]
-            )
+        # 创建认证服务实例
+        auth_service = Pan123AuthService(
+            client_id=config["client_id"],
+            client_secret=config["client_secret"]
+        )
 
+        try:
             # 获取token（如果无效会自动获取新的）
             await auth_service.get_access_token()
 
             # 缓存实例
             cache_key = user_id if user_id else "global"
+            old_service = self._auth_services.get(cache_key)
             self._auth_services[cache_key] = auth_service
+            if old_service is not None and old_service is not auth_service:
+                await old_service.aclose()
 
             logger.info(f"token校验成功 (user_id: {user_id or 'global'})")
             return True
         except Exception as e:
+            await auth_service.aclose()
             logger.error(f"token校验失败 (user_id: {user_id or 'global'}): {e}")
             return False
 
@@ -175,12 +186,34 @@ class AuthManager:
         if user_id:
             cache_key = user_id if user_id else "global"
             if cache_key in self._auth_services:
-                del self._auth_services[cache_key]
+                self._close_in_background(self._auth_services.pop(cache_key))
                 logger.debug(f"清除认证服务实例 (user_id: {user_id or 'global'})")
         else:
+            for auth_service in self._auth_services.values():
+                self._close_in_background(auth_service)
             self._auth_services.clear()
             logger.debug("清除所有认证服务实例")
 
+    def _close_in_background(self, auth_service: Pan123AuthService):
+        """停止被丢弃实例的后台刷新，并在事件循环中异步关闭其HTTP客户端"""
+        auth_service.stop_background_refresh()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 没有运行中的事件循环（例如同步脚本中调用），客户端随实例回收
+            return
+        task = loop.create_task(auth_service.aclose())
+        self._closing_tasks.add(task)
+        task.add_done_callback(self._closing_tasks.discard)
+
+    async def aclose_all(self):
+        """关闭所有认证服务实例持有的HTTP客户端（关闭服务时调用）"""
+        for auth_service in list(self._auth_services.values()):
+            try:
+                await auth_service.aclose()
+            except Exception as e:
+                logger.debug(f"关闭HTTP客户端失败: {e}")
+
 
 # 全局实例
 _auth_manager: Optional[AuthManager] = None
@@ -3,6 +3,7 @@
 用于搜索时的简繁体互通
 """
 import re
+import threading
 from pathlib import Path
 from loguru import logger
 
@@ -10,9 +11,24 @@ from loguru import logger
 class ChineseConverter:
     """简繁体转换器"""
 
+    __slots__ = (
+        "traditional_to_simplified",
+        "simplified_to_traditional",
+        "_trad_chars",
+        "_simp_chars",
+        "_t2s_table",
+        "_s2t_table",
+    )
+
     def __init__(self):
         self.traditional_to_simplified = {}
         self.simplified_to_traditional = {}
+        # 字符集合，用于快速判断是否需要转换
+        self._trad_chars = frozenset()
+        self._simp_chars = frozenset()
+        # str.translate 使用的码位映射表
+        self._t2s_table = {}
+        self._s2t_table = {}
         self._load_conversion_table()
 
     def _load_conversion_table(self):
@@ -42,6 +58,11 @@ class ChineseConverter:
                             self.traditional_to_simplified[traditional] = simplified
                             self.simplified_to_traditional[simplified] = traditional
 
+            self._trad_chars = frozenset(self.traditional_to_simplified)
+            self._simp_chars = frozenset(self.simplified_to_traditional)
+            self._t2s_table = {ord(k): v for k, v in self.traditional_to_simplified.items() if len(k) == 1}
+            self._s2t_table = {ord(k): v for k, v in self.simplified_to_traditional.items() if len(k) == 1}
+
             logger.info(f"简繁体对照表加载成功: {len(self.traditional_to_simplified)} 个字符对")
 
         except Exception as e:
@@ -49,23 +70,11 @@ class ChineseConverter:
 
     def to_simplified(self, text: str) -> str:
         """将繁体转换为简体"""
-        result = []
-        for char in text:
-            if char in self.traditional_to_simplified:
-                result.append(self.traditional_to_simplified[char])
-            else:
-                result.append(char)
-        return ''.join(result)
+        return text.translate(self._t2s_table)
 
     def to_traditional(self, text: str) -> str:
         """将简体转换为繁体"""
-        result = []
-        for char in text:
-            if char in self.simplified_to_traditional:
-                result.append(self.simplified_to_traditional[char])
-            else:
-                result.append(char)
-        return ''.join(result)
+        return text.translate(self._s2t_table)
 
     def get_search_variants(self, text: str) -> list:
         """
@@ -75,26 +84,36 @@ class ChineseConverter:
         """
         variants = [text]
 
-        # 转换为简体
-        simplified = self.to_simplified(text)
-        if simplified != text and simplified not in variants:
-            variants.append(simplified)
+        # 转换为简体（不含繁体字时跳过）
+        if not self._trad_chars.isdisjoint(text):
+            simplified = self.to_simplified(text)
+            if simplified != text and simplified not in variants:
+                variants.append(simplified)
 
-        # 转换为繁体
-        traditional = self.to_traditional(text)
-        if traditional != text and traditional not in variants:
-            variants.append(traditional)
+        # 转换为繁体（不含简体字时跳过）
+        if not self._simp_chars.isdisjoint(text):
+            traditional = self.to_traditional(text)
+            if traditional != text and traditional not in variants:
+                variants.append(traditional)
 
         return variants
 
 
 # 全局转换器实例
 _converter = None
+_converter_lock = threading.Lock()
 
 
 def get_converter() -> ChineseConverter:
     """获取转换器单例"""
     global _converter
     if _converter is None:
-        _converter = ChineseConverter()
+        with _converter_lock:
+            if _converter is None:
+                _converter = ChineseConverter()
     return _converter
+
+
+def warmup_converter():
+    """在后台线程中预加载转换器，避免首次搜索时加载对照表造成延迟"""
+    threading.Thread(target=get_converter, name="chinese-converter-warmup", daemon=True).start()
@@ -4,23 +4,282 @@ SQLite数据库服务
 """
 import sqlite3
 import json
+import re
+import base64
+import threading
+import time
 from pathlib import Path
 from typing import Optional, List, Dict, Any
 from contextlib import contextmanager
+from functools import lru_cache
 from loguru import logger
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from services.chinese_converter import get_converter
+
+
+# 热点查询的 SQL 常量（配合连接的语句缓存复用预编译语句）
+_GET_TASK_SQL = "SELECT * FROM tasks WHERE task_id = ?"
+_DELETE_TASK_SQL = "DELETE FROM tasks WHERE task_id = ?"
+_GET_VIDEO_SQL = "SELECT * FROM videos WHERE video_id = ?"
+_GET_CONFIG_SQL = "SELECT value, vtype FROM config WHERE key = ?"
+
+# 视频列表允许的排序字段和方向
+_VIDEO_SORT_FIELDS = ("created_at", "updated_at", "duration")
+_SORT_DIRECTIONS = ("ASC", "DESC")
+
+# 视频列表分页查询模板，按 (是否统计总数, 排序字段, 排序方向) 预先生成，只需填入 WHERE 条件
+_VIDEO_PAGE_SQL = {
+    (with_total, field, direction): (
+        "SELECT *, rowid AS _rowid" + (", COUNT(*) OVER () AS _total" if with_total else "") +
+        " FROM videos WHERE {where}" +
+        f" ORDER BY {field} {direction}, rowid {direction} LIMIT ? OFFSET ?"
+    )
+    for with_total in (False, True)
+    for field in _VIDEO_SORT_FIELDS
+    for direction in _SORT_DIRECTIONS
+}
+
+_INSERT_TASK_SQL = """
+    INSERT INTO tasks (
+        task_id, video_id, title, folder_id, folder_name,
+        download_task_id, status, progress, file_id, desired_name,
+        created_at, updated_at, error_message, download_url, retry_count, user_id
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_UPSERT_VIDEO_SQL = """
+    INSERT INTO videos (
+        video_id, title, series_name, cover_url, duration, local_url,
+        created_at, updated_at, user_id, incomplete, rename_name
+    ) VALUES (
+        ?1, ?2, ?3, ?4, ?5, ?6, ?7, ?8, ?9,
+        COALESCE(?10, instr(?2, '[中字後補]') > 0), ?11
+    )
+    ON CONFLICT(video_id) DO UPDATE SET
+        title = excluded.title,
+        series_name = excluded.series_name,
+        cover_url = excluded.cover_url,
+        duration = excluded.duration,
+        local_url = excluded.local_url,
+        updated_at = excluded.updated_at,
+        incomplete = excluded.incomplete,
+        rename_name = excluded.rename_name
+"""
+# 单条写入时直接返回写入后的行，省去再次查询
+_UPSERT_VIDEO_RETURNING_SQL = _UPSERT_VIDEO_SQL + "    RETURNING *\n"
+
+
+def _task_params(task_data: Dict[str, Any]) -> tuple:
+    """将任务字典转换为 _INSERT_TASK_SQL 的参数"""
+    return (
+        task_data["task_id"],
+        task_data["video_id"],
+        task_data["title"],
+        task_data["folder_id"],
+        task_data["folder_name"],
+        task_data.get("download_task_id"),
+        task_data["status"],
+        task_data.get("progress", 0.0),
+        task_data.get("file_id"),
+        task_data.get("desired_name"),
+        task_data["created_at"],
+        task_data["updated_at"],
+        task_data.get("error_message"),
+        task_data.get("download_url"),
+        task_data.get("retry_count", 0),
+        task_data.get("user_id")
+    )
+
+
+@lru_cache(maxsize=64)
+def _task_update_sql(keys: tuple) -> tuple:
+    """根据更新字段生成 UPDATE 语句，返回 (sql, 参与变化比较的字段)
+
+    只有至少一个字段发生变化时才更新（IS NOT 可正确比较 NULL）；
+    包含 updated_at 时，不覆盖 updated_at 更新的记录
+    """
+    set_clause = ", ".join(f"{k} = ?" for k in keys)
+    changed = tuple(k for k in keys if k != "updated_at")
+    where_clause = "task_id = ?"
+    if "updated_at" in keys:
+        where_clause += " AND (updated_at IS NULL OR updated_at <= ?)"
+    if changed:
+        where_clause += " AND (" + " OR ".join(f"{k} IS NOT ?" for k in changed) + ")"
+    return f"UPDATE tasks SET {set_clause} WHERE {where_clause}", changed
+
+
+def _task_update_params(task_id: str, update_data: Dict[str, Any], changed: tuple) -> list:
+    """生成 _task_update_sql 语句对应的参数"""
+    values = list(update_data.values())
+    values.append(task_id)
+    if "updated_at" in update_data:
+        values.append(update_data["updated_at"])
+    values.extend(update_data[k] for k in changed)
+    return values
+
+
+def _video_params(video_data: Dict[str, Any]) -> tuple:
+    """将视频字典转换为 _UPSERT_VIDEO_SQL 的参数
+
+    未提供 incomplete 字段时传入 NULL，由 SQL 根据标题是否包含 [中字後補] 判断
+    """
+    return (
+        video_data["video_id"],
+        video_data.get("title", ""),
+        video_data.get("series_name"),
+        video_data.get("cover_url"),
+        video_data.get("duration"),
+        video_data.get("local_url"),
+        video_data["created_at"],
+        video_data["updated_at"],
+        video_data.get("user_id"),
+        video_data.get("incomplete"),
+        video_data.get("rename_name")
+    )
+
+
+# 标题末尾的集数序号
+_RE_TRAILING_NUM = re.compile(r'\s+\d+$')
+# 不完善视频标题中的 [中字後補] 标记
+_RE_INCOMPLETE_TAG = re.compile(r'\s*\[中字後補\]\s*')
+
+# 视频列表快捷时间筛选：最近24小时、2天、1周、1个月、3个月
+_TIME_RANGE_DELTAS = {
+    '24h': timedelta(hours=24),
+    '2d': timedelta(days=2),
+    '1w': timedelta(weeks=1),
+    '1m': timedelta(days=30),
+    '3m': timedelta(days=90)
+}
+
+
+def _clean_incomplete_title(title: Optional[str]) -> Optional[str]:
+    """去除不完善视频标题中的 [中字後補] 标记（注册为 SQLite 函数 clean_incomplete_title）"""
+    if title is None:
+        return None
+    return _RE_INCOMPLETE_TAG.sub('', title).strip()
+
+
+@lru_cache(maxsize=512)
+def _search_variants(search: str) -> tuple:
+    """获取搜索词的简繁体变体（结果缓存，纯 ASCII 搜索词无需转换）"""
+    if search.isascii():
+        return (search,)
+    return tuple(get_converter().get_search_variants(search))
+
+
+# 配置值类型编码：s 字符串 / i 整数 / b 布尔 / j JSON
+_CONFIG_DECODERS = {
+    "s": str,
+    "i": int,
+    "b": lambda value: value == "1",
+    "j": json.loads,
+}
+
+
+def _encode_config_value(value: Any) -> tuple:
+    """将配置值编码为 (value, vtype)"""
+    if isinstance(value, str):
+        return value, "s"
+    if isinstance(value, bool):
+        return ("1" if value else "0"), "b"
+    if isinstance(value, int):
+        return str(value), "i"
+    if value is None or isinstance(value, (dict, list, float)):
+        return json.dumps(value), "j"
+    return str(value), "s"
+
+
+def _decode_config_value(value: str, vtype: Optional[str]) -> Any:
+    """按 vtype 还原配置值（旧数据没有类型时按字符串返回）"""
+    return _CONFIG_DECODERS.get(vtype or "s", str)(value)
+
+
+def _fetch_dicts(cursor: sqlite3.Cursor) -> List[Dict[str, Any]]:
+    """将查询结果直接转换为字典列表（列名只从 cursor.description 读取一次）"""
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def _fetch_dict(cursor: sqlite3.Cursor) -> Optional[Dict[str, Any]]:
+    """将单行查询结果转换为字典"""
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip([column[0] for column in cursor.description], row))
+
+
+def _encode_page_cursor(sort_value: Any, rowid: int) -> str:
+    """编码分页游标（最后一行的排序值和 rowid）"""
+    raw = json.dumps([sort_value, rowid], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_page_cursor(token: str) -> tuple:
+    """解码分页游标，格式错误时抛出 ValueError"""
+    try:
+        sort_value, rowid = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+    except Exception:
+        raise ValueError("无效的分页游标")
+    if not isinstance(rowid, int):
+        raise ValueError("无效的分页游标")
+    return sort_value, rowid
+
+
+def _keyset_condition(sort_field: str, sort_dir: str, sort_value: Any, rowid: int) -> tuple:
+    """构建键集分页条件：返回排在 (sort_value, rowid) 之后的行
+
+    SQLite 中 NULL 在升序时排最前，降序时排最后。
+    """
+    if sort_dir == "DESC":
+        if sort_value is None:
+            return f"({sort_field} IS NULL AND rowid < ?)", [rowid]
+        return (
+            f"({sort_field} < ? OR ({sort_field} = ? AND rowid < ?) OR {sort_field} IS NULL)",
+            [sort_value, sort_value, rowid]
+        )
+    if sort_value is None:
+        return f"(({sort_field} IS NULL AND rowid > ?) OR {sort_field} IS NOT NULL)", [rowid]
+    return f"({sort_field} > ? OR ({sort_field} = ? AND rowid > ?))", [sort_value, sort_value, rowid]
 
 
 class Database:
     """SQLite数据库管理类"""
 
+    # 视频列表总数缓存的有效期（秒）和最大条目数
+    VIDEO_COUNT_CACHE_TTL = 30
+    VIDEO_COUNT_CACHE_SIZE = 256
+
+    # 每个连接缓存的预编译语句数量
+    CACHED_STATEMENTS = 256
+    # 批量删除任务时每批删除的行数
+    DELETE_CHUNK_SIZE = 1000
+
+    # 每个连接都需要设置的运行时 PRAGMA（journal_mode 持久化在数据库文件中，只需初始化时设置一次）
+    CONNECTION_PRAGMAS = (
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-64000",
+        "PRAGMA mmap_size=268435456",
+        "PRAGMA foreign_keys=ON",
+    )
+
     def __init__(self, db_path: str = None):
         if db_path is None:
             # 默认使用服务目录下的 data/hanime.db
-            from pathlib import Path
             self.db_path = Path(__file__).parent.parent / "data" / "hanime.db"
         else:
             self.db_path = Path(db_path)
+        # 每个线程复用一个连接，避免每次操作都重新打开数据库
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._generation = 0  # close_all 后递增，使各线程重新建立连接
+        self._fts_enabled = False  # 是否可用 FTS5 全文索引进行视频搜索
+        # 视频列表总数缓存 {(where_clause, params): (视频表版本号, 过期时间, 总数)}
+        self._video_count_cache: Dict[tuple, tuple] = {}
+        self._videos_version = 0  # 视频表每次写入后递增，使总数缓存失效
         self._ensure_db_dir()
         self._init_database()
 
@@ -28,29 +287,140 @@ class Database:
         """确保数据库目录存在"""
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
 
+    def _get_thread_connection(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接（首次使用时创建）"""
+        local = self._local
+        conn = getattr(local, "conn", None)
+        if conn is None or local.generation != self._generation:
+            conn = sqlite3.connect(
+                self.db_path,
+                check_same_thread=False,
+                cached_statements=self.CACHED_STATEMENTS
+            )
+            conn.row_factory = sqlite3.Row
+            conn.create_function("clean_incomplete_title", 1, _clean_incomplete_title, deterministic=True)
+            self._apply_pragmas(conn)
+            local.conn = conn
+            local.generation = self._generation
+            local.depth = 0
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
     @contextmanager
     def get_connection(self):
-        """获取数据库连接的上下文管理器"""
-        conn = None
+        """获取数据库连接的上下文管理器
+
+        连接按线程复用，不会在退出时关闭；嵌套使用时只在最外层提交或回滚。
+        """
+        conn = self._get_thread_connection()
+        local = self._local
+        local.depth += 1
         try:
-            conn = sqlite3.connect(self.db_path)
-            conn.row_factory = sqlite3.Row
             yield conn
-            conn.commit()
+            if local.depth == 1:
+                conn.commit()
         except Exception as e:
-            if conn:
+            if local.depth == 1:
                 conn.rollback()
             logger.error(f"数据库操作失败: {e}")
             raise
         finally:
-            if conn:
+            local.depth -= 1
+
+    def _begin_immediate(self, conn: sqlite3.Connection):
+        """开启写事务，一次性获取写锁（已在事务中时不做处理）"""
+        if not conn.in_transaction:
+            conn.execute("BEGIN IMMEDIATE")
+
+    def close_all(self):
+        """关闭所有线程的数据库连接（关闭服务时调用）"""
+        with self._connections_lock:
+            connections = self._connections
+            self._connections = []
+            self._generation += 1
+        for conn in connections:
+            try:
                 conn.close()
+            except sqlite3.Error as e:
+                logger.debug(f"关闭数据库连接失败: {e}")
+
+    def _apply_pragmas(self, conn: sqlite3.Connection):
+        """设置连接级别的 PRAGMA"""
+        for pragma in self.CONNECTION_PRAGMAS:
+            try:
+                conn.execute(pragma)
+            except sqlite3.Error as e:
+                logger.debug(f"设置 {pragma} 失败: {e}")
+
+    def _add_missing_columns(self, cursor: sqlite3.Cursor, table: str, columns: List[tuple]) -> List[str]:
+        """对比表结构，只为缺少的列执行 ALTER TABLE，返回新增的列名"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cursor.fetchall()}
+        added = []
+        for column, ddl in columns:
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}")
+                added.append(column)
+        return added
+
+    def _init_videos_fts(self, cursor: sqlite3.Cursor):
+        """创建视频搜索的 FTS5 全文索引（trigram 分词，支持中文子串匹配）"""
+        try:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'videos_fts'")
+            exists = cursor.fetchone() is not None
+
+            cursor.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS videos_fts USING fts5(
+                    title, video_id, series_name,
+                    content='videos', content_rowid='rowid', tokenize='trigram'
+                )
+            """)
+
+            # 通过触发器保持全文索引与 videos 表同步
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS videos_fts_ai AFTER INSERT ON videos BEGIN
+                    INSERT INTO videos_fts(rowid, title, video_id, series_name)
+                    VALUES (new.rowid, new.title, new.video_id, new.series_name);
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS videos_fts_ad AFTER DELETE ON videos BEGIN
+                    INSERT INTO videos_fts(videos_fts, rowid, title, video_id, series_name)
+                    VALUES ('delete', old.rowid, old.title, old.video_id, old.series_name);
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS videos_fts_au AFTER UPDATE ON videos BEGIN
+                    INSERT INTO videos_fts(videos_fts, rowid, title, video_id, series_name)
+                    VALUES ('delete', old.rowid, old.title, old.video_id, old.series_name);
+                    INSERT INTO videos_fts(rowid, title, video_id, series_name)
+                    VALUES (new.rowid, new.title, new.video_id, new.series_name);
+                END
+            """)
+
+            # 首次创建时为已有数据建立索引
+            if not exists:
+                cursor.execute("INSERT INTO videos_fts(videos_fts) VALUES ('rebuild')")
+                logger.info("已创建视频搜索全文索引")
+
+            self._fts_enabled = True
+        except sqlite3.OperationalError as e:
+            # SQLite 版本过低（trigram 需要 3.34+）或未编译 FTS5，回退到 LIKE 搜索
+            logger.warning(f"创建视频全文索引失败，搜索将使用 LIKE 匹配: {e}")
+            self._fts_enabled = False
 
     def _init_database(self):
         """初始化数据库表结构"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
 
+            # 启用 WAL 模式：写入变为顺序追加，读操作不再被写操作阻塞
+            try:
+                cursor.execute("PRAGMA journal_mode=WAL")
+            except sqlite3.Error as e:
+                logger.warning(f"启用 WAL 模式失败: {e}")
+
             # 创建任务表
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS tasks (
@@ -74,27 +444,24 @@ class Database:
             """)
 
             # 检查并添加 user_id 列（如果表已存在但没有该列）
-            try:
-                cursor.execute("ALTER TABLE tasks ADD COLUMN user_id TEXT")
+            if self._add_missing_columns(cursor, "tasks", [("user_id", "TEXT")]):
                 logger.info("已添加 user_id 列到 tasks 表")
-            except sqlite3.OperationalError:
-                # 列已存在，忽略错误
-                pass
-
-
 
             # 创建配置表
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS config (
                     key TEXT PRIMARY KEY,
                     value TEXT NOT NULL,
-                    updated_at TEXT NOT NULL
+                    updated_at TEXT NOT NULL,
+                    vtype TEXT NOT NULL DEFAULT 's'
                 )
             """)
+            self._add_missing_columns(cursor, "config", [("vtype", "TEXT NOT NULL DEFAULT 's'")])
 
             # 创建索引
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(status)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_created_at ON tasks(created_at)")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_tasks_user_status ON tasks(user_id, status)")
 
             # 创建视频信息表
             cursor.execute("""
@@ -112,26 +479,25 @@ class Database:
                 )
             """)
 
-            # 添加 series_name 列（如果不存在）
-            try:
-                cursor.execute("ALTER TABLE videos ADD COLUMN series_name TEXT")
-            except sqlite3.OperationalError:
-                # 列已存在，忽略错误
-                pass
+            # 添加 series_name、incomplete、rename_name 列（如果不存在）
+            self._add_missing_columns(cursor, "videos", [
+                ("series_name", "TEXT"),
+                ("incomplete", "INTEGER DEFAULT 0"),
+                ("rename_name", "TEXT"),
+            ])
 
-            # 添加 incomplete 列（如果不存在）
-            try:
-                cursor.execute("ALTER TABLE videos ADD COLUMN incomplete INTEGER DEFAULT 0")
-            except sqlite3.OperationalError:
-                # 列已存在，忽略错误
-                pass
+            # 视频列表按用户筛选并按创建时间排序
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_videos_user_created ON videos(user_id, created_at DESC)")
+            # 查找系列中的不完善视频（部分索引，只包含 incomplete=1 的行）
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_videos_series_name ON videos(series_name) WHERE incomplete = 1"
+            )
 
-            # 添加 rename_name 列（如果不存在）
-            try:
-                cursor.execute("ALTER TABLE videos ADD COLUMN rename_name TEXT")
-            except sqlite3.OperationalError:
-                # 列已存在，忽略错误
-                pass
+            # 视频搜索全文索引
+            self._init_videos_fts(cursor)
+
+            # 让查询规划器获取索引统计信息（只在需要时才执行 ANALYZE）
+            cursor.execute("PRAGMA optimize")
 
             conn.commit()
             logger.info("数据库初始化完成")
@@ -142,6 +508,7 @@ class Database:
         """获取所有任务"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = None
             if status_filter and status_filter != "all":
                 if user_id:
                     cursor.execute(
@@ -161,159 +528,194 @@ class Database:
                     )
                 else:
                     cursor.execute("SELECT * FROM tasks ORDER BY created_at DESC")
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
+            return _fetch_dicts(cursor)
 
     def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
         """获取单个任务"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
+            cursor.row_factory = None
+            cursor.execute(_GET_TASK_SQL, (task_id,))
+            return _fetch_dict(cursor)
 
     def create_task(self, task_data: Dict[str, Any]) -> bool:
         """创建任务"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             try:
-                cursor.execute("""
-                    INSERT INTO tasks (
-                        task_id, video_id, title, folder_id, folder_name,
-                        download_task_id, status, progress, file_id, desired_name,
-                        created_at, updated_at, error_message, download_url, retry_count, user_id
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    task_data["task_id"],
-                    task_data["video_id"],
-                    task_data["title"],
-                    task_data["folder_id"],
-                    task_data["folder_name"],
-                    task_data.get("download_task_id"),
-                    task_data["status"],
-                    task_data.get("progress", 0.0),
-                    task_data.get("file_id"),
-                    task_data.get("desired_name"),
-                    task_data["created_at"],
-                    task_data["updated_at"],
-                    task_data.get("error_message"),
-                    task_data.get("download_url"),
-                    task_data.get("retry_count", 0),
-                    task_data.get("user_id")
-                ))
+                cursor.execute(_INSERT_TASK_SQL, _task_params(task_data))
                 return True
             except sqlite3.IntegrityError:
                 logger.error(f"任务 {task_data['task_id']} 已存在")
                 return False
 
+    def create_tasks_bulk(self, tasks: List[Dict[str, Any]]) -> bool:
+        """批量创建任务（单个事务内完成）"""
+        if not tasks:
+            return True
+        with self.get_connection() as conn:
+            self._begin_immediate(conn)
+            try:
+                conn.executemany(_INSERT_TASK_SQL, [_task_params(task) for task in tasks])
+                return True
+            except sqlite3.IntegrityError as e:
+                conn.rollback()
+                logger.error(f"批量创建任务失败: {e}")
+                return False
+
     def update_task(self, task_id: str, update_data: Dict[str, Any]) -> bool:
-        """更新任务"""
+        """更新任务
+
+        除 updated_at 外的字段都与现有值相同时跳过写入（返回 False），
+        避免轮询重复写入相同进度时产生无意义的 WAL 写入
+        """
         if not update_data:
             return False
 
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            # 构建更新语句
-            set_clause = ", ".join([f"{k} = ?" for k in update_data.keys()])
-            values = list(update_data.values()) + [task_id]
-            
-            cursor.execute(f"""
-                UPDATE tasks SET {set_clause} WHERE task_id = ?
-            """, values)
+            sql, columns = _task_update_sql(tuple(update_data))
+            cursor.execute(sql, _task_update_params(task_id, update_data, columns))
             return cursor.rowcount > 0
 
+    def update_tasks_bulk(self, updates: Dict[str, Dict[str, Any]]) -> int:
+        """批量更新任务（单个事务内完成），返回实际更新的行数
+
+        updates 为 {task_id: update_data}；更新字段相同的任务合并为一次 executemany。
+        带 updated_at 的更新只会覆盖不比它新的记录，避免延迟写入的旧数据覆盖新状态。
+        """
+        groups: Dict[tuple, list] = {}
+        for task_id, update_data in updates.items():
+            if update_data:
+                groups.setdefault(tuple(update_data), []).append((task_id, update_data))
+        if not groups:
+            return 0
+
+        updated = 0
+        with self.get_connection() as conn:
+            self._begin_immediate(conn)
+            for keys, items in groups.items():
+                sql, columns = _task_update_sql(keys)
+                cursor = conn.executemany(
+                    sql, [_task_update_params(task_id, data, columns) for task_id, data in items]
+                )
+                updated += max(cursor.rowcount, 0)
+        return updated
+
     def delete_task(self, task_id: str) -> bool:
         """删除任务"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+            cursor.execute(_DELETE_TASK_SQL, (task_id,))
             return cursor.rowcount > 0
 
-    def delete_tasks_by_status(self, status: str, user_id: Optional[str] = None) -> int:
-        """根据状态删除任务"""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            if user_id:
-                cursor.execute("DELETE FROM tasks WHERE status = ? AND user_id = ?", (status, user_id))
-            else:
-                cursor.execute("DELETE FROM tasks WHERE status = ?", (status,))
-            return cursor.rowcount
+    def _delete_tasks_chunked(self, where_clause: str, params: tuple) -> List[str]:
+        """分批删除任务，每批单独提交，避免单个大事务使 WAL 文件膨胀
 
-    def delete_all_tasks(self, user_id: Optional[str] = None) -> int:
-        """删除所有任务"""
+        返回被删除任务的ID列表
+        """
+        sql = (
+            f"DELETE FROM tasks WHERE rowid IN "
+            f"(SELECT rowid FROM tasks WHERE {where_clause} LIMIT {self.DELETE_CHUNK_SIZE}) "
+            f"RETURNING task_id"
+        )
+        deleted: List[str] = []
         with self.get_connection() as conn:
-            cursor = conn.cursor()
-            if user_id:
-                cursor.execute("DELETE FROM tasks WHERE user_id = ?", (user_id,))
-            else:
-                cursor.execute("DELETE FROM tasks")
-            return cursor.rowcount
+            # 嵌套在外层事务中时不能中途提交，由外层统一提交
+            outermost = self._local.depth == 1
+            while True:
+                rows = conn.execute(sql, params).fetchall()
+                if not rows:
+                    break
+                deleted.extend(row[0] for row in rows)
+                if outermost:
+                    conn.commit()
+            if outermost and deleted:
+                try:
+                    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+                except sqlite3.Error as e:
+                    logger.debug(f"WAL 检查点执行失败: {e}")
+        return deleted
+
+    def delete_tasks_by_status(self, status: str, user_id: Optional[str] = None) -> List[str]:
+        """根据状态删除任务，返回被删除任务的ID列表"""
+        if user_id:
+            return self._delete_tasks_chunked("status = ? AND user_id = ?", (status, user_id))
+        return self._delete_tasks_chunked("status = ?", (status,))
+
+    def delete_all_tasks(self, user_id: Optional[str] = None) -> List[str]:
+        """删除所有任务，返回被删除任务的ID列表"""
+        if user_id:
+            return self._delete_tasks_chunked("user_id = ?", (user_id,))
+        return self._delete_tasks_chunked("1 = 1", ())
 
     def get_task_statistics(self, user_id: Optional[str] = None) -> Dict[str, int]:
         """获取任务统计"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = None
             if user_id:
-                cursor.execute("""
-                    SELECT
-                        COUNT(*) as total,
-                        SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END) as pending,
-                        SUM(CASE WHEN status = 'downloading' THEN 1 ELSE 0 END) as downloading,
-                        SUM(CASE WHEN status = 'renaming' THEN 1 ELSE 0 END) as renaming,
-                        SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as completed,
-                        SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END) as failed
-                    FROM tasks
-                    WHERE user_id = ?
-                """, (user_id,))
+                cursor.execute(
+                    "SELECT status, COUNT(*) FROM tasks WHERE user_id = ? GROUP BY status",
+                    (user_id,)
+                )
             else:
-                cursor.execute("""
-                    SELECT
-                        COUNT(*) as total,
-                        SUM(CASE WHEN status = 'pending' THEN 1 ELSE 0 END) as pending,
-                        SUM(CASE WHEN status = 'downloading' THEN 1 ELSE 0 END) as downloading,
-                        SUM(CASE WHEN status = 'renaming' THEN 1 ELSE 0 END) as renaming,
-                        SUM(CASE WHEN status = 'completed' THEN 1 ELSE 0 END) as completed,
-                        SUM(CASE WHEN status = 'failed' THEN 1 ELSE 0 END) as failed
-                    FROM tasks
-                """)
-            row = cursor.fetchone()
-            return dict(row)
+                cursor.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status")
+
+            stats = {"total": 0, "pending": 0, "downloading": 0, "renaming": 0, "completed": 0, "failed": 0}
+            for status, count in cursor.fetchall():
+                stats["total"] += count
+                if status in stats:
+                    stats[status] = count
+            return stats
 
     # ========== 系列任务表操作 ==========
 
 
     # ========== 配置表操作 ==========
 
-    def get_config(self, key: str, default: Any = None) -> Optional[str]:
-        """获取配置值"""
+    def get_config(self, key: str, default: Any = None) -> Any:
+        """获取配置值（按写入时的类型还原）"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT value FROM config WHERE key = ?", (key,))
+            cursor.execute(_GET_CONFIG_SQL, (key,))
             row = cursor.fetchone()
-            return row["value"] if row else default
+            return _decode_config_value(row["value"], row["vtype"]) if row else default
 
     def set_config(self, key: str, value: Any) -> bool:
         """设置配置值"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             now = datetime.now().isoformat()
+            encoded, vtype = _encode_config_value(value)
             cursor.execute("""
-                INSERT OR REPLACE INTO config (key, value, updated_at)
-                VALUES (?, ?, ?)
-            """, (key, json.dumps(value) if isinstance(value, (dict, list)) else str(value), now))
+                INSERT OR REPLACE INTO config (key, value, updated_at, vtype)
+                VALUES (?, ?, ?, ?)
+            """, (key, encoded, now, vtype))
             return True
 
-    def get_all_config(self) -> Dict[str, str]:
+    def get_all_config(self) -> Dict[str, Any]:
         """获取所有配置"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT key, value FROM config")
+            cursor.execute("SELECT key, value, vtype FROM config")
             rows = cursor.fetchall()
-            return {row["key"]: row["value"] for row in rows}
+            return {row["key"]: _decode_config_value(row["value"], row["vtype"]) for row in rows}
 
     # ========== 视频信息表操作 ==========
 
-    def get_all_videos(
+    def get_all_videos(self, *args, **kwargs) -> Dict[str, Any]:
+        """获取视频列表（支持搜索、分页、排序、时间筛选），参数同 get_all_videos_raw
+
+        每个视频以字典返回；只需序列化输出时可直接使用 get_all_videos_raw，
+        避免为每行创建字典
+        """
+        result = self.get_all_videos_raw(*args, **kwargs)
+        columns = result.pop("columns")
+        result["videos"] = [dict(zip(columns, row)) for row in result.pop("rows")]
+        return result
+
+    def get_all_videos_raw(
         self,
         user_id: Optional[str] = None,
         search: Optional[str] = None,
@@ -321,11 +723,20 @@ class Database:
         page_size: int = 20,
         sort_by: str = "created_at",
         sort_order: str = "desc",
-        time_filter: Optional[str] = None
+        time_filter: Optional[str] = None,
+        after: Optional[str] = None,
+        include_total: bool = True
     ) -> Dict[str, Any]:
-        """获取视频列表（支持搜索、分页、排序、时间筛选）"""
+        """获取视频列表，以共享列名 + 元组行的形式返回（columns / rows）
+
+        Args:
+            after: 上一页返回的 next_cursor，提供时使用键集分页（忽略 page），
+                每页开销与页码无关
+            include_total: 是否统计总数，为 False 时 total/total_pages 返回 None
+        """
         with self.get_connection() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = None
 
             # 构建查询条件
             where_conditions = []
@@ -338,22 +749,27 @@ class Database:
             if search:
                 # 泛搜索：支持标题、视频ID、系列名称的模糊匹配
                 # 支持简繁体互通搜索
-                from services.chinese_converter import get_converter
-                converter = get_converter()
-
                 # 获取搜索词的所有变体（原文、简体、繁体）
-                search_variants = converter.get_search_variants(search)
+                search_variants = _search_variants(search)
 
-                # 构建多个 LIKE 条件，用 OR 连接
-                like_conditions = []
-                for field in ["title", "video_id", "series_name"]:
-                    for variant in search_variants:
-                        search_pattern = f"%{variant}%"
-                        like_conditions.append(f"{field} LIKE ?")
-                        params.append(search_pattern)
+                # trigram 全文索引只能匹配 3 个字符及以上的子串，更短的搜索词使用 LIKE
+                if self._fts_enabled and all(len(variant) >= 3 for variant in search_variants):
+                    match_query = " OR ".join(
+                        '"' + variant.replace('"', '""') + '"' for variant in search_variants
+                    )
+                    where_conditions.append("rowid IN (SELECT rowid FROM videos_fts WHERE videos_fts MATCH ?)")
+                    params.append(match_query)
+                else:
+                    # 构建多个 LIKE 条件，用 OR 连接
+                    like_conditions = []
+                    for field in ["title", "video_id", "series_name"]:
+                        for variant in search_variants:
+                            search_pattern = f"%{variant}%"
+                            like_conditions.append(f"{field} LIKE ?")
+                            params.append(search_pattern)
 
-                # 将所有 LIKE 条件用 OR 连接
-                where_conditions.append(f"({' OR '.join(like_conditions)})")
+                    # 将所有 LIKE 条件用 OR 连接
+                    where_conditions.append(f"({' OR '.join(like_conditions)})")
 
             # 时间筛选（使用created_at字段存储的发布日期）
             if time_filter and time_filter != 'all':
@@ -369,17 +785,9 @@ class Database:
                     # 年月筛选 (如 "2024-11")
                     where_conditions.append("strftime('%Y-%m', created_at) = ?")
                     params.append(time_filter)
-                elif time_filter in ['24h', '2d', '1w', '1m', '3m']:
+                elif time_filter in _TIME_RANGE_DELTAS:
                     # 快捷筛选：最近24小时、2天、1周、1个月、3个月
-                    from datetime import timedelta
-                    time_map = {
-                        '24h': timedelta(hours=24),
-                        '2d': timedelta(days=2),
-                        '1w': timedelta(weeks=1),
-                        '1m': timedelta(days=30),
-                        '3m': timedelta(days=90)
-                    }
-                    delta = time_map.get(time_filter, timedelta(hours=24))
+                    delta = _TIME_RANGE_DELTAS[time_filter]
                     threshold_date = (datetime.now() - delta).strftime('%Y-%m-%d')
                     where_conditions.append("date(created_at) >= ?")
                     params.append(threshold_date)
@@ -387,86 +795,117 @@ class Database:
             where_clause = " AND ".join(where_conditions) if where_conditions else "1=1"
 
             # 验证排序字段
-            valid_sort_fields = ["created_at", "updated_at", "duration"]
-            sort_field = sort_by if sort_by in valid_sort_fields else "updated_at"
+            sort_field = sort_by if sort_by in _VIDEO_SORT_FIELDS else "updated_at"
 
             # 验证排序方向
-            sort_dir = sort_order.upper() if sort_order.upper() in ["ASC", "DESC"] else "DESC"
-
-            # 获取总数
-            count_sql = f"SELECT COUNT(*) FROM videos WHERE {where_clause}"
-            cursor.execute(count_sql, params)
-            total = cursor.fetchone()[0]
-
-            # 获取分页数据
-            offset = (page - 1) * page_size
-            data_sql = f"""
-                SELECT * FROM videos
-                WHERE {where_clause}
-                ORDER BY {sort_field} {sort_dir}
-                LIMIT ? OFFSET ?
-            """
-            cursor.execute(data_sql, params + [page_size, offset])
+            sort_dir = sort_order.upper()
+            if sort_dir not in _SORT_DIRECTIONS:
+                sort_dir = "DESC"
+
+            # 获取总数：优先使用缓存；未命中时在分页查询中用窗口函数一并统计，避免两次扫描
+            count_version = self._videos_version
+            total = self._get_cached_video_count(where_clause, params) if include_total else None
+            count_in_page = include_total and total is None and not after
+
+            # 获取分页数据（rowid 作为次级排序键，保证分页稳定）
+            page_params = list(params)
+            if after:
+                sort_value, last_rowid = _decode_page_cursor(after)
+                keyset_clause, keyset_params = _keyset_condition(sort_field, sort_dir, sort_value, last_rowid)
+                page_where = f"({where_clause}) AND {keyset_clause}"
+                page_params.extend(keyset_params)
+                offset = 0
+            else:
+                page_where = where_clause
+                offset = (page - 1) * page_size
+            data_sql = _VIDEO_PAGE_SQL[(count_in_page, sort_field, sort_dir)].format(where=page_where)
+            cursor.execute(data_sql, page_params + [page_size, offset])
             rows = cursor.fetchall()
+            columns = [column[0] for column in cursor.description]
+            rowid_index = columns.index("_rowid")
+
+            if count_in_page and rows:
+                total = rows[0][rowid_index + 1]
+            if include_total and total is None:
+                # 超出最后一页或使用游标分页时，单独统计总数
+                cursor.execute(f"SELECT COUNT(*) FROM videos WHERE {where_clause}", params)
+                total = cursor.fetchone()[0]
+            if include_total:
+                self._store_video_count(where_clause, params, count_version, total)
+
+            # 生成下一页游标
+            next_cursor = None
+            if rows and len(rows) == page_size:
+                last_row = rows[-1]
+                next_cursor = _encode_page_cursor(
+                    last_row[columns.index(sort_field)], last_row[rowid_index]
+                )
 
+            # 去掉辅助列（_rowid / _total）
             return {
-                "videos": [dict(row) for row in rows],
+                "columns": columns[:rowid_index],
+                "rows": [row[:rowid_index] for row in rows],
                 "total": total,
                 "page": page,
                 "page_size": page_size,
-                "total_pages": (total + page_size - 1) // page_size
+                "total_pages": (total + page_size - 1) // page_size if total is not None else None,
+                "next_cursor": next_cursor
             }
 
+    def _get_cached_video_count(self, where_clause: str, params: list) -> Optional[int]:
+        """获取缓存的视频总数，缓存过期或视频表已写入时返回 None"""
+        cached = self._video_count_cache.get((where_clause, tuple(params)))
+        if cached is not None and cached[0] == self._videos_version and cached[1] > time.monotonic():
+            return cached[2]
+        return None
+
+    def _store_video_count(self, where_clause: str, params: list, version: int, total: int):
+        """缓存视频总数（短时间有效，视频表写入后失效）"""
+        if len(self._video_count_cache) >= self.VIDEO_COUNT_CACHE_SIZE:
+            self._video_count_cache.clear()
+        self._video_count_cache[(where_clause, tuple(params))] = (
+            version, time.monotonic() + self.VIDEO_COUNT_CACHE_TTL, total
+        )
+
+    def _invalidate_video_counts(self):
+        """视频表发生写入，使总数缓存失效"""
+        self._videos_version += 1
+
     def get_video(self, video_id: str) -> Optional[Dict[str, Any]]:
         """获取单个视频"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM videos WHERE video_id = ?", (video_id,))
-            row = cursor.fetchone()
-            return dict(row) if row else None
+            cursor.row_factory = None
+            cursor.execute(_GET_VIDEO_SQL, (video_id,))
+            return _fetch_dict(cursor)
 
-    def create_or_update_video(self, video_data: Dict[str, Any]) -> bool:
-        """创建或更新视频信息"""
+    def create_or_update_video(self, video_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """创建或更新视频信息，成功时返回写入后的视频数据，失败返回 None"""
         with self.get_connection() as conn:
             cursor = conn.cursor()
+            cursor.row_factory = None
             try:
-                # 检查标题是否包含 [中字後補] 标记为不完善
-                title = video_data.get("title", "")
-                is_incomplete = 1 if "[中字後補]" in title else 0
-
-                # 如果提供了 incomplete 字段，使用提供的值；否则根据标题判断
-                incomplete = video_data.get("incomplete", is_incomplete)
+                cursor.execute(_UPSERT_VIDEO_RETURNING_SQL, _video_params(video_data))
+                video = _fetch_dict(cursor)
+                self._invalidate_video_counts()
+                return video
+            except Exception as e:
+                logger.error(f"创建/更新视频信息失败: {e}")
+                return None
 
-                cursor.execute("""
-                    INSERT INTO videos (
-                        video_id, title, series_name, cover_url, duration, local_url,
-                        created_at, updated_at, user_id, incomplete, rename_name
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ON CONFLICT(video_id) DO UPDATE SET
-                        title = excluded.title,
-                        series_name = excluded.series_name,
-                        cover_url = excluded.cover_url,
-                        duration = excluded.duration,
-                        local_url = excluded.local_url,
-                        updated_at = excluded.updated_at,
-                        incomplete = excluded.incomplete,
-                        rename_name = excluded.rename_name
-                """, (
-                    video_data["video_id"],
-                    title,
-                    video_data.get("series_name"),
-                    video_data.get("cover_url"),
-                    video_data.get("duration"),
-                    video_data.get("local_url"),
-                    video_data["created_at"],
-                    video_data["updated_at"],
-                    video_data.get("user_id"),
-                    incomplete,
-                    video_data.get("rename_name")
-                ))
+    def create_or_update_videos_bulk(self, videos: List[Dict[str, Any]]) -> bool:
+        """批量创建或更新视频信息（单个事务内完成）"""
+        if not videos:
+            return True
+        with self.get_connection() as conn:
+            self._begin_immediate(conn)
+            try:
+                conn.executemany(_UPSERT_VIDEO_SQL, [_video_params(video) for video in videos])
+                self._invalidate_video_counts()
                 return True
             except Exception as e:
-                logger.error(f"创建/更新视频信息失败: {e}")
+                conn.rollback()
+                logger.error(f"批量创建/更新视频信息失败: {e}")
                 return False
 
     def delete_video(self, video_id: str) -> bool:
@@ -474,6 +913,7 @@ class Database:
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM videos WHERE video_id = ?", (video_id,))
+            self._invalidate_video_counts()
             return cursor.rowcount > 0
 
     def update_incomplete_video(self, series_name: str, video_title: str, **update_fields) -> bool:
@@ -485,67 +925,41 @@ class Database:
             video_title: 完善版本的标题
             **update_fields: 要更新的字段（title, cover_url, duration, local_url 等）
         """
+        # 提取系列名称部分（去除序号）
+        series_name_base = _RE_TRAILING_NUM.sub('', video_title).strip()
+
+        # 构建更新字段：标记为完善并更新时间戳
+        set_parts = ["incomplete = 0", "updated_at = ?"]
+        values: List[Any] = [datetime.now().isoformat()]
+
+        # 更新标题：优先使用提供的 new_title，否则使用清理后的标题（去除 [中字後補] 标记）
+        if update_fields.get('title'):
+            set_parts.append("title = ?")
+            values.append(update_fields['title'])
+        else:
+            set_parts.append("title = clean_incomplete_title(title)")
+
+        # 更新其他字段（如果提供）
+        # 注意：保持原有的封面不变，除非明确提供新的封面URL
+        for field in ('cover_url', 'duration', 'local_url', 'user_id'):
+            if field in update_fields:
+                set_parts.append(f"{field} = ?")
+                values.append(update_fields[field])
+
         with self.get_connection() as conn:
             cursor = conn.cursor()
             try:
-                # 查找该系列中，标题包含 [中字後補] 的不完善视频
-                # 提取系列名称部分（去除序号）
-                import re
-                series_name_base = re.sub(r'\s+\d+$', '', video_title).strip()
-                
-                # 查找匹配的不完善视频
-                cursor.execute("""
-                    SELECT video_id, title, cover_url, duration, local_url, created_at, user_id
-                    FROM videos
+                # 一条语句更新该系列中所有标题匹配的不完善视频
+                cursor.execute(f"""
+                    UPDATE videos SET {', '.join(set_parts)}
                     WHERE series_name = ?
                     AND incomplete = 1
                     AND (title LIKE ? OR title LIKE ?)
-                    ORDER BY video_id
-                """, (series_name, f"{series_name_base}%", f"%{series_name_base}%"))
-                
-                incomplete_videos = cursor.fetchall()
-                updated_count = 0
-                
-                for video in incomplete_videos:
-                    incomplete_title = video['title']
-                    # 去除不完善视频标题中的 [中字後補] 标记和多余部分
-                    clean_title = re.sub(r'\s*\[中字後補\]\s*', '', incomplete_title).strip()
-                    
-                    # 构建更新数据
-                    update_data = {
-                        'incomplete': 0,  # 标记为完善
-                        'updated_at': datetime.now().isoformat()  # 更新时间戳
-                    }
-                    
-                    # 更新标题：优先使用提供的 new_title，否则使用清理后的标题
-                    if 'title' in update_fields and update_fields['title']:
-                        update_data['title'] = update_fields['title']
-                    else:
-                        update_data['title'] = clean_title
-                    
-                    # 更新其他字段（如果提供）
-                    if 'cover_url' in update_fields:
-                        update_data['cover_url'] = update_fields['cover_url']
-                    if 'duration' in update_fields:
-                        update_data['duration'] = update_fields['duration']
-                    if 'local_url' in update_fields:
-                        update_data['local_url'] = update_fields['local_url']
-                    if 'user_id' in update_fields:
-                        update_data['user_id'] = update_fields['user_id']
-                    
-                    # 注意：保持原有的封面不变，除非明确提供新的封面URL
-                    
-                    # 构建更新语句
-                    set_clause = ", ".join([f"{k} = ?" for k in update_data.keys()])
-                    values = list(update_data.values()) + [video['video_id']]
-                    
-                    cursor.execute(f"""
-                        UPDATE videos SET {set_clause}
-                        WHERE video_id = ?
-                    """, values)
-                    updated_count += 1
-                
+                """, values + [series_name, f"{series_name_base}%", f"%{series_name_base}%"])
+                updated_count = cursor.rowcount
+
                 if updated_count > 0:
+                    self._invalidate_video_counts()
                     logger.info(f"已更新 {updated_count} 个不完善视频信息（系列: {series_name}）")
                 return updated_count > 0
             except Exception as e:
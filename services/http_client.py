@@ -0,0 +1,37 @@
+"""
+共享 HTTP 客户端
+复用 aiohttp 会话和连接池，避免每次请求重新建立 TCP/TLS 连接
+"""
+import asyncio
+from typing import Optional
+
+import aiohttp
+from loguru import logger
+
+
+_session: Optional[aiohttp.ClientSession] = None
+_session_lock: Optional[asyncio.Lock] = None
+
+
+async def get_session() -> aiohttp.ClientSession:
+    """获取共享的 aiohttp 会话（首次调用时创建）"""
+    global _session, _session_lock
+    if _session is not None and not _session.closed:
+        return _session
+
+    if _session_lock is None:
+        _session_lock = asyncio.Lock()
+    async with _session_lock:
+        if _session is None or _session.closed:
+            connector = aiohttp.TCPConnector(limit=32, ttl_dns_cache=300, keepalive_timeout=60)
+            _session = aiohttp.ClientSession(connector=connector)
+            logger.debug("已创建共享 HTTP 会话")
+    return _session
+
+
+async def close_session():
+    """关闭共享的 aiohttp 会话（关闭服务时调用）"""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
@@ -3,27 +3,41 @@
 负责监控下载进度和处理重命名任务
 """
 import asyncio
+import hashlib
+import re
+import time
 from datetime import datetime, timedelta
-from typing import Optional, Dict
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Dict, Tuple
+
+import aiofiles
+import aiohttp
 from loguru import logger
 
 from api.models import TaskStatus
+from api.user_logger import add_user_log_handler
 from services.task_manager import get_task_manager
 from services.pan123_service import (
     Pan123AuthService,
-    Pan123DownloadService,
-    Pan123FolderService
+    Pan123FolderService,
+    get_download_service,
+    get_folder_service
 )
-from config import get_config
+from services.rename_service import RenameService
+from services.database import get_database
+from services.http_client import get_session
+from config import get_config, get_user_config
 from services.auth_manager import get_auth_manager
-from services.user_manager import get_user_manager
+
+# 离线下载得到的原始文件名格式：数字-字母数字p.mp4（例如：110533-sc-1080p.mp4）
+_VIDEO_NAME_RE = re.compile(r'^\d+-[a-zA-Z0-9\-]+p\.mp4$')
 
 
 def _log_to_user(task_data, message: str, level: str = "info"):
     """记录用户日志"""
     user_id = task_data.user_id or "global"
     try:
-        from api.user_logger import add_user_log_handler
         add_user_log_handler(user_id)
         user_logger = logger.bind(user_id=user_id)
         if level == "info":
@@ -36,14 +50,68 @@ def _log_to_user(task_data, message: str, level: str = "info"):
         logger.warning(f"记录用户日志失败: {e}")
 
 
+@lru_cache(maxsize=4096)
+def _parse_create_time(create_at_str: str) -> datetime:
+    """解析云盘文件的创建时间（格式可能是 "2025-01-02 23:46:24" 或 ISO格式）"""
+    try:
+        # 常见的 "YYYY-MM-DD HH:MM:SS" 格式直接按位置解析，跳过 strptime
+        s = create_at_str
+        if len(s) == 19 and s[4] == '-' and s[10] == ' ':
+            return datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]), int(s[11:13]), int(s[14:16]), int(s[17:19]))
+        if 'T' in s:
+            return datetime.fromisoformat(s.replace('Z', '+00:00'))
+        return datetime.strptime(s, "%Y-%m-%d %H:%M:%S")
+    except (ValueError, TypeError):
+        return datetime.min
+
+
+# 封面文件名中需要替换为下划线的字符
+_FILENAME_SANITIZE_TABLE = str.maketrans({c: '_' for c in '<>:"|?*'})
+
+def _parse_created_at(value) -> datetime:
+    """解析视频的创建时间（时间戳、"YYYY-MM-DD HH:MM:SS" 或 ISO 格式）"""
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value)
+    # fromisoformat 同时支持空格和 T 分隔符，只需处理 Z 后缀
+    if value.endswith('Z'):
+        value = value[:-1] + '+00:00'
+    return datetime.fromisoformat(value)
+
+
+def _exc_detail(error: Exception) -> str:
+    """异常描述（异常消息为空时使用类型名和 repr）"""
+    message = str(error)
+    return message if message else f"{type(error).__name__}: {repr(error)}"
+
+
+def _is_auth_error(error: Exception) -> bool:
+    """判断异常是否由 token 失效引起"""
+    message = str(error).lower()
+    return "401" in message or "token" in message or "过期" in message
+
+
 class MonitorService:
     """后台监控服务"""
 
+    # 认证服务本地缓存时间（秒），token 临近刷新时间时会更早失效
+    AUTH_CACHE_TTL = 300
+
     def __init__(self):
         self._running = False
         self._task: Optional[asyncio.Task] = None
         # 移除重复的 _auth_services 缓存，统一使用 auth_manager 的缓存
         self._last_cleanup_time: Optional[datetime] = None  # 上次清理时间
+        # 唤醒事件（在 start 中创建，确保绑定到运行中的事件循环）
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # 认证服务缓存 {user_id: (auth_service, 过期时间(monotonic))}
+        self._auth_cache: Dict[str, Tuple[Pan123AuthService, float]] = {}
+        # 已记录过“无法创建认证服务”警告的用户，避免每次检查重复输出
+        self._warned_users: set = set()
+        # 停止信号，用于中止等待中的封面推送
+        self._stop_event: Optional[asyncio.Event] = None
+        # 进行中的封面推送任务（保留引用，避免被垃圾回收）
+        self._cover_tasks: set = set()
 
     async def start(self):
         """启动监控服务"""
@@ -52,15 +120,36 @@ class MonitorService:
             return
 
         self._running = True
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._stop_event = asyncio.Event()
+        get_task_manager().set_task_active_callback(self.notify)
         logger.info("监控服务已启动")
         self._task = asyncio.create_task(self._monitor_loop())
 
+    def notify(self):
+        """唤醒监控循环立即检查任务（可在任意线程调用）"""
+        if self._wake is None or self._loop is None or self._loop.is_closed():
+            return
+        try:
+            if asyncio.get_running_loop() is self._loop:
+                self._wake.set()
+                return
+        except RuntimeError:
+            pass
+        self._loop.call_soon_threadsafe(self._wake.set)
+
     async def stop(self):
         """停止监控服务"""
         if not self._running:
             return
 
         self._running = False
+        get_task_manager().set_task_active_callback(None)
+        if self._wake:
+            self._wake.set()
+        if self._stop_event:
+            self._stop_event.set()
         if self._task:
             self._task.cancel()
             try:
@@ -83,102 +172,152 @@ class MonitorService:
                     await self._cleanup_completed_tasks()
                     self._last_cleanup_time = now
             except Exception as e:
-                import traceback
-                error_detail = str(e) if str(e) else f"{type(e).__name__}: {repr(e)}"
+                error_detail = _exc_detail(e)
                 logger.error(f"监控任务时出错: {error_detail}")
-                logger.debug(f"异常堆栈: {traceback.format_exc()}")
+                logger.opt(exception=True).debug("异常堆栈")
 
-            # 等待下一次检查
-            await asyncio.sleep(config.monitoring.check_interval)
+            # 等待下一次检查：有任务进入活跃状态时立即唤醒，否则等到检查间隔
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=config.monitoring.check_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _get_auth_service(self, user_id: str) -> Pan123AuthService:
+        """获取用户的认证服务（本地缓存，避免每次检查都经过 auth_manager）"""
+        now = time.monotonic()
+        cache_key = user_id if user_id != "global" else None
+        auth_manager = get_auth_manager()
+        cached = self._auth_cache.get(user_id)
+        # auth_manager 丢弃或替换实例后（例如重置配置），本地缓存随之失效
+        if cached and now < cached[1] and auth_manager.get_cached_auth_service(cache_key) is cached[0]:
+            return cached[0]
+
+        auth_service = await auth_manager.get_auth_service(cache_key)
+
+        # 缓存到 token 需要刷新之前（auth_service 在过期前 1 小时刷新 token）
+        ttl = self.AUTH_CACHE_TTL
+        if auth_service._token_expires_at:
+            ttl = min(ttl, auth_service._token_valid_until_monotonic - now)
+        if ttl > 0:
+            self._auth_cache[user_id] = (auth_service, now + ttl)
+        else:
+            self._auth_cache.pop(user_id, None)
+        return auth_service
+
+    def _invalidate_auth_service(self, user_id: Optional[str]):
+        """清除用户的认证服务缓存"""
+        self._auth_cache.pop(user_id or "global", None)
 
     async def check_all_tasks(self):
         """检查所有任务状态"""
         task_manager = get_task_manager()
 
         # 获取所有进行中的任务，按 user_id 分组
-        tasks_by_user = {}
-        for task_data in task_manager.list_tasks():
-            if task_data.status not in [TaskStatus.DOWNLOADING.value, TaskStatus.RENAMING.value]:
-                continue
-
-            user_id = task_data.user_id or "global"
-            if user_id not in tasks_by_user:
-                tasks_by_user[user_id] = []
-            tasks_by_user[user_id].append(task_data)
+        tasks_by_user = task_manager.get_active_tasks_by_user()
 
         # 如果没有进行中的任务，直接返回
         if not tasks_by_user:
             return
 
-        # 为每个用户获取对应的认证服务（优先使用缓存）
-        auth_manager = get_auth_manager()
-        user_manager = get_user_manager()
+        # 并发检查各用户的任务，信号量限制同时进行的 API 请求数
+        semaphore = asyncio.Semaphore(get_config().monitoring.max_concurrency or 16)
+        await asyncio.gather(
+            *[
+                self._scan_user(task_manager, user_id, tasks, semaphore)
+                for user_id, tasks in tasks_by_user.items()
+            ],
+            return_exceptions=True
+        )
 
-        for user_id, tasks in tasks_by_user.items():
-            auth_service = None
+    async def _scan_user(self, task_manager, user_id: str, tasks: list, semaphore: asyncio.Semaphore):
+        """检查单个用户的所有进行中任务"""
+        auth_service = None
 
+        try:
+            # 统一使用 get_auth_service 方法获取认证服务（优先使用缓存）
+            # 传递正确的 user_id（包括 "global"）
             try:
-                # 统一使用 get_auth_service 方法获取认证服务
-                # 传递正确的 user_id（包括 "global"）
-                cache_key = user_id if user_id != "global" else None
-                try:
-                    auth_service = await auth_manager.get_auth_service(cache_key)
-                except Exception as e:
-                    # 只在第一次出现时记录警告
-                    if not hasattr(self, f'_warned_{cache_key}'):
-                        logger.warning(f"用户 {user_id} 无法创建认证服务: {e}")
-                        setattr(self, f'_warned_{cache_key}', True)
-                    auth_service = None
-
-                if not auth_service:
-                    # 将这些任务标记为失败（静默处理，不重复记录日志）
-                    for task in tasks:
-                        task_manager.update_task(
-                            task.task_id,
-                            status=TaskStatus.FAILED,
-                            error_message="123云盘未配置"
-                        )
-                    continue
-
-                # 监控该用户的所有任务
-                for task_data in tasks:
-                    try:
-                        await self._monitor_single_task(task_manager, task_data, auth_service)
-                    except Exception as e:
-                        import traceback
-                        error_detail = str(e) if str(e) else f"{type(e).__name__}: {repr(e)}"
-                        logger.error(f"监控任务 {task_data.task_id} 失败: {error_detail}")
-                        logger.debug(f"异常堆栈: {traceback.format_exc()}")
-
+                auth_service = await self._get_auth_service(user_id)
+                self._warned_users.discard(user_id)
             except Exception as e:
-                import traceback
-                error_detail = str(e) if str(e) else f"{type(e).__name__}: {repr(e)}"
-                logger.error(f"为用户 {user_id} 创建认证服务失败: {error_detail}")
-                logger.debug(f"异常堆栈: {traceback.format_exc()}")
-
-                # 将该用户的所有任务标记为失败
+                # 只在第一次出现时记录警告
+                if user_id not in self._warned_users:
+                    logger.warning(f"用户 {user_id} 无法创建认证服务: {e}")
+                    self._warned_users.add(user_id)
+                auth_service = None
+
+            if not auth_service:
+                # 将这些任务标记为失败（静默处理，不重复记录日志）
                 for task in tasks:
                     task_manager.update_task(
                         task.task_id,
                         status=TaskStatus.FAILED,
-                        error_message=f"认证服务错误: {error_detail}"
+                        error_message="123云盘未配置"
                     )
+                return
+
+            # 一次性查询该用户所有下载中任务的进度
+            download_task_ids = [
+                task_data.download_task_id for task_data in tasks
+                if task_data.status == TaskStatus.DOWNLOADING.value and task_data.download_task_id
+            ]
+            # 每个进度查询各占用一个许可，使 monitoring.max_concurrency 限制实际的并发请求数
+            progress_by_id = await get_download_service(auth_service).get_download_progress_batch(
+                download_task_ids, semaphore
+            )
+
+            # 并发监控该用户的所有任务
+            async def monitor(task_data):
+                async with semaphore:
+                    try:
+                        await self._monitor_single_task(
+                            task_manager, task_data, auth_service,
+                            progress_by_id.get(task_data.download_task_id)
+                        )
+                    except Exception as e:
+                        error_detail = _exc_detail(e)
+                        logger.error(f"监控任务 {task_data.task_id} 失败: {error_detail}")
+                        logger.opt(exception=True).debug("异常堆栈")
+
+            await asyncio.gather(*[monitor(task_data) for task_data in tasks])
+
+        except Exception as e:
+            error_detail = _exc_detail(e)
+            logger.error(f"为用户 {user_id} 创建认证服务失败: {error_detail}")
+            logger.opt(exception=True).debug("异常堆栈")
+
+            # 将该用户的所有任务标记为失败
+            for task in tasks:
+                task_manager.update_task(
+                    task.task_id,
+                    status=TaskStatus.FAILED,
+                    error_message=f"认证服务错误: {error_detail}"
+                )
 
     async def _monitor_single_task(
         self,
         task_manager,
         task_data,
-        auth_service: Pan123AuthService
+        auth_service: Pan123AuthService,
+        progress_info: Optional[object] = None
     ):
-        """监控单个任务"""
+        """监控单个任务
+
+        Args:
+            progress_info: 已批量查询到的下载进度（查询失败时为异常对象），为空时单独查询
+        """
         task_id = task_data.task_id
 
         # 下载中状态
         if task_data.status == TaskStatus.DOWNLOADING.value and task_data.download_task_id:
-            download_service = Pan123DownloadService(auth_service)
+            download_service = get_download_service(auth_service)
 
             try:
-                progress_info = await download_service.get_download_progress(task_data.download_task_id)
+                if progress_info is None:
+                    progress_info = await download_service.get_download_progress(task_data.download_task_id)
+                elif isinstance(progress_info, BaseException):
+                    raise progress_info
                 progress = progress_info["progress"]
                 status_code = progress_info["status"]
 
@@ -190,130 +329,79 @@ class MonitorService:
                     logger.info(f"任务 {task_id} 下载完成，准备重命名")
                     _log_to_user(task_data, f"任务下载完成: {task_data.title}")
 
-                    # 查找下载的文件
-                    folder_service = Pan123FolderService(auth_service)
-                    files = await folder_service.list_files(task_data.folder_id)
-
-                    if files:
-                        # 查找匹配的文件：优先查找未重命名的文件（格式：xxxxxx-xxxp.mp4）
-                        # 并且是最近创建的文件（根据创建时间排序）
-                        import re
-                        from datetime import datetime
-
-                        # 过滤出视频文件（格式：xxxxxx-xxxp.mp4），且不在回收站
-                        video_files = []
-                        for f in files:
-                            if f.type == 0 and f.trashed == 0:  # 文件且不在回收站
-                                # 检查文件名格式：数字-字母数字p.mp4（例如：110533-sc-1080p.mp4）
-                                if re.match(r'^\d+-[a-zA-Z0-9\-]+p\.mp4$', f.filename):
-                                    video_files.append(f)
-                        
-                        # 如果没有找到符合格式的文件，使用所有mp4文件（不在回收站）
-                        if not video_files:
-                            video_files = [f for f in files if f.type == 0 and f.trashed == 0 and f.filename.endswith('.mp4')]
-                        
-                        # 按创建时间排序，最新的在前
-                        def parse_create_time(create_at_str):
-                            try:
-                                # 尝试解析时间字符串（格式可能是 "2025-01-02 23:46:24" 或 ISO格式）
-                                if 'T' in create_at_str:
-                                    return datetime.fromisoformat(create_at_str.replace('Z', '+00:00'))
-                                else:
-                                    return datetime.strptime(create_at_str, "%Y-%m-%d %H:%M:%S")
-                            except:
-                                return datetime.min
-                        
-                        video_files.sort(key=lambda f: parse_create_time(f.create_at), reverse=True)
-                        
-                        # 查找未被其他任务使用的文件
-                        task_manager_instance = get_task_manager()
-                        used_file_ids = {
-                            t.file_id for t in task_manager_instance.list_tasks() 
-                            if t.file_id is not None and t.task_id != task_id
-                        }
-                        
-                        # 找到第一个未被使用的文件（优先选择未重命名的文件）
-                        file = None
-                        for f in video_files:
-                            if f.file_id not in used_file_ids:
-                                # 优先选择未重命名的文件（格式：xxxxxx-xxxp.mp4）
-                                if re.match(r'^\d+-[a-zA-Z0-9\-]+p\.mp4$', f.filename):
-                                    file = f
-                                    break
-                        
-                        # 如果没找到未重命名的文件，使用第一个未被使用的文件
+                    file_id = None
+                    if task_data.file_id is not None and await self._can_reuse_file(task_data, auth_service):
+                        # 之前已为该任务分配过文件且仍未重命名，直接复用，跳过列出目录
+                        file_id = task_data.file_id
+                        task_manager.update_task(task_id, status=TaskStatus.RENAMING)
+                        logger.info(f"复用已分配的文件 ID: {file_id}, 将重命名为: {task_data.desired_name}")
+                    else:
+                        # 查找下载的文件
+                        file = await self._find_downloaded_file(task_manager, task_data, auth_service)
                         if file is None:
-                            for f in video_files:
-                                if f.file_id not in used_file_ids:
-                                    file = f
-                                    break
-                        
-                        # 如果所有文件都被使用，使用最新的文件（可能是重试的情况）
-                        if file is None and video_files:
-                            file = video_files[0]
-                            logger.warning(f"所有文件都已被使用，使用最新文件: {file.filename}")
-                        
-                        if file:
-                            task_manager.update_task(
-                                task_id,
-                                file_id=file.file_id,
-                                status=TaskStatus.RENAMING
-                            )
-                            logger.info(f"找到文件: {file.filename}, ID: {file.file_id}, 将重命名为: {task_data.desired_name}")
-
-                            # 记录用户日志：开始重命名
-                            _log_to_user(task_data, f"开始重命名: {task_data.title}")
-
-                        # 触发重命名
-                        from services.rename_service import RenameService
-                        rename_service = RenameService(auth_service)
-                        success = await rename_service.execute_rename(
-                            file_id=file.file_id,
-                            desired_name=task_data.desired_name,
-                            video_id=task_data.video_id
+                            # 未找到文件，等待下次检查
+                            logger.warning(f"任务 {task_id} 未找到下载的文件")
+                            return
+
+                        file_id = file.file_id
+                        task_manager.update_task(
+                            task_id,
+                            file_id=file_id,
+                            status=TaskStatus.RENAMING
                         )
+                        logger.info(f"找到文件: {file.filename}, ID: {file_id}, 将重命名为: {task_data.desired_name}")
 
-                        if success:
-                            task_manager.update_task(
-                                task_id,
-                                status=TaskStatus.COMPLETED
-                            )
-                            logger.info(f"任务 {task_id} 重命名完成")
-                            # 记录用户日志：重命名完成
-                            _log_to_user(task_data, f"重命名完成: {task_data.title}")
-                            _log_to_user(task_data, f"任务完成: {task_data.title}")
-
-                            # 延迟5秒后自动推送封面
-                            asyncio.create_task(auto_push_cover_after_delay(
-                                task_data.video_id, 
-                                task_data.user_id,
-                                task_id,
-                                delay_seconds=5
-                            ))
-                            logger.info(f"已安排自动推送封面任务：视频 {task_data.video_id}，延迟5秒")
-
-                            # 任务完成后，更新该系列的不完善视频信息
-                            try:
-                                from services.database import get_database
-                                db = get_database()
-                                # 获取视频信息以获取系列名称
-                                video_info = db.get_video(task_data.video_id)
-                                if video_info and video_info.get("series_name"):
-                                    # 更新该系列中标记为不完善的视频信息
-                                    db.update_incomplete_video(video_info["series_name"], task_data.title)
-                                    logger.debug(f"已更新系列 {video_info['series_name']} 的不完善视频信息")
-                            except Exception as e:
-                                logger.warning(f"更新不完善视频失败: {e}")
-                        else:
-                            task_manager.update_task(
-                                task_id,
-                                status=TaskStatus.FAILED,
-                                error_message="重命名失败"
-                            )
-                            _log_to_user(task_data, f"任务重命名失败: {task_data.title}", "error")
+                    # 记录用户日志：开始重命名
+                    _log_to_user(task_data, f"开始重命名: {task_data.title}")
+
+                    # 触发重命名
+                    rename_service = RenameService(auth_service)
+                    success = await rename_service.execute_rename(
+                        file_id=file_id,
+                        desired_name=task_data.desired_name,
+                        video_id=task_data.video_id
+                    )
+
+                    if success:
+                        task_manager.update_task(
+                            task_id,
+                            status=TaskStatus.COMPLETED
+                        )
+                        logger.info(f"任务 {task_id} 重命名完成")
+                        # 记录用户日志：重命名完成
+                        _log_to_user(task_data, f"重命名完成: {task_data.title}")
+                        _log_to_user(task_data, f"任务完成: {task_data.title}")
+
+                        # 延迟5秒后自动推送封面
+                        cover_task = asyncio.create_task(auto_push_cover_after_delay(
+                            task_data.video_id,
+                            task_data.user_id,
+                            task_id,
+                            delay_seconds=5,
+                            stop_event=self._stop_event
+                        ))
+                        self._cover_tasks.add(cover_task)
+                        cover_task.add_done_callback(self._cover_tasks.discard)
+                        logger.info(f"已安排自动推送封面任务：视频 {task_data.video_id}，延迟5秒")
+
+                        # 任务完成后，更新该系列的不完善视频信息
+                        try:
+                            db = get_database()
+                            # 获取视频信息以获取系列名称
+                            video_info = db.get_video(task_data.video_id)
+                            if video_info and video_info.get("series_name"):
+                                # 更新该系列中标记为不完善的视频信息
+                                db.update_incomplete_video(video_info["series_name"], task_data.title)
+                                logger.debug(f"已更新系列 {video_info['series_name']} 的不完善视频信息")
+                        except Exception as e:
+                            logger.warning(f"更新不完善视频失败: {e}")
                     else:
-                        # 未找到文件，等待下次检查
-                        logger.warning(f"任务 {task_id} 未找到下载的文件")
+                        task_manager.update_task(
+                            task_id,
+                            status=TaskStatus.FAILED,
+                            error_message="重命名失败"
+                        )
+                        _log_to_user(task_data, f"任务重命名失败: {task_data.title}", "error")
 
                 elif status_code == 1:  # 下载失败
                     # 检查是否已经重试过
@@ -323,7 +411,7 @@ class MonitorService:
                         logger.info(f"任务 {task_id} 下载失败，尝试重试 (第 {task_data.retry_count + 1} 次)")
                         try:
                             # 重新创建下载任务
-                            download_service = Pan123DownloadService(auth_service)
+                            download_service = get_download_service(auth_service)
                             new_download_task_id = await download_service.create_download_task(
                                 task_data.download_url,
                                 task_data.folder_id
@@ -362,8 +450,69 @@ class MonitorService:
                 if "未找到任务ID" in str(e) or "not found task id" in str(e).lower():
                     task_manager.delete_task(task_id)
                 else:
+                    if _is_auth_error(e):
+                        self._invalidate_auth_service(task_data.user_id)
                     logger.error(f"查询下载进度失败: {e}")
     
+    async def _can_reuse_file(self, task_data, auth_service: Pan123AuthService) -> bool:
+        """检查任务已关联的文件是否仍是未重命名的下载文件（格式：xxxxxx-xxxp.mp4）"""
+        folder_service = get_folder_service(auth_service, task_data.user_id)
+        try:
+            file = await folder_service.get_file_detail(task_data.file_id)
+        except Exception as e:
+            logger.debug(f"获取文件详情失败: {task_data.file_id}, {e}")
+            return False
+        return (
+            file is not None
+            and file.trashed == 0
+            and file.filename != task_data.desired_name
+            and _VIDEO_NAME_RE.match(file.filename) is not None
+        )
+
+    async def _find_downloaded_file(self, task_manager, task_data, auth_service: Pan123AuthService):
+        """在任务目录中查找离线下载得到的文件，未找到时返回 None"""
+        task_id = task_data.task_id
+        folder_service = get_folder_service(auth_service, task_data.user_id)
+        files = await folder_service.list_files(task_data.folder_id)
+        if not files:
+            return None
+
+        # 查找匹配的文件：优先查找未重命名的文件（格式：xxxxxx-xxxp.mp4）
+        # 并且是最近创建的文件（根据创建时间排序）
+        # 过滤出视频文件（格式：xxxxxx-xxxp.mp4），且不在回收站
+        video_files = [
+            f for f in files
+            if f.type == 0 and f.trashed == 0 and _VIDEO_NAME_RE.match(f.filename)
+        ]
+
+        # 如果没有找到符合格式的文件，使用所有mp4文件（不在回收站）
+        if not video_files:
+            video_files = [f for f in files if f.type == 0 and f.trashed == 0 and f.filename.endswith('.mp4')]
+
+        # 按创建时间排序，最新的在前
+        video_files.sort(key=lambda f: _parse_create_time(f.create_at), reverse=True)
+
+        # 一次遍历找到未被其他任务使用的文件：优先选择未重命名的文件（格式：xxxxxx-xxxp.mp4），
+        # 否则使用第一个未被使用的文件
+        file = None
+        first_unused = None
+        for f in video_files:
+            if task_manager.is_file_id_used(f.file_id, task_id):
+                continue
+            if first_unused is None:
+                first_unused = f
+            if _VIDEO_NAME_RE.match(f.filename):
+                file = f
+                break
+        if file is None:
+            file = first_unused
+
+        # 如果所有文件都被使用，使用最新的文件（可能是重试的情况）
+        if file is None and video_files:
+            file = video_files[0]
+            logger.warning(f"所有文件都已被使用，使用最新文件: {file.filename}")
+        return file
+
     async def _cleanup_completed_tasks(self):
         """清理已完成超过1小时的任务"""
         try:
@@ -371,26 +520,14 @@ class MonitorService:
             now = datetime.now()
             one_hour_ago = now - timedelta(hours=1)
             
-            completed_tasks = [
-                task for task in task_manager.list_tasks()
-                if task.status == TaskStatus.COMPLETED.value
-            ]
-            
             deleted_count = 0
-            for task in completed_tasks:
-                try:
-                    # 解析更新时间
-                    updated_at = datetime.fromisoformat(task.updated_at)
-                    # 如果完成时间超过1小时，删除任务
-                    if updated_at < one_hour_ago:
-                        if task_manager.delete_task(task.task_id):
-                            deleted_count += 1
-                            # 使用debug级别，减少日志输出
-                            logger.debug(f"自动删除已完成任务: {task.task_id} ({task.title})")
-                except (ValueError, TypeError) as e:
-                    logger.debug(f"解析任务时间失败: {task.task_id}, {e}")
-                    continue
-            
+            for task_id in task_manager.pop_expired(one_hour_ago):
+                task = task_manager.get_task(task_id)
+                if task_manager.delete_task(task_id):
+                    deleted_count += 1
+                    # 使用debug级别，减少日志输出
+                    logger.debug(f"自动删除已完成任务: {task_id} ({task.title})")
+
             if deleted_count > 0:
                 # 只在有删除操作时输出一次汇总日志
                 logger.info(f"自动清理了 {deleted_count} 个已完成任务")
@@ -398,11 +535,19 @@ class MonitorService:
             logger.error(f"清理已完成任务时出错: {e}")
 
 
-async def auto_push_cover_after_delay(video_id: str, user_id: str, task_id: str, delay_seconds: int = 5):
-    """延迟后自动推送视频封面"""
-    try:
-        from pathlib import Path
+async def auto_push_cover_after_delay(
+    video_id: str,
+    user_id: str,
+    task_id: str,
+    delay_seconds: int = 5,
+    stop_event: Optional[asyncio.Event] = None
+):
+    """延迟后自动推送视频封面
 
+    Args:
+        stop_event: 监控服务的停止信号，等待期间被设置时放弃推送
+    """
+    try:
         # 在延迟前先检查封面文件是否存在
         subdir = str(video_id)[:2] if len(str(video_id)) >= 2 else "00"
         cover_path = Path(__file__).parent.parent / "data" / "covers" / subdir / f"{video_id}.jpg"
@@ -412,16 +557,17 @@ async def auto_push_cover_after_delay(video_id: str, user_id: str, task_id: str,
 
         logger.info(f"视频 {video_id} 的封面文件存在，等待 {delay_seconds} 秒后自动推送")
         _log_to_user(type('TaskData', (), {'user_id': user_id})(), f"检测到封面文件，{delay_seconds}秒后自动上传")
-        await asyncio.sleep(delay_seconds)
+        if stop_event is None:
+            await asyncio.sleep(delay_seconds)
+        else:
+            try:
+                await asyncio.wait_for(stop_event.wait(), timeout=delay_seconds)
+                logger.info(f"监控服务已停止，取消自动推送视频 {video_id} 的封面")
+                return
+            except asyncio.TimeoutError:
+                pass
         logger.info(f"开始自动推送视频 {video_id} 的封面")
         # 先获取视频信息用于日志
-        from services.database import get_database
-        from config import get_user_config
-        from services.task_manager import get_task_manager
-        import hashlib
-        import aiofiles
-        import aiohttp
-
         db = get_database()
         task_manager = get_task_manager()
         video = db.get_video(video_id)
@@ -447,13 +593,13 @@ async def auto_push_cover_after_delay(video_id: str, user_id: str, task_id: str,
         auth_manager = get_auth_manager()
         auth_service = await auth_manager.get_auth_service(user_id)
 
-        # 读取封面文件
+        # 分块计算文件MD5，不把整个封面读入内存
+        md5 = hashlib.md5()
         async with aiofiles.open(cover_path, 'rb') as f:
-            cover_data = await f.read()
-
-        # 计算文件MD5
-        file_md5 = hashlib.md5(cover_data).hexdigest()
-        file_size = len(cover_data)
+            while chunk := await f.read(65536):
+                md5.update(chunk)
+        file_md5 = md5.hexdigest()
+        file_size = cover_path.stat().st_size
 
         # 生成文件名
         original_filename = video.get('rename_name', video.get('title', video_id))
@@ -463,14 +609,14 @@ async def auto_push_cover_after_delay(video_id: str, user_id: str, task_id: str,
             base_name = original_filename
 
         poster_filename = f"{base_name}-poster.jpg"
-        poster_filename = poster_filename.replace('<', '_').replace('>', '_').replace(':', '_').replace('"', '_').replace('|', '_').replace('?', '_').replace('*', '_')
+        poster_filename = poster_filename.translate(_FILENAME_SANITIZE_TABLE)
         if not poster_filename.strip():
             poster_filename = f"{video_id}-poster.jpg"
         if len(poster_filename) > 250:
             poster_filename = poster_filename[:250] + ".jpg"
 
         # 确定目标目录
-        folder_service = Pan123FolderService(auth_service, user_id)
+        folder_service = get_folder_service(auth_service, user_id)
         root_dir_id = config.pan123.root_dir_id
         target_folder_id = None
 
@@ -478,13 +624,7 @@ async def auto_push_cover_after_delay(video_id: str, user_id: str, task_id: str,
         created_at = video.get('created_at', '')
         if created_at:
             try:
-                if isinstance(created_at, str):
-                    if 'T' in created_at:
-                        dt = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                    else:
-                        dt = datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S')
-                else:
-                    dt = datetime.fromtimestamp(created_at)
+                dt = _parse_created_at(created_at)
 
                 year = str(dt.year)
                 month = str(dt.month).zfill(2)
@@ -512,19 +652,21 @@ async def auto_push_cover_after_delay(video_id: str, user_id: str, task_id: str,
         task_manager.update_task(task_id, status=TaskStatus.COVER_UPLOADING)
         _log_to_user(type('TaskData', (), {'user_id': user_id})(), f"正在上传封面文件: {poster_filename}")
 
-        data = aiohttp.FormData()
-        data.add_field('parentFileID', str(target_folder_id))
-        data.add_field('filename', poster_filename)
-        data.add_field('etag', file_md5)
-        data.add_field('size', str(file_size))
-        data.add_field('file', cover_data, filename=poster_filename, content_type='image/jpeg')
-
         headers = {
             "Authorization": auth_service.get_auth_header(),
             "Platform": "open_platform"
         }
 
-        async with aiohttp.ClientSession() as session:
+        session = await get_session()
+        # 以文件对象作为表单字段，由 aiohttp 分块读取并发送
+        with open(cover_path, 'rb') as cover_file:
+            data = aiohttp.FormData()
+            data.add_field('parentFileID', str(target_folder_id))
+            data.add_field('filename', poster_filename)
+            data.add_field('etag', file_md5)
+            data.add_field('size', str(file_size))
+            data.add_field('file', cover_file, filename=poster_filename, content_type='image/jpeg')
+
             async with session.post(upload_url, data=data, headers=headers) as response:
                 if response.status == 200:
                     result = await response.json()
@@ -535,6 +677,9 @@ async def auto_push_cover_after_delay(video_id: str, user_id: str, task_id: str,
                         # 记录用户日志
                         _log_to_user(type('TaskData', (), {'user_id': user_id})(), f"封面上传成功: {poster_filename}")
                     else:
+                        # 目录可能已被删除，清除缓存以便下次重新查找
+                        if "目录" in str(result.get('message')) or "不存在" in str(result.get('message')):
+                            folder_service._invalidate_folder_cache(folder_ids=[target_folder_id])
                         logger.warning(f"自动推送封面失败：{result.get('message')}")
                         task_manager.update_task(task_id, status=TaskStatus.COVER_UPLOAD_FAILED, error_message=f"封面上传失败: {result.get('message')}")
                         # 记录用户日志
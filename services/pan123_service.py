@@ -3,15 +3,134 @@
 """
 import httpx
 import json
-from typing import Optional, List, Dict, Tuple
+import orjson
+from typing import Optional, List, Dict, Tuple, AsyncIterator
+from collections import OrderedDict
+from contextlib import aclosing
+from operator import itemgetter
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from loguru import logger
 import asyncio
+import os
+import random
+import secrets
 import time
 
 
-@dataclass
+class DynamicLimiter:
+    """可在运行时调整上限的并发限制器
+
+    asyncio.Semaphore 无法安全地修改许可数，这里用 Condition + 计数实现；
+    调小上限时已在进行的请求不受影响，新请求等到并发数降到新上限以下才继续。
+    收到限流信号时通过 backoff 临时降低上限，之后每连续成功 RECOVER_AFTER 次恢复一个许可，
+    最多恢复到 set_limit 设置的上限。
+    """
+
+    # 两次自动降低上限之间的最小间隔（秒），同一波限流响应只降一次
+    BACKOFF_COOLDOWN = 5.0
+    # 自动降低后，连续成功多少次恢复一个许可
+    RECOVER_AFTER = 50
+
+    def __init__(self, limit: int):
+        self._limit = max(1, limit)
+        self._max_limit = self._limit
+        self._active = 0
+        self._cond = asyncio.Condition()
+        self._last_backoff = float("-inf")
+        self._successes = 0
+
+    @property
+    def limit(self) -> int:
+        return self._limit
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._active < self._limit)
+            self._active += 1
+
+    async def release(self):
+        # 先释放计数再唤醒；唤醒放在 shield 中，调用方被取消时也不会漏掉通知
+        self._active -= 1
+        await asyncio.shield(self._notify())
+
+    async def _notify(self):
+        async with self._cond:
+            self._cond.notify(1)
+
+    async def set_limit(self, limit: int):
+        """修改并发上限（同时作为自动恢复的上限），调大时立即唤醒等待中的请求"""
+        async with self._cond:
+            self._limit = self._max_limit = max(1, limit)
+            self._successes = 0
+            self._cond.notify_all()
+
+    def backoff(self) -> bool:
+        """收到限流信号时将上限减一（冷却期内只降一次），返回是否降低了上限"""
+        now = time.monotonic()
+        if self._limit <= 1 or now - self._last_backoff < self.BACKOFF_COOLDOWN:
+            return False
+        self._limit -= 1
+        self._last_backoff = now
+        self._successes = 0
+        return True
+
+    async def record_success(self) -> bool:
+        """记录一次未被限流的请求，连续成功足够次数后恢复一个许可，返回是否提高了上限"""
+        if self._limit >= self._max_limit:
+            return False
+        self._successes += 1
+        if self._successes < self.RECOVER_AFTER:
+            return False
+        self._successes = 0
+        async with self._cond:
+            self._limit = min(self._limit + 1, self._max_limit)
+            self._cond.notify_all()
+        return True
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+
+# 所有账号共享的123云盘请求并发上限，避免批量创建任务时触发限流或耗尽连接
+PAN123_MAX_CONCURRENCY = int(os.environ.get("PAN123_MAX_CONCURRENCY", "10"))
+PAN123_LIMIT = DynamicLimiter(PAN123_MAX_CONCURRENCY)
+
+
+class _LimitedTransport(httpx.AsyncHTTPTransport):
+    """发送请求前获取全局并发许可的传输层，覆盖经共享客户端发出的所有请求
+
+    收到 429 时降低并发上限，之后的正常响应逐步恢复，由服务端的限流信号自动调节请求压力
+    """
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        async with PAN123_LIMIT:
+            response = await super().handle_async_request(request)
+        if response.status_code == 429:
+            if PAN123_LIMIT.backoff():
+                logger.warning(f"123云盘返回429，请求并发上限降为 {PAN123_LIMIT.limit}")
+        elif await PAN123_LIMIT.record_success():
+            logger.info(f"123云盘请求并发上限恢复为 {PAN123_LIMIT.limit}")
+        return response
+
+
+class Pan123DirNotFoundError(Exception):
+    """离线下载的目标目录ID不存在（目录已被删除或移动）"""
+
+    def __init__(self, message: str, code: Optional[int] = None):
+        super().__init__(message)
+        self.code = code
+
+
+@dataclass(slots=True, frozen=True, eq=False, match_args=False)
 class FileInfo:
     """文件信息"""
     file_id: int
@@ -27,6 +146,66 @@ class FileInfo:
     update_at: int
 
 
+def _decode(response: httpx.Response) -> dict:
+    """解析响应体JSON（orjson 比标准库 json 快数倍）"""
+    return orjson.loads(response.content)
+
+
+def _retry_delay(attempt: int, initial_delay: float, retry_after: Optional[str] = None,
+                 max_delay: float = 30.0) -> float:
+    """计算重试等待时间：优先遵循 Retry-After（秒），否则使用带随机抖动的指数退避，避免并发重试同时撞上限流"""
+    if retry_after:
+        try:
+            return min(max_delay, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+    return min(max_delay, initial_delay * (2 ** attempt) * (0.5 + random.random()))
+
+
+# 获取token失败时，表示网络超时、限流或服务端临时故障的错误特征（其余视为凭据错误等不可自愈的失败）
+_TRANSIENT_TOKEN_ERRORS = ("超时", "timed out", "频繁", "请稍后", "429", "Server error", "HTTP 5")
+
+
+def _is_transient_token_error(error: Exception) -> bool:
+    """判断获取token的失败是否为可短时间重试的临时错误"""
+    if isinstance(error, httpx.TransportError):
+        return True
+    error_msg = str(error)
+    return any(marker in error_msg for marker in _TRANSIENT_TOKEN_ERRORS)
+
+
+# 按 FileInfo 字段顺序一次取出开放平台文件列表项的各字段
+_FILE_FIELDS = itemgetter(
+    "fileId", "filename", "parentFileId", "type", "size", "etag",
+    "status", "category", "trashed", "createAt", "updateAt"
+)
+
+
+def _is_duplicate_error(error_msg: str) -> bool:
+    """判断创建文件夹的错误是否因为同名文件夹已存在"""
+    return ("已存在" in error_msg or "重名" in error_msg or "duplicate" in error_msg.lower() or
+            "同名文件夹" in error_msg or "无法进行创建" in error_msg)
+
+
+def _discard_task(task: Optional[asyncio.Task]):
+    """丢弃不再需要的预取任务：未完成则取消，已完成则读取异常避免未处理异常警告"""
+    if task is None:
+        return
+    if not task.done():
+        task.cancel()
+    elif not task.cancelled():
+        task.exception()
+
+
+def _parse_file_list(items: List[dict]) -> List[FileInfo]:
+    """将开放平台文件列表接口返回的 fileList 转换为 FileInfo 列表"""
+    for item in items:
+        # etag、category 可能缺失，补上默认值后即可统一用 itemgetter 取值
+        item.setdefault("etag", "")
+        item.setdefault("category", 0)
+    return [FileInfo(*_FILE_FIELDS(item)) for item in items]
+
+
 class Pan123AuthService:
     """123云盘认证服务"""
 
@@ -34,6 +213,12 @@ class Pan123AuthService:
     API_BASE_WEB = "https://www.123pan.com"  # Web版API地址（用于账号密码登录）
     # 限流控制：令牌获取最小间隔（秒）
     TOKEN_FETCH_MIN_INTERVAL = 5
+    # 后台刷新：在 token 被判定为需要刷新（过期前1小时）之前多久提前刷新（秒），即过期前90分钟
+    BACKGROUND_REFRESH_AHEAD = 30 * 60
+    # 后台刷新失败后的重试间隔（秒）
+    BACKGROUND_REFRESH_RETRY_INTERVAL = 60
+    # 凭据错误等非临时失败按指数退避重试的最大间隔（秒），避免频繁登录导致账号被锁定
+    BACKGROUND_REFRESH_MAX_RETRY_INTERVAL = 6 * 3600
 
     def __init__(self, client_id: str = "", client_secret: str = "", username: str = "", password: str = ""):
         self.client_id = client_id
@@ -41,13 +226,65 @@ class Pan123AuthService:
         self.username = username
         self.password = password
         self._access_token: Optional[str] = None
+        self._token_valid_until_monotonic: float = 0.0  # 需要刷新token的单调时钟时间点
         self._token_expires_at: Optional[datetime] = None
         self._last_token_fetch_time: float = 0
-        self._token_lock = asyncio.Lock()  # 用于防止并发获取token
+        self._last_saved_token: Optional[Tuple[str, Optional[str]]] = None  # 最近写入配置的 (token, 过期时间)
+        self._refresh_inflight: Optional[asyncio.Future] = None  # 进行中的token刷新，并发调用方共享结果
+        self._refresh_task: Optional[asyncio.Task] = None  # 后台提前刷新token的任务
+        # 共享的文件夹/离线下载服务实例（见 get_folder_service / get_download_service）
+        self._folder_service: Optional["Pan123FolderService"] = None
+        self._download_service: Optional["Pan123DownloadService"] = None
+        self._android_folder_service: Optional["Pan123AndroidFolderService"] = None
+        # 同一账号最近创建/查到的离线下载任务 {(url, dir_id): (task_id, 记录时间)}，由 Pan123DownloadService 共享
+        self._recent_download_tasks: Dict[Tuple[str, int], Tuple[int, float]] = {}
+        self._http: Optional[httpx.AsyncClient] = None  # 共享的HTTP客户端（首次使用时创建）
+        self._cached_headers: Optional[dict] = None  # 预构建的开放平台请求头，token 变化时重建
+        self._cached_headers_token: Optional[str] = None
 
         # 从配置文件加载token
         self._load_token_from_config()
 
+    @property
+    def _token_expires_at(self) -> Optional[datetime]:
+        """token过期时间"""
+        return self._token_expires_at_value
+
+    @_token_expires_at.setter
+    def _token_expires_at(self, value: Optional[datetime]):
+        # 赋值时换算成单调时钟上的刷新时间点（提前1小时），之后的有效性检查只需比较一个浮点数
+        self._token_expires_at_value = value
+        if value is None:
+            self._token_valid_until_monotonic = 0.0
+        else:
+            # 带时区的过期时间（开放平台返回 +08:00）按UTC比较，不再丢弃时区后与本地时间比较
+            now = datetime.now(timezone.utc) if value.tzinfo is not None else datetime.now()
+            remaining = value - now - timedelta(hours=1)
+            self._token_valid_until_monotonic = time.monotonic() + remaining.total_seconds()
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """共享的HTTP客户端，复用连接池避免每次请求重新建立 TCP/TLS 连接（HTTP/2 下并发请求复用同一连接）
+
+        httpx 默认发送 accept-encoding: gzip, deflate 并自动解压响应，请求头中无需单独设置
+        """
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                timeout=30.0,
+                transport=_LimitedTransport(
+                    http2=True,
+                    limits=httpx.Limits(max_keepalive_connections=20, max_connections=50)
+                )
+            )
+        return self._http
+
+    async def aclose(self):
+        """停止后台刷新并关闭共享的HTTP客户端（关闭服务或丢弃实例时调用）"""
+        self.stop_background_refresh()
+        if self._http is not None and not self._http.is_closed:
+            await self._http.aclose()
+        self._http = None
+
     def _load_token_from_config(self):
         """从配置文件加载token"""
         try:
@@ -68,6 +305,7 @@ class Pan123AuthService:
                     self._access_token = config.pan123.access_token
                     try:
                         self._token_expires_at = datetime.fromisoformat(config.pan123.token_expires_at)
+                        self._last_saved_token = (config.pan123.access_token, config.pan123.token_expires_at)
                         logger.debug("从配置文件加载token")
                     except Exception as e:
                         logger.warning(f"解析token过期时间失败: {e}")
@@ -80,6 +318,11 @@ class Pan123AuthService:
     
     def _save_token_to_config(self):
         """保存token到配置文件"""
+        expires_at = self._token_expires_at.isoformat() if self._token_expires_at else None
+        if self._last_saved_token == (self._access_token, expires_at):
+            # token 未变化，无需标记配置待保存
+            return
+
         try:
             from config import get_config_manager
             config_manager = get_config_manager()
@@ -101,39 +344,119 @@ class Pan123AuthService:
             
             # 更新token信息
             config.pan123.access_token = self._access_token
-            if self._token_expires_at:
-                config.pan123.token_expires_at = self._token_expires_at.isoformat()
-            else:
-                config.pan123.token_expires_at = None
-            
-            # 保存配置
-            config_manager.save()
+            config.pan123.token_expires_at = expires_at
+
+            # 标记配置待保存（由后台任务合并写入）
+            config_manager.update(pan123=config.pan123)
+            self._last_saved_token = (self._access_token, expires_at)
             logger.debug("token已保存到配置文件")
         except Exception as e:
             logger.warning(f"保存token到配置文件失败: {e}")
 
     async def get_access_token(self) -> str:
         """获取访问令牌"""
+        self._start_background_refresh()
+
         # 检查是否已有有效token
         if self._is_token_valid():
             return self._access_token
 
-        # 使用锁防止并发获取token
-        async with self._token_lock:
-            # 再次检查，可能在等待锁的过程中已经被其他协程获取了
-            if self._is_token_valid():
-                return self._access_token
+        return await self.refresh_access_token()
 
-            # 检查距离上次获取token的时间间隔
-            current_time = time.time()
-            time_since_last_fetch = current_time - self._last_token_fetch_time
-            if time_since_last_fetch < self.TOKEN_FETCH_MIN_INTERVAL:
-                wait_time = self.TOKEN_FETCH_MIN_INTERVAL - time_since_last_fetch
-                logger.debug(f"等待 {wait_time:.2f} 秒后获取token（限流）")
-                await asyncio.sleep(wait_time)
+    async def ensure_token(self):
+        """确保有可用的token
 
-            # 获取新token（带重试机制）
-            return await self._fetch_access_token_with_retry()
+        正常情况下后台任务会在过期前提前刷新，这里只是一次时间比较；
+        仅在首次使用或后台刷新失败时才同步等待刷新。
+        """
+        if self._is_token_valid():
+            self._start_background_refresh()
+            return
+        await self.get_access_token()
+
+    async def refresh_access_token(self) -> str:
+        """强制刷新访问令牌，与进行中的刷新合并为一次请求"""
+        # 已有协程在刷新token，直接等待它的结果（shield 防止等待方被取消时连带取消刷新）
+        if self._refresh_inflight is not None:
+            return await asyncio.shield(self._refresh_inflight)
+
+        fut = asyncio.get_running_loop().create_future()
+        self._refresh_inflight = fut
+        try:
+            token = await self._refresh_access_token()
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            # 标记异常已被读取，没有其他等待方时避免 "exception was never retrieved" 警告
+            fut.exception()
+            raise
+        else:
+            fut.set_result(token)
+            return token
+        finally:
+            self._refresh_inflight = None
+
+    def _can_refresh(self) -> bool:
+        """是否配置了可用于刷新token的凭据"""
+        return bool((self.username and self.password) or (self.client_id and self.client_secret))
+
+    def _start_background_refresh(self):
+        """启动后台刷新任务（已在运行或没有凭据时跳过）"""
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        if not self._can_refresh():
+            return
+        self._refresh_task = asyncio.get_running_loop().create_task(self._background_refresh())
+
+    def stop_background_refresh(self):
+        """停止后台刷新任务（丢弃实例时调用）"""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+
+    async def _background_refresh(self):
+        """在token过期前提前刷新，使业务请求不必等待刷新"""
+        min_delay = 0.0
+        # 连续非临时失败的次数，用于指数退避
+        failures = 0
+        while True:
+            delay = self._token_valid_until_monotonic - time.monotonic() - self.BACKGROUND_REFRESH_AHEAD
+            if not self._access_token:
+                delay = 0.0
+            # 首轮允许立即刷新；之后至少间隔一段时间，避免有效期很短的token导致连续刷新
+            await asyncio.sleep(max(delay, min_delay))
+            try:
+                await self.refresh_access_token()
+                logger.debug("后台刷新token成功")
+                failures = 0
+                min_delay = self.BACKGROUND_REFRESH_RETRY_INTERVAL
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if _is_transient_token_error(e):
+                    # 超时、限流等临时错误按固定间隔重试
+                    min_delay = self.BACKGROUND_REFRESH_RETRY_INTERVAL
+                else:
+                    # 账号密码错误等不会自行恢复，按指数退避降低登录频率
+                    failures += 1
+                    min_delay = min(self.BACKGROUND_REFRESH_RETRY_INTERVAL * 2 ** failures,
+                                    self.BACKGROUND_REFRESH_MAX_RETRY_INTERVAL)
+                logger.warning(f"后台刷新token失败，{min_delay:.0f} 秒后重试: {e}")
+
+    async def _refresh_access_token(self) -> str:
+        """刷新访问令牌（同一时间只会有一个刷新在进行）"""
+        # 检查距离上次获取token的时间间隔
+        current_time = time.time()
+        time_since_last_fetch = current_time - self._last_token_fetch_time
+        if time_since_last_fetch < self.TOKEN_FETCH_MIN_INTERVAL:
+            wait_time = self.TOKEN_FETCH_MIN_INTERVAL - time_since_last_fetch
+            logger.debug(f"等待 {wait_time:.2f} 秒后获取token（限流）")
+            await asyncio.sleep(wait_time)
+
+        # 获取新token（带重试机制）
+        return await self._fetch_access_token_with_retry()
 
     async def _fetch_access_token_with_retry(self, max_retries: int = 3, initial_delay: float = 1.0) -> str:
         """从服务器获取新的访问令牌（带重试机制）"""
@@ -148,6 +471,7 @@ class Pan123AuthService:
                     self._access_token = token
                     self._token_expires_at = expired_at
                     self._last_token_fetch_time = time.time()
+                    self._cached_headers = None
 
                     # 保存token到配置
                     self._save_token_to_config()
@@ -166,47 +490,47 @@ class Pan123AuthService:
                         "clientSecret": self.client_secret
                     }
 
-                    async with httpx.AsyncClient(timeout=30.0) as client:
-                        response = await client.post(url, json=data, headers=headers)
-                        response.raise_for_status()
-
-                        result = response.json()
-                        if result.get("code") != 0:
-                            error_msg = result.get('message', '未知错误')
-
-                            # 检查是否是频率限制错误
-                            if "频繁" in error_msg or "请稍后" in error_msg:
-                                if attempt < max_retries - 1:
-                                    delay = initial_delay * (2 ** attempt)  # 指数退避
-                                    logger.warning(f"获取token触发频率限制（第{attempt + 1}次尝试），等待 {delay:.1f} 秒后重试")
-                                    await asyncio.sleep(delay)
-                                    continue
-                                else:
-                                    raise Exception(f"获取访问令牌失败（频率限制）: {error_msg}")
+                    response = await self.http.post(url, content=orjson.dumps(data), headers=headers)
+                    response.raise_for_status()
+
+                    result = _decode(response)
+                    if result.get("code") != 0:
+                        error_msg = result.get('message', '未知错误')
+
+                        # 检查是否是频率限制错误
+                        if "频繁" in error_msg or "请稍后" in error_msg:
+                            if attempt < max_retries - 1:
+                                delay = _retry_delay(attempt, initial_delay, response.headers.get("Retry-After"))
+                                logger.warning(f"获取token触发频率限制（第{attempt + 1}次尝试），等待 {delay:.1f} 秒后重试")
+                                await asyncio.sleep(delay)
+                                continue
                             else:
-                                raise Exception(f"获取访问令牌失败: {error_msg}")
+                                raise Exception(f"获取访问令牌失败（频率限制）: {error_msg}")
+                        else:
+                            raise Exception(f"获取访问令牌失败: {error_msg}")
 
-                        data = result["data"]
-                        self._access_token = data["accessToken"]
-                        self._token_expires_at = datetime.fromisoformat(data["expiredAt"])
-                        self._last_token_fetch_time = time.time()
+                    data = result["data"]
+                    self._access_token = data["accessToken"]
+                    self._token_expires_at = datetime.fromisoformat(data["expiredAt"])
+                    self._last_token_fetch_time = time.time()
+                    self._cached_headers = None
 
-                        # 保存token到配置
-                        self._save_token_to_config()
+                    # 保存token到配置
+                    self._save_token_to_config()
 
-                        logger.info(f"成功获取访问令牌 (尝试次数: {attempt + 1})")
-                        return self._access_token
+                    logger.info(f"成功获取访问令牌 (尝试次数: {attempt + 1})")
+                    return self._access_token
 
             except httpx.TimeoutException as e:
                 last_error = e
                 logger.warning(f"获取token超时（第{attempt + 1}次尝试）")
                 if attempt < max_retries - 1:
-                    await asyncio.sleep(initial_delay * (2 ** attempt))
+                    await asyncio.sleep(_retry_delay(attempt, initial_delay))
             except httpx.HTTPStatusError as e:
                 last_error = e
                 logger.warning(f"获取token HTTP错误: {e.response.status_code}（第{attempt + 1}次尝试）")
                 if attempt < max_retries - 1:
-                    await asyncio.sleep(initial_delay * (2 ** attempt))
+                    await asyncio.sleep(_retry_delay(attempt, initial_delay, e.response.headers.get("Retry-After")))
             except Exception as e:
                 # 如果不是"操作频繁"错误，直接抛出
                 error_msg = str(e)
@@ -215,22 +539,19 @@ class Pan123AuthService:
                 last_error = e
                 logger.warning(f"获取token失败: {error_msg}（第{attempt + 1}次尝试）")
                 if attempt < max_retries - 1:
-                    await asyncio.sleep(initial_delay * (2 ** attempt))
+                    await asyncio.sleep(_retry_delay(attempt, initial_delay))
 
         # 所有重试都失败了
         raise Exception(f"获取访问令牌失败（已重试 {max_retries} 次）: {last_error}")
 
     def _is_token_valid(self) -> bool:
         """检查token是否有效"""
-        if not self._access_token or not self._token_expires_at:
-            return False
-        # 提前1小时刷新token
-        from datetime import timedelta
-        return datetime.now() < (self._token_expires_at.replace(tzinfo=None) - timedelta(hours=1))
+        # 过期时间赋值时已换算为单调时钟（提前1小时刷新token），这里只有一次浮点比较
+        return bool(self._access_token) and time.monotonic() < self._token_valid_until_monotonic
 
     def is_token_expired(self) -> bool:
         """检查token是否已过期"""
-        return not self._is_token_valid()
+        return not (self._access_token and time.monotonic() < self._token_valid_until_monotonic)
 
     def get_auth_header(self) -> str:
         """获取认证头"""
@@ -242,10 +563,21 @@ class Pan123AuthService:
             return token
         return f"Bearer {token}"
 
-    @staticmethod
-    async def login_by_account(username: str, password: str) -> tuple[str, datetime]:
+    def get_headers(self) -> dict:
+        """获取开放平台请求头（按当前token缓存，调用方不要修改返回的字典）"""
+        token = self._access_token
+        if self._cached_headers is None or self._cached_headers_token != token:
+            self._cached_headers = {
+                "Authorization": self.get_auth_header(),
+                "Platform": "open_platform",
+                "Content-Type": "application/json"
+            }
+            self._cached_headers_token = token
+        return self._cached_headers
+
+    async def login_by_account(self, username: str, password: str) -> tuple[str, datetime]:
         """
-        使用账号密码登录获取token（静态方法，不需要Client ID/Secret）
+        使用账号密码登录获取token（不需要Client ID/Secret）
         使用与 123pan_web-main 相同的 Android 客户端登录方式
 
         Args:
@@ -255,9 +587,6 @@ class Pan123AuthService:
         Returns:
             tuple: (token, expired_at) 或抛出异常
         """
-        import requests
-        import uuid
-
         # 使用 Android 客户端协议登录（与 123pan_web-main 相同）
         headers = {
             "user-agent": "123pan/v2.4.0(12;Xiaomi)",
@@ -265,7 +594,7 @@ class Pan123AuthService:
             "accept-encoding": "gzip",
             "content-type": "application/json",
             "osversion": "12",
-            "loginuuid": str(uuid.uuid4().hex),
+            "loginuuid": secrets.token_hex(16),
             "platform": "android",
             "devicetype": "MI-ONE PLUS",
             "devicename": "Xiaomi",
@@ -281,12 +610,7 @@ class Pan123AuthService:
             logger.info(f"尝试使用 Android 客户端登录: {username}")
             login_url = f"{Pan123AuthService.API_BASE_WEB}/b/api/user/sign_in"
 
-            response = requests.post(
-                login_url,
-                headers=headers,
-                json=data,
-                timeout=10
-            )
+            response = await self.http.post(login_url, content=orjson.dumps(data), headers=headers, timeout=10.0)
 
             logger.info(f"登录响应状态码: {response.status_code}")
             logger.info(f"登录响应内容: {response.text[:500]}")
@@ -294,7 +618,7 @@ class Pan123AuthService:
             if response.status_code != 200:
                 raise Exception(f"登录失败: HTTP {response.status_code} - {response.text}")
 
-            result = response.json()
+            result = _decode(response)
             if result.get("code") != 200:
                 raise Exception(f"登录失败: {result.get('message', '未知错误')}")
 
@@ -307,7 +631,7 @@ class Pan123AuthService:
             logger.info(f"登录成功，token: {token[:20]}...")
             return full_token, expired_at
 
-        except requests.Timeout:
+        except httpx.TimeoutException:
             raise Exception("登录超时，请检查网络连接")
         except json.JSONDecodeError as e:
             logger.error(f"JSON解析失败: {e}, 响应内容: {response.text[:1000]}")
@@ -326,41 +650,123 @@ class Pan123AuthService:
         Returns:
             datetime: 过期时间
         """
-        from datetime import timedelta
         return datetime.now() + timedelta(days=days)
 
 
-class Pan123FolderService:
+class _FolderIdCacheMixin:
+    """文件夹ID缓存 {(parent_id, name): (folder_id, 缓存时间)}，使用方需在 __init__ 中创建 _folder_id_cache"""
+
+    # 文件夹ID缓存：有效期（秒）和最大条目数
+    FOLDER_CACHE_TTL = 60
+    FOLDER_CACHE_SIZE = 1024
+
+    def _get_cached_folder_id(self, parent_id: int, name: str) -> Optional[int]:
+        """从缓存获取文件夹ID，未命中或已过期返回None"""
+        key = (parent_id, name)
+        entry = self._folder_id_cache.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[1] >= self.FOLDER_CACHE_TTL:
+            del self._folder_id_cache[key]
+            return None
+        self._folder_id_cache.move_to_end(key)
+        return entry[0]
+
+    def _cache_folder_id(self, parent_id: int, name: str, folder_id: int):
+        """缓存文件夹ID，超出容量时淘汰最久未使用的条目"""
+        key = (parent_id, name)
+        self._folder_id_cache[key] = (folder_id, time.monotonic())
+        self._folder_id_cache.move_to_end(key)
+        if len(self._folder_id_cache) > self.FOLDER_CACHE_SIZE:
+            self._folder_id_cache.popitem(last=False)
+
+    def _invalidate_folder_cache(self, parent_id: Optional[int] = None, folder_ids: Optional[List[int]] = None):
+        """清除指定父目录下的缓存，或指向/位于指定文件夹的缓存"""
+        ids = set(folder_ids or ())
+        for key, (folder_id, _) in list(self._folder_id_cache.items()):
+            if key[0] == parent_id or folder_id in ids or key[0] in ids:
+                del self._folder_id_cache[key]
+
+
+class Pan123FolderService(_FolderIdCacheMixin):
     """123云盘文件夹管理服务"""
 
     API_BASE = "https://open-api.123pan.com"
 
+    # 文件列表接口地址（参数均为整数，预先拼好查询字符串，避免每次编码参数字典）
+    _LIST_URL_TEMPLATE = API_BASE + "/api/v2/file/list?parentFileId={pid}&limit={limit}"
+
     def __init__(self, auth_service: Pan123AuthService, user_id: str = None):
         self.auth = auth_service
         self.user_id = user_id or "global"  # 默认使用全局用户ID
+        # {(parent_id, name): (folder_id, 缓存时间)}，按最近使用排序（LRU）
+        self._folder_id_cache: "OrderedDict[Tuple[int, str], Tuple[int, float]]" = OrderedDict()
 
-    async def find_folder(self, name: str, parent_id: int = 0) -> Optional[int]:
+    async def find_folder(self, name: str, parent_id: int = 0, verify: bool = False) -> Optional[int]:
         """查找文件夹，返回文件夹ID，如果不存在返回None
-        
+
         Args:
             name: 文件夹名称
             parent_id: 父目录ID
+            verify: 是否额外列出该文件夹验证ID有效（ID 刚由列表接口返回，通常无需验证）
         """
-        files = await self.list_files(parent_id, limit=100)
-        for file in files:
-            # type=1 表示文件夹, trashed=0 表示不在回收站
-            if file.type == 1 and file.trashed == 0 and file.filename == name:
-                # 验证文件夹 ID 是否有效（尝试列出该文件夹的文件）
-                try:
-                    test_files = await self.list_files(file.file_id, limit=1)
-                    logger.info(f"从API找到文件夹: {name}, ID: {file.file_id}")
-                    return file.file_id
-                except Exception as e:
+        folders = await self.find_folders([name], parent_id, verify=verify)
+        return folders[name]
+
+    async def find_folders(self, names: List[str], parent_id: int = 0, verify: bool = False) -> Dict[str, Optional[int]]:
+        """在同一父目录下批量查找文件夹，只遍历一次父目录
+
+        Args:
+            names: 文件夹名称列表
+            parent_id: 父目录ID
+            verify: 是否并发列出各文件夹验证ID有效，验证失败的返回None
+
+        Returns:
+            {文件夹名称: 文件夹ID或None}
+        """
+        results: Dict[str, Optional[int]] = {}
+        if not verify:
+            # 优先使用缓存，全部命中时无需请求API
+            for name in names:
+                folder_id = self._get_cached_folder_id(parent_id, name)
+                if folder_id is not None:
+                    results[name] = folder_id
+            if len(results) == len(names):
+                return results
+
+        wanted = {name for name in names if name not in results}
+        candidates: Dict[str, int] = {}
+        # 逐页查找，所有名称都找到后立即停止翻页（aclosing 确保提前结束时取消已发出的预取请求）
+        async with aclosing(self.iter_files(parent_id)) as files:
+            async for file in files:
+                # type=1 表示文件夹, trashed=0 表示不在回收站
+                if file.type == 1 and file.trashed == 0 and file.filename in wanted:
+                    candidates.setdefault(file.filename, file.file_id)
+                    if len(candidates) == len(wanted):
+                        break
+
+        for name in wanted:
+            results[name] = candidates.get(name)
+
+        if verify and candidates:
+            # 并发验证文件夹 ID 是否有效（尝试列出该文件夹的文件）
+            checks = await asyncio.gather(
+                *[self.list_files(folder_id, limit=1) for folder_id in candidates.values()],
+                return_exceptions=True
+            )
+            for (name, folder_id), check in zip(candidates.items(), checks):
+                if isinstance(check, Exception):
                     # 如果列出文件失败，说明文件夹 ID 可能无效
-                    logger.warning(f"文件夹 {name} (ID: {file.file_id}) 可能已失效: {e}")
-                    return None
+                    logger.warning(f"文件夹 {name} (ID: {folder_id}) 可能已失效: {check}")
+                    results[name] = None
+                    self._folder_id_cache.pop((parent_id, name), None)
 
-        return None
+        for name in wanted:
+            folder_id = results[name]
+            if folder_id is not None:
+                self._cache_folder_id(parent_id, name, folder_id)
+                logger.info(f"从API找到文件夹: {name}, ID: {folder_id}")
+        return results
 
     async def search_files(self, keyword: str, search_mode: int = 1, limit: int = 100) -> List[FileInfo]:
         """全局搜索文件
@@ -370,11 +776,7 @@ class Pan123FolderService:
             limit: 每页文件数量
         """
         url = f"{self.API_BASE}/api/v2/file/list"
-        headers = {
-            "Authorization": self.auth.get_auth_header(),
-            "Platform": "open_platform",
-            "Content-Type": "application/json"
-        }
+        headers = self.auth.get_headers()
         params = {
             "parentFileId": 0,  # 搜索时会被 searchData 参数覆盖
             "limit": limit,
@@ -382,277 +784,237 @@ class Pan123FolderService:
             "searchMode": search_mode
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params, headers=headers)
-            result = response.json()
+        response = await self.auth.http.get(url, params=params, headers=headers)
+        result = _decode(response)
 
-            if result.get("code") == 0:
-                files = []
-                for item in result["data"]["fileList"]:
-                    files.append(FileInfo(
-                        file_id=item["fileId"],
-                        filename=item["filename"],
-                        parent_file_id=item["parentFileId"],
-                        type=item["type"],
-                        size=item["size"],
-                        etag=item.get("etag", ""),
-                        status=item["status"],
-                        category=item.get("category", 0),
-                        trashed=item["trashed"],
-                        create_at=item["createAt"],
-                        update_at=item["updateAt"]
-                    ))
-                return files
-            else:
-                raise Exception(f"搜索文件失败: {result.get('message')}")
+        if result.get("code") == 0:
+            return _parse_file_list(result["data"]["fileList"])
+        else:
+            raise Exception(f"搜索文件失败: {result.get('message')}")
 
-    async def create_folder(self, name: str, parent_id: int = 0, check_exists: bool = True) -> int:
+    async def create_folder(self, name: str, parent_id: int = 0, check_exists: bool = True,
+                            prefer_try_first: bool = True) -> int:
         """创建文件夹，返回文件夹ID (dirID)
 
         Args:
             name: 文件夹名称
             parent_id: 父目录ID
             check_exists: 是否检查文件夹是否已存在，如果存在则返回现有文件夹ID
+            prefer_try_first: 检查已存在时，缓存未命中则直接请求创建，
+                仅在返回同名冲突时才列目录查找（省去正常情况下的一次列表请求）
         """
-        # 在开始操作前统一检查并刷新token（如果需要），避免多次刷新
-        if self.auth.is_token_expired():
-            logger.debug(f"Token 已过期，提前刷新以避免 API 调用失败")
-            await self.auth.get_access_token()
+        # token 由后台任务提前刷新，这里只在没有可用token时才等待
+        await self.auth.ensure_token()
 
-        # 如果启用检查，先查找是否已存在
         if check_exists:
-            existing_folder_id = await self.find_folder(name, parent_id)
-            if existing_folder_id is not None:
-                return existing_folder_id
+            cached_folder_id = self._get_cached_folder_id(parent_id, name)
+            if cached_folder_id is not None:
+                return cached_folder_id
+            # 不先尝试创建时，先查找是否已存在
+            if not prefer_try_first:
+                existing_folder_id = await self.find_folder(name, parent_id)
+                if existing_folder_id is not None:
+                    return existing_folder_id
 
-        max_retries = 1  # 只重试1次，用于处理极端情况下的同步问题
+        max_retries = 2  # 服务端返回token过期时强制刷新后重试1次
 
         for attempt in range(max_retries):
             url = f"{self.API_BASE}/upload/v1/file/mkdir"
-            headers = {
-                "Authorization": self.auth.get_auth_header(),
-                "Platform": "open_platform",
-                "Content-Type": "application/json"
-            }
+            headers = self.auth.get_headers()
             data = {
                 "name": name,
                 "parentID": parent_id
             }
 
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=data, headers=headers)
-                result = response.json()
+            response = await self.auth.http.post(url, content=orjson.dumps(data), headers=headers)
+            result = _decode(response)
 
-                if result.get("code") == 0:
-                    dir_id = result["data"]["dirID"]
-                    logger.info(f"创建文件夹成功: {name}, ID: {dir_id}")
-                    return dir_id
-                else:
-                    # 如果是因为文件夹已存在而失败，尝试查找
-                    error_msg = result.get("message", "")
-
-                    # 极端情况下可能出现同步问题，此时再刷新一次token
-                    if "token is expired" in error_msg.lower() or "token expired" in error_msg.lower():
-                        if attempt < max_retries - 1:
-                            logger.warning(f"Token 在刷新后仍然过期（极端情况），再次刷新并重试 (尝试 {attempt + 1}/{max_retries})")
-                            await self.auth.get_access_token()
-                            continue
-
-                    if ("已存在" in error_msg or "重名" in error_msg or "duplicate" in error_msg.lower() or
-                        "同名文件夹" in error_msg or "无法进行创建" in error_msg):
-                        logger.warning(f"创建文件夹失败（已存在）: {error_msg}，尝试重新查找")
-                        # 尝试查找已存在的文件夹（直接API查询）
-                        existing_folder_id = await self.find_folder(name, parent_id)
-                        if existing_folder_id is not None:
-                            logger.info(f"找到已存在的文件夹: {name}, ID: {existing_folder_id}")
-                            return existing_folder_id
-
-                        # 如果 find_folder 也失败了（可能是因为 list_files 验证失败），再尝试一次不带验证的查找
-                        try:
-                            files = await self.list_files(parent_id, limit=100)
-                            for file in files:
-                                if file.type == 1 and file.trashed == 0 and file.filename == name:
-                                    logger.info(f"找到已存在的文件夹（无验证）: {name}, ID: {file.file_id}")
-                                    return file.file_id
-                        except Exception as retry_error:
-                            logger.warning(f"尝试查找现有文件夹失败: {retry_error}")
-
-                    raise Exception(f"创建文件夹失败: {error_msg}")
+            if result.get("code") == 0:
+                dir_id = result["data"]["dirID"]
+                logger.info(f"创建文件夹成功: {name}, ID: {dir_id}")
+                self._invalidate_folder_cache(parent_id=parent_id)
+                self._cache_folder_id(parent_id, name, dir_id)
+                return dir_id
+            else:
+                # 如果是因为文件夹已存在而失败，尝试查找
+                error_msg = result.get("message", "")
+
+                # 本地判断有效但服务端认为已过期（如token被其他端刷新），强制刷新一次token
+                if "token is expired" in error_msg.lower() or "token expired" in error_msg.lower():
+                    if attempt < max_retries - 1:
+                        logger.warning(f"服务端返回Token已过期，强制刷新并重试 (尝试 {attempt + 1}/{max_retries})")
+                        await self.auth.refresh_access_token()
+                        continue
+
+                if _is_duplicate_error(error_msg):
+                    logger.debug(f"文件夹已存在: {error_msg}，查找已有文件夹")
+                    # 尝试查找已存在的文件夹（直接API查询）
+                    existing_folder_id = await self.find_folder(name, parent_id)
+                    if existing_folder_id is not None:
+                        logger.info(f"找到已存在的文件夹: {name}, ID: {existing_folder_id}")
+                        return existing_folder_id
+
+                raise Exception(f"创建文件夹失败: {error_msg}")
 
     async def list_files(self, parent_id: int = 0, limit: int = 100) -> List[FileInfo]:
         """获取文件列表（单次请求，最大100条）"""
-        # 提前检查并刷新token（如果需要）
-        if self.auth.is_token_expired():
-            logger.debug(f"Token 已过期，提前刷新以避免 list_files 失败")
-            await self.auth.get_access_token()
+        # token 由后台任务提前刷新，这里只在没有可用token时才等待
+        await self.auth.ensure_token()
 
-        max_retries = 1  # 只重试1次，用于处理极端情况
+        max_retries = 2  # 服务端返回token过期时强制刷新后重试1次
 
         for attempt in range(max_retries):
-            url = f"{self.API_BASE}/api/v2/file/list"
-            headers = {
-                "Authorization": self.auth.get_auth_header(),
-                "Platform": "open_platform",
-                "Content-Type": "application/json"
-            }
-            params = {
-                "parentFileId": parent_id,
-                "limit": limit
-            }
+            url = self._LIST_URL_TEMPLATE.format(pid=parent_id, limit=limit)
+            headers = self.auth.get_headers()
 
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, params=params, headers=headers)
-                result = response.json()
-
-                if result.get("code") == 0:
-                    files = []
-                    for item in result["data"]["fileList"]:
-                        files.append(FileInfo(
-                            file_id=item["fileId"],
-                            filename=item["filename"],
-                            parent_file_id=item["parentFileId"],
-                            type=item["type"],
-                            size=item["size"],
-                            etag=item.get("etag", ""),
-                            status=item["status"],
-                            category=item.get("category", 0),
-                            trashed=item["trashed"],
-                            create_at=item["createAt"],
-                            update_at=item["updateAt"]
-                        ))
-                    return files
-                else:
-                    error_msg = result.get('message', '')
-                    # 极端情况下可能出现同步问题，此时再刷新一次token
-                    if "token is expired" in error_msg.lower() or "token expired" in error_msg.lower():
-                        if attempt < max_retries - 1:
-                            logger.warning(f"Token 在刷新后仍然过期（极端情况），再次刷新并重试 (尝试 {attempt + 1}/{max_retries})")
-                            await self.auth.get_access_token()
-                            continue
-                    raise Exception(f"获取文件列表失败: {error_msg}")
+            response = await self.auth.http.get(url, headers=headers)
+            result = _decode(response)
 
-    async def list_all_files(self, parent_id: int = 0) -> List[FileInfo]:
-        """获取文件列表（分批加载所有文件，使用last_file_id分页）"""
-        all_files = []
-        page_size = 100
-        last_file_id = None
+            if result.get("code") == 0:
+                return _parse_file_list(result["data"]["fileList"])
+            else:
+                error_msg = result.get('message', '')
+                # 本地判断有效但服务端认为已过期（如token被其他端刷新），强制刷新一次token
+                if "token is expired" in error_msg.lower() or "token expired" in error_msg.lower():
+                    if attempt < max_retries - 1:
+                        logger.warning(f"服务端返回Token已过期，强制刷新并重试 (尝试 {attempt + 1}/{max_retries})")
+                        await self.auth.refresh_access_token()
+                        continue
+                raise Exception(f"获取文件列表失败: {error_msg}")
 
-        while True:
-            url = f"{self.API_BASE}/api/v2/file/list"
-            headers = {
-                "Authorization": self.auth.get_auth_header(),
-                "Platform": "open_platform",
-                "Content-Type": "application/json"
-            }
-            params = {
-                "parentFileId": parent_id,
-                "limit": page_size
-            }
+    async def _fetch_list_page(self, parent_id: int, last_file_id: Optional[int], page_size: int) -> List[dict]:
+        """获取一页文件列表，返回原始 fileList"""
+        url = self._LIST_URL_TEMPLATE.format(pid=parent_id, limit=page_size)
+        headers = self.auth.get_headers()
 
-            # 添加last_file_id参数用于分页
-            if last_file_id is not None:
-                params["lastFileId"] = last_file_id
+        # 添加last_file_id参数用于分页
+        if last_file_id is not None:
+            url = f"{url}&lastFileId={last_file_id}"
 
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, params=params, headers=headers)
-                result = response.json()
+        response = await self.auth.http.get(url, headers=headers)
+        result = _decode(response)
 
-                if result.get("code") == 0:
-                    file_list = result["data"].get("fileList", [])
+        if result.get("code") != 0:
+            raise Exception(f"获取文件列表失败: {result.get('message')}")
 
-                    if not file_list:
-                        break
+        return result["data"].get("fileList", [])
 
-                    # 转换为FileInfo对象
-                    for item in file_list:
-                        all_files.append(FileInfo(
-                            file_id=item["fileId"],
-                            filename=item["filename"],
-                            parent_file_id=item["parentFileId"],
-                            type=item["type"],
-                            size=item["size"],
-                            etag=item.get("etag", ""),
-                            status=item["status"],
-                            category=item.get("category", 0),
-                            trashed=item["trashed"],
-                            create_at=item["createAt"],
-                            update_at=item["updateAt"]
-                        ))
-
-                    # 如果获取的文件数小于每页大小，说明已经加载完所有文件
-                    if len(file_list) < page_size:
-                        break
+    async def iter_files(self, parent_id: int = 0) -> AsyncIterator[FileInfo]:
+        """逐页获取文件列表并逐个产出（使用last_file_id分页），调用方找到目标后可提前结束
 
-                    # 使用最后一个文件的ID作为下一页的起始点
-                    last_file_id = file_list[-1]["fileId"]
-                else:
-                    raise Exception(f"获取文件列表失败: {result.get('message')}")
+        处理当前页的同时已在后台请求下一页，隐藏翻页的网络延迟
+        """
+        # token 由后台任务提前刷新，这里只在没有可用token时才等待
+        await self.auth.ensure_token()
 
-        return all_files
+        page_size = 100
+        next_page = asyncio.create_task(self._fetch_list_page(parent_id, None, page_size))
+        try:
+            while next_page is not None:
+                file_list = await next_page
+                next_page = None
+                if not file_list:
+                    return
+
+                # 如果获取的文件数小于每页大小，说明已经加载完所有文件；
+                # 否则立即以最后一个文件的ID为起点预取下一页
+                if len(file_list) >= page_size:
+                    next_page = asyncio.create_task(
+                        self._fetch_list_page(parent_id, file_list[-1]["fileId"], page_size)
+                    )
+
+                # 转换为FileInfo对象
+                for file in _parse_file_list(file_list):
+                    yield file
+        finally:
+            _discard_task(next_page)
+
+    async def list_all_files(self, parent_id: int = 0) -> List[FileInfo]:
+        """获取文件列表（分批加载所有文件，使用last_file_id分页）"""
+        return [file async for file in self.iter_files(parent_id)]
 
     async def get_file_detail(self, file_id: int) -> Optional[FileInfo]:
         """获取文件详情"""
         url = f"{self.API_BASE}/api/v1/file/detail"
-        headers = {
-            "Authorization": self.auth.get_auth_header(),
-            "Platform": "open_platform",
-            "Content-Type": "application/json"
-        }
+        headers = self.auth.get_headers()
         params = {"fileID": file_id}
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params, headers=headers)
-            result = response.json()
-
-            if result.get("code") == 0:
-                data = result["data"]
-                return FileInfo(
-                    file_id=data["fileID"],
-                    filename=data["filename"],
-                    parent_file_id=data["parentFileID"],
-                    type=data["type"],
-                    size=data["size"],
-                    etag=data["etag"],
-                    status=data["status"],
-                    category=data.get("category", 0),
-                    trashed=data["trashed"],
-                    create_at=data["createAt"],
-                    update_at=0
-                )
-            return None
+        response = await self.auth.http.get(url, params=params, headers=headers)
+        result = _decode(response)
+
+        if result.get("code") == 0:
+            data = result["data"]
+            return FileInfo(
+                file_id=data["fileID"],
+                filename=data["filename"],
+                parent_file_id=data["parentFileID"],
+                type=data["type"],
+                size=data["size"],
+                etag=data["etag"],
+                status=data["status"],
+                category=data.get("category", 0),
+                trashed=data["trashed"],
+                create_at=data["createAt"],
+                update_at=0
+            )
+        return None
 
     async def trash_files(self, file_ids: List[int]) -> bool:
         """将文件/文件夹移至回收站"""
         url = f"{self.API_BASE}/api/v1/file/trash"
-        headers = {
-            "Authorization": self.auth.get_auth_header(),
-            "Platform": "open_platform",
-            "Content-Type": "application/json"
-        }
+        headers = self.auth.get_headers()
         data = {
             "fileIDs": file_ids
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=data, headers=headers)
-            result = response.json()
+        response = await self.auth.http.post(url, content=orjson.dumps(data), headers=headers)
+        result = _decode(response)
 
-            if result.get("code") == 0:
-                logger.info(f"文件已移至回收站: {file_ids}")
-                return True
-            else:
-                error_msg = result.get("message", "未知错误")
-                logger.error(f"移至回收站失败: {error_msg}")
-                raise Exception(f"移至回收站失败: {error_msg}")
+        # 无论成功与否都清除相关缓存（包括 Android 文件夹服务的缓存），避免返回已进入回收站的文件夹
+        self._invalidate_folder_cache(folder_ids=file_ids)
+        if self.auth._android_folder_service is not None:
+            self.auth._android_folder_service._invalidate_folder_cache(folder_ids=file_ids)
+
+        if result.get("code") == 0:
+            logger.info(f"文件已移至回收站: {file_ids}")
+            return True
+        else:
+            error_msg = result.get("message", "未知错误")
+            logger.error(f"移至回收站失败: {error_msg}")
+            raise Exception(f"移至回收站失败: {error_msg}")
 
 
 class Pan123DownloadService:
     """123云盘离线下载管理服务"""
 
     API_BASE = "https://open-api.123pan.com"
+    # 最近下载任务索引的有效期（秒）和触发清理的条目数
+    RECENT_TASK_TTL = 300
+    RECENT_TASK_PRUNE_SIZE = 512
 
     def __init__(self, auth_service: Pan123AuthService):
         self.auth = auth_service
+        # 索引保存在认证服务上，各处临时创建的下载服务实例共享同一份
+        self._recent_tasks = auth_service._recent_download_tasks
+
+    def _remember_task(self, url: str, dir_id: int, task_id: int):
+        """记录最近的下载任务，条目过多时顺便清理过期条目"""
+        now = time.monotonic()
+        recent = self._recent_tasks
+        recent[(url, dir_id)] = (task_id, now)
+        if len(recent) > self.RECENT_TASK_PRUNE_SIZE:
+            for key in [k for k, (_, ts) in recent.items() if now - ts >= self.RECENT_TASK_TTL]:
+                del recent[key]
+
+    def _lookup_recent_task(self, url: str, dir_id: int) -> Optional[int]:
+        """从最近下载任务索引中查找，未命中或已过期返回None"""
+        entry = self._recent_tasks.get((url, dir_id))
+        if entry is None:
+            return None
+        if time.monotonic() - entry[1] >= self.RECENT_TASK_TTL:
+            self._recent_tasks.pop((url, dir_id), None)
+            return None
+        return entry[0]
 
     async def create_download_task(
         self,
@@ -661,20 +1023,14 @@ class Pan123DownloadService:
         file_name: Optional[str] = None
     ) -> int:
         """创建离线下载任务，返回任务ID (taskID)"""
-        # 提前检查并刷新token（如果需要）
-        if self.auth.is_token_expired():
-            logger.debug(f"Token 已过期，提前刷新以避免 create_download_task 失败")
-            await self.auth.get_access_token()
+        # token 由后台任务提前刷新，这里只在没有可用token时才等待
+        await self.auth.ensure_token()
 
-        max_retries = 1  # 只重试1次，用于处理极端情况
+        max_retries = 2  # 服务端返回token过期时强制刷新后重试1次
 
         for attempt in range(max_retries):
             api_url = f"{self.API_BASE}/api/v1/offline/download"
-            headers = {
-                "Authorization": self.auth.get_auth_header(),
-                "Platform": "open_platform",
-                "Content-Type": "application/json"
-            }
+            headers = self.auth.get_headers()
             data = {
                 "url": url,
                 "dirID": dir_id
@@ -682,65 +1038,68 @@ class Pan123DownloadService:
             if file_name:
                 data["fileName"] = file_name
 
-            async with httpx.AsyncClient() as client:
-                response = await client.post(api_url, json=data, headers=headers)
-                result = response.json()
+            response = await self.auth.http.post(api_url, content=orjson.dumps(data), headers=headers)
+            result = _decode(response)
 
-                if result.get("code") == 0:
-                    task_id = result["data"]["taskID"]
-                    logger.info(f"创建离线下载任务成功: {url}, 任务ID: {task_id}")
-                    return task_id
-                else:
-                    error_message = result.get('message', '未知错误')
-
-                    # 极端情况下可能出现同步问题，此时再刷新一次token
-                    if "token is expired" in error_message.lower() or "token expired" in error_message.lower():
-                        if attempt < max_retries - 1:
-                            logger.warning(f"Token 在刷新后仍然过期（极端情况），再次刷新并重试 (尝试 {attempt + 1}/{max_retries})")
-                            await self.auth.get_access_token()
-                            continue
-
-                    # 如果是"下载任务重复"错误，尝试查询已有的任务
-                    if "重复" in error_message or "duplicate" in error_message.lower():
-                        logger.warning(f"下载任务可能已存在: {url}, 尝试查询已有任务...")
-                        # 尝试从下载任务列表中查找
-                        existing_task_id = await self._find_existing_download_task(url, dir_id)
-                        if existing_task_id:
-                            logger.info(f"找到已存在的下载任务: {url}, 任务ID: {existing_task_id}")
-                            return existing_task_id
-                        else:
-                            logger.warning(f"未找到已存在的下载任务，但云盘返回重复错误: {url}")
-                            # 即使找不到，也抛出异常，但提示更友好
-                            raise Exception(f"下载任务可能已存在: {error_message}")
+            if result.get("code") == 0:
+                task_id = result["data"]["taskID"]
+                logger.info(f"创建离线下载任务成功: {url}, 任务ID: {task_id}")
+                self._remember_task(url, dir_id, task_id)
+                return task_id
+            else:
+                error_message = result.get('message', '未知错误')
+
+                # 本地判断有效但服务端认为已过期（如token被其他端刷新），强制刷新一次token
+                if "token is expired" in error_message.lower() or "token expired" in error_message.lower():
+                    if attempt < max_retries - 1:
+                        logger.warning(f"服务端返回Token已过期，强制刷新并重试 (尝试 {attempt + 1}/{max_retries})")
+                        await self.auth.refresh_access_token()
+                        continue
+
+                # 如果是"下载任务重复"错误，尝试查询已有的任务
+                if "重复" in error_message or "duplicate" in error_message.lower():
+                    logger.warning(f"下载任务可能已存在: {url}, 尝试查询已有任务...")
+                    # 尝试从下载任务列表中查找
+                    existing_task_id = await self._find_existing_download_task(url, dir_id)
+                    if existing_task_id:
+                        logger.info(f"找到已存在的下载任务: {url}, 任务ID: {existing_task_id}")
+                        return existing_task_id
                     else:
-                        raise Exception(f"创建离线下载任务失败: {error_message}")
-    
+                        logger.warning(f"未找到已存在的下载任务，但云盘返回重复错误: {url}")
+                        # 即使找不到，也抛出异常，但提示更友好
+                        raise Exception(f"下载任务可能已存在: {error_message}")
+                elif "指定目录ID文件不存在" in error_message or "目录不存在" in error_message:
+                    # 在这里统一识别目录失效，调用方按异常类型处理，无需再匹配错误信息
+                    raise Pan123DirNotFoundError(f"创建离线下载任务失败: {error_message}", result.get("code"))
+                else:
+                    raise Exception(f"创建离线下载任务失败: {error_message}")
+
     async def _find_existing_download_task(self, url: str, dir_id: int) -> Optional[int]:
-        """查找已存在的下载任务"""
+        """查找已存在的下载任务（优先查最近任务索引，未命中时才请求任务列表）"""
+        task_id = self._lookup_recent_task(url, dir_id)
+        if task_id is not None:
+            return task_id
+
         try:
             # 查询下载任务列表
             api_url = f"{self.API_BASE}/api/v1/offline/download/list"
-            headers = {
-                "Authorization": self.auth.get_auth_header(),
-                "Platform": "open_platform",
-                "Content-Type": "application/json"
-            }
+            headers = self.auth.get_headers()
             params = {
                 "page": 1,
                 "pageSize": 100  # 查询最近100个任务
             }
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.get(api_url, params=params, headers=headers)
-                result = response.json()
-                
-                if result.get("code") == 0:
-                    tasks = result.get("data", {}).get("list", [])
-                    # 查找匹配URL和目录ID的任务
-                    for task in tasks:
-                        if task.get("url") == url and task.get("dirID") == dir_id:
-                            return task.get("taskID")
-                return None
+
+            response = await self.auth.http.get(api_url, params=params, headers=headers)
+            result = _decode(response)
+
+            if result.get("code") == 0:
+                tasks = result.get("data", {}).get("list", [])
+                # 将列表中的任务全部记入索引，后续重复提交可直接命中（倒序写入，同一URL保留列表中靠前的任务）
+                for task in reversed(tasks):
+                    if task.get("url") and task.get("taskID") is not None:
+                        self._remember_task(task["url"], task.get("dirID"), task["taskID"])
+                return self._lookup_recent_task(url, dir_id)
+            return None
         except Exception as e:
             logger.debug(f"查询已有下载任务失败: {e}")
             return None
@@ -748,24 +1107,45 @@ class Pan123DownloadService:
     async def get_download_progress(self, task_id: int) -> Dict:
         """获取下载进度"""
         url = f"{self.API_BASE}/api/v1/offline/download/process"
-        headers = {
-            "Authorization": self.auth.get_auth_header(),
-            "Platform": "open_platform",
-            "Content-Type": "application/json"
-        }
+        headers = self.auth.get_headers()
         params = {"taskID": task_id}
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, params=params, headers=headers)
-            result = response.json()
+        response = await self.auth.http.get(url, params=params, headers=headers)
+        result = _decode(response)
 
-            if result.get("code") == 0:
-                return {
-                    "progress": result["data"]["process"],
-                    "status": result["data"]["status"]  # 0进行中、1失败、2成功、3重试中
-                }
-            else:
-                raise Exception(f"获取下载进度失败: {result.get('message')}")
+        if result.get("code") == 0:
+            return {
+                "progress": result["data"]["process"],
+                "status": result["data"]["status"]  # 0进行中、1失败、2成功、3重试中
+            }
+        else:
+            raise Exception(f"获取下载进度失败: {result.get('message')}")
+
+    async def get_download_progress_batch(self, task_ids: List[int],
+                                          semaphore: Optional[asyncio.Semaphore] = None) -> Dict[int, object]:
+        """批量获取下载进度（API 不支持批量查询，通过共享的 HTTP/2 连接并发请求）
+
+        Args:
+            task_ids: 离线下载任务ID列表
+            semaphore: 调用方的并发限制，提供时每个进度查询各占用一个许可
+
+        Returns:
+            {task_id: 进度信息}，单个查询失败时对应的值为异常对象
+        """
+        if not task_ids:
+            return {}
+
+        async def query(task_id: int):
+            if semaphore is None:
+                return await self.get_download_progress(task_id)
+            async with semaphore:
+                return await self.get_download_progress(task_id)
+
+        results = await asyncio.gather(
+            *[query(task_id) for task_id in task_ids],
+            return_exceptions=True
+        )
+        return dict(zip(task_ids, results))
 
     async def cancel_download_task(self, task_id: int) -> bool:
         """取消下载任务（123云盘API可能不支持，这里保留接口）"""
@@ -778,6 +1158,8 @@ class Pan123FileService:
     """123云盘文件操作服务"""
 
     API_BASE = "https://open-api.123pan.com"
+    # 批量重命名接口单次最多处理的文件数
+    BATCH_RENAME_SIZE = 30
 
     def __init__(self, auth_service: Pan123AuthService):
         self.auth = auth_service
@@ -785,72 +1167,84 @@ class Pan123FileService:
     async def rename_file(self, file_id: int, new_name: str) -> bool:
         """重命名单个文件"""
         url = f"{self.API_BASE}/api/v1/file/name"
-        headers = {
-            "Authorization": self.auth.get_auth_header(),
-            "Platform": "open_platform",
-            "Content-Type": "application/json"
-        }
+        headers = self.auth.get_headers()
         data = {
             "fileId": file_id,
             "fileName": new_name
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.put(url, json=data, headers=headers)
-            result = response.json()
+        response = await self.auth.http.put(url, content=orjson.dumps(data), headers=headers)
+        result = _decode(response)
 
-            if result.get("code") == 0:
-                logger.info(f"文件重命名成功: {file_id} -> {new_name}")
-                return True
-            else:
-                logger.error(f"文件重命名失败: {result.get('message')}")
-                return False
+        if result.get("code") == 0:
+            logger.info(f"文件重命名成功: {file_id} -> {new_name}")
+            return True
+        else:
+            logger.error(f"文件重命名失败: {result.get('message')}")
+            return False
 
     async def batch_rename(self, rename_list: List[Tuple[int, str]]) -> Dict:
         """批量重命名文件，最多30个"""
         url = f"{self.API_BASE}/api/v1/file/rename"
-        headers = {
-            "Authorization": self.auth.get_auth_header(),
-            "Platform": "open_platform",
-            "Content-Type": "application/json"
-        }
+        headers = self.auth.get_headers()
         # 格式: ["fileId|newName", ...]
         rename_list_str = [f"{fid}|{name}" for fid, name in rename_list]
         data = {"renameList": rename_list_str}
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=data, headers=headers)
-            result = response.json()
+        response = await self.auth.http.post(url, content=orjson.dumps(data), headers=headers)
+        result = _decode(response)
 
-            if result.get("code") == 0:
-                logger.info(f"批量重命名成功: {len(rename_list_str)} 个文件")
-                return {
-                    "success_count": len(rename_list_str),
-                    "fail_count": 0
-                }
-            else:
-                logger.error(f"批量重命名失败: {result.get('message')}")
-                return {
-                    "success_count": 0,
-                    "fail_count": len(rename_list_str),
-                    "message": result.get("message")
-                }
+        if result.get("code") == 0:
+            logger.info(f"批量重命名成功: {len(rename_list_str)} 个文件")
+            return {
+                "success_count": len(rename_list_str),
+                "fail_count": 0
+            }
+        else:
+            logger.error(f"批量重命名失败: {result.get('message')}")
+            return {
+                "success_count": 0,
+                "fail_count": len(rename_list_str),
+                "message": result.get("message")
+            }
 
+    async def batch_rename_many(self, rename_list: List[Tuple[int, str]]) -> Dict:
+        """批量重命名任意数量的文件
 
-class Pan123AndroidFolderService:
+        按每批30个拆分后并发提交（并发数受全局请求限制约束），汇总各批结果
+        """
+        size = self.BATCH_RENAME_SIZE
+        chunks = [rename_list[i:i + size] for i in range(0, len(rename_list), size)]
+        results = await asyncio.gather(*(self.batch_rename(chunk) for chunk in chunks))
+
+        summary = {
+            "success_count": sum(r["success_count"] for r in results),
+            "fail_count": sum(r["fail_count"] for r in results)
+        }
+        messages = [r["message"] for r in results if r.get("message")]
+        if messages:
+            summary["message"] = "; ".join(dict.fromkeys(messages))
+        return summary
+
+
+class Pan123AndroidFolderService(_FolderIdCacheMixin):
     """123云盘文件夹管理服务 - 使用 Android 客户端 API（无需开发者权益包）"""
 
     API_BASE = "https://www.123pan.com"
+    # 并发翻页时同时进行的最大请求数
+    PAGE_CONCURRENCY = 8
 
     def __init__(self, auth_service: Pan123AuthService):
         self.auth = auth_service
+        self._page_semaphore = asyncio.Semaphore(self.PAGE_CONCURRENCY)
+        # {(parent_id, name): (folder_id, 缓存时间)}，按最近使用排序（LRU）
+        self._folder_id_cache: "OrderedDict[Tuple[int, str], Tuple[int, float]]" = OrderedDict()
 
     def _get_android_headers(self) -> dict:
         """获取 Android 客户端请求头"""
         return {
             "user-agent": "123pan/v2.4.0(12;Xiaomi)",
             "authorization": self.auth.get_auth_header(),
-            "accept-encoding": "gzip",
             "content-type": "application/json",
             "osversion": "12",
             "platform": "android",
@@ -861,11 +1255,10 @@ class Pan123AndroidFolderService:
             "x-app-version": "2.4.0"
         }
 
-    async def list_files(self, parent_id: int = 0, limit: int = 100) -> List[FileInfo]:
-        """获取文件列表（单次请求，最大100条）"""
+    async def _fetch_page(self, parent_id: int, page: int, limit: int = 100) -> dict:
+        """获取一页文件列表，返回原始 data 字段（包含 InfoList 和 Total）"""
         # 使用 Android 客户端 API
         url = f"{self.API_BASE}/api/file/list/new"
-        headers = self._get_android_headers()
         params = {
             "driveId": 0,
             "limit": limit,
@@ -875,116 +1268,140 @@ class Pan123AndroidFolderService:
             "parentFileId": str(parent_id),
             "trashed": False,
             "SearchData": "",
-            "Page": "1",
+            "Page": str(page),
             "OnlyLookAbnormalFile": 0,
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers, params=params, timeout=30)
-            result = response.json()
-
-            if result.get("code") != 0:
-                raise Exception(f"获取文件列表失败: {result.get('message', '未知错误')}")
-
-            # 转换数据格式
-            info_list = result.get("data", {}).get("InfoList", [])
-            files = []
-            for item in info_list:
-                # Type: 0=文件, 1=文件夹
-                file_type = 0 if item.get("Type") == 0 else 1
-                files.append(FileInfo(
-                    file_id=item.get("FileId", 0),
-                    filename=item.get("FileName", ""),
-                    parent_file_id=parent_id,
-                    type=file_type,
-                    size=item.get("Size", 0),
-                    etag=item.get("Etag", ""),
-                    status=item.get("Status", 1),
-                    category=item.get("Category", 0),
-                    trashed=0,  # Android API 已经通过 trashed 参数过滤
-                    create_at=item.get("CreateAt", ""),
-                    update_at=item.get("UpdateAt", 0),
-                ))
-
-            return files
+        # 限制并发页数，避免并发翻页触发限流
+        async with self._page_semaphore:
+            headers = self._get_android_headers()
+            response = await self.auth.http.get(url, headers=headers, params=params)
+        result = _decode(response)
+
+        if result.get("code") != 0:
+            raise Exception(f"获取文件列表失败: {result.get('message', '未知错误')}")
 
-    async def list_all_files(self, parent_id: int = 0) -> List[FileInfo]:
-        """获取文件列表（分批加载所有文件）"""
-        all_files = []
+        return result.get("data", {})
+
+    @staticmethod
+    def _parse_info_list(info_list: List[dict], parent_id: int) -> List[FileInfo]:
+        """将 Android API 返回的 InfoList 转换为 FileInfo 列表
+
+        大目录下条目很多，循环内绑定 item.get 并按位置传参，减少每条记录的属性查找开销
+        """
+        file_info = FileInfo
+        files = []
+        append = files.append
+        for item in info_list:
+            get = item.get
+            append(file_info(
+                get("FileId", 0),
+                get("FileName", ""),
+                parent_id,
+                0 if get("Type") == 0 else 1,  # Type: 0=文件, 1=文件夹
+                get("Size", 0),
+                get("Etag", ""),
+                get("Status", 1),
+                get("Category", 0),
+                0,  # trashed：Android API 已经通过 trashed 参数过滤
+                get("CreateAt", ""),
+                get("UpdateAt", 0),
+            ))
+        return files
+
+    async def list_files(self, parent_id: int = 0, limit: int = 100) -> List[FileInfo]:
+        """获取文件列表（单次请求，最大100条）"""
+        data = await self._fetch_page(parent_id, 1, limit)
+        return self._parse_info_list(data.get("InfoList", []), parent_id)
+
+    async def iter_files(self, parent_id: int = 0) -> AsyncIterator[FileInfo]:
+        """逐页获取文件列表并逐个产出，调用方可边取边过滤，无需先缓存所有页
+
+        处理当前页的同时已在后台请求下一页，隐藏翻页的网络延迟
+        """
+        count = 0
         limit = 100
 
         # Android API 使用分页，需要循环获取
         page = 1
-        while True:
-            url = f"{self.API_BASE}/api/file/list/new"
-            headers = self._get_android_headers()
-            params = {
-                "driveId": 0,
-                "limit": limit,
-                "next": 0,
-                "orderBy": "file_id",
-                "orderDirection": "desc",
-                "parentFileId": str(parent_id),
-                "trashed": False,
-                "SearchData": "",
-                "Page": str(page),
-                "OnlyLookAbnormalFile": 0,
-            }
+        next_page = asyncio.create_task(self._fetch_page(parent_id, page, limit))
+        try:
+            while next_page is not None:
+                data = await next_page
+                next_page = None
 
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, headers=headers, params=params, timeout=30)
-                result = response.json()
+                info_list = data.get("InfoList", [])
+                if not info_list:
+                    return
+                count += len(info_list)
 
-                if result.get("code") != 0:
-                    raise Exception(f"获取文件列表失败: {result.get('message', '未知错误')}")
+                # 还有剩余文件时立即预取下一页
+                if count < data.get("Total", 0):
+                    page += 1
+                    next_page = asyncio.create_task(self._fetch_page(parent_id, page, limit))
 
-                info_list = result.get("data", {}).get("InfoList", [])
-                if not info_list:
-                    break
-
-                # 转换数据格式
-                for item in info_list:
-                    file_type = 0 if item.get("Type") == 0 else 1
-                    all_files.append(FileInfo(
-                        file_id=item.get("FileId", 0),
-                        filename=item.get("FileName", ""),
-                        parent_file_id=parent_id,
-                        type=file_type,
-                        size=item.get("Size", 0),
-                        etag=item.get("Etag", ""),
-                        status=item.get("Status", 1),
-                        category=item.get("Category", 0),
-                        trashed=0,
-                        create_at=item.get("CreateAt", ""),
-                        update_at=item.get("UpdateAt", 0),
-                    ))
-
-                total = result.get("data", {}).get("Total", 0)
-                if len(all_files) >= total:
-                    break
-
-                page += 1
+                for file in self._parse_info_list(info_list, parent_id):
+                    yield file
+        finally:
+            _discard_task(next_page)
+
+    async def list_all_files(self, parent_id: int = 0) -> List[FileInfo]:
+        """获取文件列表（分批加载所有文件）
+
+        先请求第一页得到总数，再并发请求剩余各页（并发数受 PAGE_CONCURRENCY 限制）
+        """
+        limit = 100
+        data = await self._fetch_page(parent_id, 1, limit)
+        info_list = data.get("InfoList", [])
+        if not info_list:
+            return []
+
+        all_files = self._parse_info_list(info_list, parent_id)
+        total = data.get("Total", 0)
+        page_count = -(-total // limit)  # 向上取整
+        if page_count > 1:
+            pages = await asyncio.gather(
+                *(self._fetch_page(parent_id, page, limit) for page in range(2, page_count + 1))
+            )
+            for page_data in pages:
+                all_files.extend(self._parse_info_list(page_data.get("InfoList", []), parent_id))
 
         return all_files
 
     async def find_folder(self, name: str, parent_id: int = 0) -> Optional[int]:
         """查找文件夹，返回文件夹ID，如果不存在返回None"""
+        folder_id = self._get_cached_folder_id(parent_id, name)
+        if folder_id is not None:
+            return folder_id
+
         files = await self.list_files(parent_id, limit=100)
         for file in files:
             if file.type == 1 and file.filename == name:
+                self._cache_folder_id(parent_id, name, file.file_id)
                 return file.file_id
         return None
 
-    async def create_folder(self, name: str, parent_id: int = 0, check_exists: bool = True) -> int:
+    async def create_folder(self, name: str, parent_id: int = 0, check_exists: bool = True,
+                            prefer_try_first: bool = True) -> int:
         """创建文件夹，返回文件夹ID
 
         Args:
             name: 文件夹名称
             parent_id: 父目录ID
             check_exists: 是否检查文件夹是否已存在，如果存在则返回现有文件夹ID
+            prefer_try_first: 检查已存在时，直接请求创建并允许复用同名文件夹，
+                仅在返回同名冲突时才列目录查找（省去正常情况下的一次列表请求）
         """
-        # 如果启用检查，先查找是否已存在
+        try_first = check_exists and prefer_try_first
+
+        # 批量创建任务时年份/月份文件夹都相同，命中缓存时无需请求API
         if check_exists:
+            cached_folder_id = self._get_cached_folder_id(parent_id, name)
+            if cached_folder_id is not None:
+                return cached_folder_id
+
+        # 如果启用检查且不先尝试创建，先查找是否已存在
+        if check_exists and not try_first:
             existing_folder_id = await self.find_folder(name, parent_id)
             if existing_folder_id is not None:
                 return existing_folder_id
@@ -1001,17 +1418,45 @@ class Pan123AndroidFolderService:
             "size": 0,
             "type": 1,  # 1 表示文件夹
             "duplicate": 1,
-            "NotReuse": True,
+            "NotReuse": not try_first,  # 先尝试创建时允许复用已存在的同名文件夹
             "event": "newCreateFolder",
             "operateType": 1,
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=data, headers=headers, timeout=30)
-            result = response.json()
+        response = await self.auth.http.post(url, content=orjson.dumps(data), headers=headers)
+        result = _decode(response)
+
+        if result.get("code") != 0:
+            error_msg = result.get('message', '未知错误')
+            if try_first and _is_duplicate_error(error_msg):
+                existing_folder_id = await self.find_folder(name, parent_id)
+                if existing_folder_id is not None:
+                    return existing_folder_id
+            raise Exception(f"创建文件夹失败: {error_msg}")
+
+        # 返回创建（或复用）的文件夹 ID
+        folder_id = result.get("data", {}).get("fileId", 0)
+        if folder_id:
+            self._cache_folder_id(parent_id, name, folder_id)
+        return folder_id
+
+
+def get_folder_service(auth_service: Pan123AuthService, user_id: str = None) -> Pan123FolderService:
+    """获取认证服务对应的文件夹服务（缓存在认证服务实例上，文件夹ID缓存可跨调用复用）"""
+    if auth_service._folder_service is None:
+        auth_service._folder_service = Pan123FolderService(auth_service, user_id)
+    return auth_service._folder_service
+
+
+def get_android_folder_service(auth_service: Pan123AuthService) -> Pan123AndroidFolderService:
+    """获取认证服务对应的 Android 文件夹服务（缓存在认证服务实例上，文件夹ID缓存可跨请求复用）"""
+    if auth_service._android_folder_service is None:
+        auth_service._android_folder_service = Pan123AndroidFolderService(auth_service)
+    return auth_service._android_folder_service
 
-            if result.get("code") != 0:
-                raise Exception(f"创建文件夹失败: {result.get('message', '未知错误')}")
 
-            # 返回创建的文件夹 ID
-            return result.get("data", {}).get("fileId", 0)
+def get_download_service(auth_service: Pan123AuthService) -> Pan123DownloadService:
+    """获取认证服务对应的离线下载服务（缓存在认证服务实例上）"""
+    if auth_service._download_service is None:
+        auth_service._download_service = Pan123DownloadService(auth_service)
+    return auth_service._download_service
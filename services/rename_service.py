@@ -2,6 +2,7 @@
 文件重命名服务
 """
 import asyncio
+import random
 from typing import Tuple, Optional
 from loguru import logger
 
@@ -10,10 +11,19 @@ from services.pan123_service import (
     Pan123FileService
 )
 
+# Windows 不允许的文件名字符及 0x00-0x1f 控制字符，统一替换为下划线
+_ILLEGAL_CHARS_TABLE = str.maketrans(
+    {**{c: '_' for c in '<>:"/\\|?*'}, **{i: '_' for i in range(0x20)}}
+)
+
 
 class RenameService:
     """文件重命名服务"""
 
+    # 等待下载完成时的检查间隔（秒）：初始值和退避上限
+    POLL_INITIAL_INTERVAL = 2.0
+    POLL_MAX_INTERVAL = 30.0
+
     def __init__(self, auth_service: Pan123AuthService):
         self.auth = auth_service
         self.file_service = Pan123FileService(auth_service)
@@ -52,10 +62,8 @@ class RenameService:
 
     def sanitize_filename(self, filename: str) -> str:
         """清理文件名，移除非法字符"""
-        # 移除Windows不允许的字符
-        illegal_chars = '<>:"/\\|?*\x00-\x1f'
-        for char in illegal_chars:
-            filename = filename.replace(char, '_')
+        # 移除Windows不允许的字符（单次遍历替换）
+        filename = filename.translate(_ILLEGAL_CHARS_TABLE)
 
         # 移除前后空格
         filename = filename.strip()
@@ -75,10 +83,13 @@ class RenameService:
         from services.pan123_service import Pan123DownloadService
 
         download_service = Pan123DownloadService(self.auth)
-        elapsed = 0
-        interval = 30  # 30秒检查一次
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        # 从短间隔开始检查，状态不变时指数退避（带随机抖动），最长30秒
+        interval = self.POLL_INITIAL_INTERVAL
+        last_status = None
 
-        while elapsed < timeout:
+        while loop.time() < deadline:
             try:
                 progress_info = await download_service.get_download_progress(download_task_id)
                 status_code = progress_info["status"]
@@ -88,12 +99,15 @@ class RenameService:
                 elif status_code == 1:  # 下载失败
                     return False
 
-                await asyncio.sleep(interval)
-                elapsed += interval
+                # 状态变化时重新从短间隔开始
+                if status_code != last_status:
+                    last_status = status_code
+                    interval = self.POLL_INITIAL_INTERVAL
 
             except Exception as e:
                 logger.error(f"检查下载状态失败: {e}")
-                await asyncio.sleep(interval)
-                elapsed += interval
+
+            await asyncio.sleep(min(interval, max(0.0, deadline - loop.time())))
+            interval = min(self.POLL_MAX_INTERVAL, interval * 1.5) + random.uniform(0, 0.5)
 
         return False
@@ -2,23 +2,46 @@
 任务管理服务
 负责任务的生命周期管理和数据持久化
 """
+import asyncio
+import heapq
+import time
 import uuid
+from operator import attrgetter
 from pathlib import Path
-from typing import Optional, List
+from typing import Optional, List, Callable, Dict, Set, Tuple, Union
 from datetime import datetime
-from dataclasses import dataclass
+from dataclasses import dataclass, field, fields
 from loguru import logger
 
 from api.models import TaskStatus, TaskInfo
 from services.pan123_service import (
     Pan123AuthService,
-    Pan123FolderService,
-    Pan123DownloadService
+    Pan123DirNotFoundError,
+    get_folder_service,
+    get_download_service
 )
 from services.database import get_database
 
+# 需要后台监控的任务状态
+ACTIVE_STATUSES = frozenset({TaskStatus.DOWNLOADING.value, TaskStatus.RENAMING.value})
 
-@dataclass
+
+def _parse_timestamp(value) -> float:
+    """将数据库中的时间（ISO 字符串，或已是时间戳）转换为 Unix 时间戳"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def _format_timestamp(ts: float) -> str:
+    """将 Unix 时间戳格式化为数据库使用的 ISO 字符串（本地时间）"""
+    return datetime.fromtimestamp(ts).isoformat()
+
+
+@dataclass(slots=True)
 class TaskData:
     """任务数据存储模型"""
     task_id: str
@@ -31,15 +54,25 @@ class TaskData:
     progress: float
     file_id: Optional[int]
     desired_name: Optional[str]
-    created_at: str
-    updated_at: str
+    created_at: float  # Unix 时间戳，仅在写库和输出 API 时格式化
+    updated_at: float
     error_message: Optional[str]
     download_url: Optional[str] = None  # 下载链接，用于重试
     retry_count: int = 0  # 重试次数
     user_id: Optional[str] = None  # 用户ID，用于多用户支持
+    # 上次转换的API模型及当时的 updated_at；所有修改都经过 update_task 并刷新 updated_at
+    _model_cache: Optional[Tuple[float, TaskInfo]] = field(default=None, init=False, repr=False, compare=False)
 
     def to_model(self) -> TaskInfo:
-        """转换为API模型"""
+        """转换为API模型（任务未更新时复用上次的结果）"""
+        cached = self._model_cache
+        if cached is not None and cached[0] == self.updated_at:
+            return cached[1]
+        model = self._build_model()
+        self._model_cache = (self.updated_at, model)
+        return model
+
+    def _build_model(self) -> TaskInfo:
         return TaskInfo(
             task_id=self.task_id,
             video_id=self.video_id,
@@ -51,8 +84,8 @@ class TaskData:
             progress=self.progress,
             file_id=self.file_id,
             desired_name=self.desired_name,
-            created_at=datetime.fromisoformat(self.created_at),
-            updated_at=datetime.fromisoformat(self.updated_at),
+            created_at=datetime.fromtimestamp(self.created_at),
+            updated_at=datetime.fromtimestamp(self.updated_at),
             error_message=self.error_message
         )
 
@@ -70,35 +103,149 @@ class TaskData:
             progress=data.get("progress", 0.0),
             file_id=data.get("file_id"),
             desired_name=data.get("desired_name"),
-            created_at=data["created_at"],
-            updated_at=data["updated_at"],
+            created_at=_parse_timestamp(data["created_at"]),
+            updated_at=_parse_timestamp(data["updated_at"]),
             error_message=data.get("error_message"),
             download_url=data.get("download_url"),
             retry_count=data.get("retry_count", 0),
             user_id=data.get("user_id")
         )
 
+    def to_db_dict(self) -> dict:
+        """转换为写入数据库的字典（时间字段为 ISO 字符串）"""
+        data = {name: getattr(self, name) for name in _TASK_DB_FIELDS}
+        data["created_at"] = _format_timestamp(self.created_at)
+        data["updated_at"] = _format_timestamp(self.updated_at)
+        return data
+
+
+# 写入数据库的字段（不含缓存字段）
+_TASK_DB_FIELDS = tuple(f.name for f in fields(TaskData) if f.init)
+
+
+@dataclass
+class CreateTaskArgs:
+    """批量创建任务时单个任务的参数"""
+    video_id: str
+    title: str
+    download_url: str
+    folder_name: str
+    parent_dir_id: int
+    desired_name: Optional[str] = None
+    skip_folder_creation: bool = False
+
 
 class TaskManager:
     """任务管理器"""
 
+    # 任务更新合并写入数据库的间隔（秒）
+    FLUSH_INTERVAL = 0.5
+
     def __init__(self):
         self.db = get_database()
+        # 任务进入下载中/重命名中状态时的回调（由监控服务注册，用于立即唤醒监控循环）
+        self._on_task_active: Optional[Callable[[], None]] = None
+        # 尚未写入数据库的任务更新 {task_id: update_data}
+        self._dirty: Dict[str, dict] = {}
+        # 后台任务正在写入的更新
+        self._inflight: Dict[str, dict] = {}
+        self._flush_task: Optional[asyncio.Task] = None
         self._load_cache()
 
+    def set_task_active_callback(self, callback: Optional[Callable[[], None]]):
+        """设置任务进入活跃状态时的回调"""
+        self._on_task_active = callback
+
+    def _notify_task_active(self):
+        """通知监控服务有任务需要处理"""
+        if self._on_task_active:
+            self._on_task_active()
+
     def _load_cache(self):
         """从数据库加载任务到缓存"""
         self.tasks_cache = {}
+        # 已分配给任务的云盘文件ID索引 {file_id: {task_id, ...}}
+        self._file_id_owners: Dict[int, Set[str]] = {}
+        # 已完成任务按完成时间排序的最小堆 [(updated_at 时间戳, task_id)]
+        self._completed_heap: List[Tuple[float, str]] = []
+        # 进行中（下载中/重命名中）的任务，按用户分组 {user_id: {task_id: task}}
+        self._active_by_user: Dict[str, Dict[str, TaskData]] = {}
         try:
             task_dicts = self.db.get_all_tasks()
             self.tasks_cache = {
                 task_data["task_id"]: TaskData.from_dict(task_data)
                 for task_data in task_dicts
             }
+            for task in self.tasks_cache.values():
+                self._index_file_id(task)
+                self._track_completed(task)
+                self._index_active(task)
             logger.info(f"加载了 {len(self.tasks_cache)} 个任务")
         except Exception as e:
             logger.error(f"加载任务失败: {e}")
             self.tasks_cache = {}
+            self._file_id_owners = {}
+            self._completed_heap = []
+            self._active_by_user = {}
+
+    def _index_file_id(self, task: TaskData):
+        """记录任务使用的文件ID"""
+        if task.file_id is not None:
+            self._file_id_owners.setdefault(task.file_id, set()).add(task.task_id)
+
+    def _unindex_file_id(self, task: TaskData):
+        """移除任务使用的文件ID"""
+        owners = self._file_id_owners.get(task.file_id)
+        if owners is not None:
+            owners.discard(task.task_id)
+            if not owners:
+                del self._file_id_owners[task.file_id]
+
+    def _index_active(self, task: TaskData, removed: bool = False):
+        """根据任务状态维护进行中任务索引"""
+        user_key = task.user_id or "global"
+        if not removed and task.status in ACTIVE_STATUSES:
+            self._active_by_user.setdefault(user_key, {})[task.task_id] = task
+            return
+        bucket = self._active_by_user.get(user_key)
+        if bucket is not None:
+            bucket.pop(task.task_id, None)
+            if not bucket:
+                del self._active_by_user[user_key]
+
+    def get_active_tasks_by_user(self) -> Dict[str, List[TaskData]]:
+        """获取进行中的任务，按用户分组（全局任务的键为 "global"）"""
+        return {user_key: list(bucket.values()) for user_key, bucket in self._active_by_user.items()}
+
+    def list_active_tasks(self) -> List[TaskData]:
+        """获取所有进行中的任务"""
+        return [task for bucket in self._active_by_user.values() for task in bucket.values()]
+
+    def _track_completed(self, task: TaskData):
+        """将已完成的任务加入完成时间堆"""
+        if task.status != TaskStatus.COMPLETED.value:
+            return
+        heapq.heappush(self._completed_heap, (task.updated_at, task.task_id))
+
+    def pop_expired(self, before: datetime) -> List[str]:
+        """取出在 before 之前完成、且之后没有再更新的任务ID"""
+        expired = []
+        heap = self._completed_heap
+        before_ts = before.timestamp()
+        while heap and heap[0][0] < before_ts:
+            updated_at, task_id = heapq.heappop(heap)
+            task = self.tasks_cache.get(task_id)
+            # 任务已删除或之后又被更新过的记录直接丢弃（更新时会重新入堆）
+            if task and task.status == TaskStatus.COMPLETED.value and task.updated_at == updated_at:
+                expired.append(task_id)
+        return expired
+
+    def is_file_id_used(self, file_id: int, exclude_task_id: Optional[str] = None) -> bool:
+        """文件ID是否已被（除 exclude_task_id 以外的）任务使用"""
+        owners = self._file_id_owners.get(file_id)
+        if not owners:
+            return False
+        return len(owners) > 1 or exclude_task_id not in owners
 
     async def create_task(
         self,
@@ -113,91 +260,123 @@ class TaskManager:
         skip_folder_creation: bool = False
     ) -> TaskData:
         """创建新任务"""
-        task_id = str(uuid.uuid4())
+        args = CreateTaskArgs(
+            video_id=video_id,
+            title=title,
+            download_url=download_url,
+            folder_name=folder_name,
+            parent_dir_id=parent_dir_id,
+            desired_name=desired_name,
+            skip_folder_creation=skip_folder_creation
+        )
+        result = (await self.create_tasks_bulk([args], auth_service, user_id))[0]
+        if isinstance(result, BaseException):
+            raise result
+        return result
 
-        # 创建文件夹（如果已存在则复用），除非指定跳过
-        if not skip_folder_creation:
-            folder_service = Pan123FolderService(auth_service, user_id or "global")
-            folder_id = await folder_service.create_folder(folder_name, parent_dir_id, check_exists=True)
-        else:
-            # 跳过文件夹创建，直接使用传入的 parent_dir_id 作为文件夹ID
-            folder_id = parent_dir_id
+    async def create_tasks_bulk(
+        self,
+        requests: List[CreateTaskArgs],
+        auth_service: Pan123AuthService,
+        user_id: Optional[str] = None
+    ) -> List[Union[TaskData, Exception]]:
+        """批量创建任务
 
-        # 创建离线下载任务
-        download_service = Pan123DownloadService(auth_service)
+        相同 (父目录, 文件夹名) 的请求只创建一次文件夹，各文件夹并发创建；
+        离线下载任务并发提交，成功的任务在一个事务内写入数据库。
+        返回与 requests 一一对应的列表，失败的位置为对应的异常。
+        """
+        folder_service = get_folder_service(auth_service, user_id)
+        download_service = get_download_service(auth_service)
 
-        # 尝试创建下载任务，如果失败（文件夹 ID 失效），则重新创建文件夹
-        try:
-            download_task_id = await download_service.create_download_task(
-                download_url,
-                folder_id
-            )
-        except Exception as e:
-            error_msg = str(e) if str(e) else ""
-            if "指定目录ID文件不存在" in error_msg or "目录不存在" in error_msg:
+        # 创建文件夹（如果已存在则复用），除非指定跳过
+        folder_keys = list(dict.fromkeys(
+            (req.parent_dir_id, req.folder_name) for req in requests if not req.skip_folder_creation
+        ))
+        folder_results = await asyncio.gather(
+            *(folder_service.create_folder(name, parent_id, check_exists=True) for parent_id, name in folder_keys),
+            return_exceptions=True
+        )
+        folder_ids = dict(zip(folder_keys, folder_results))
+
+        # 同一文件夹ID失效时只重新创建一次
+        recreated: Dict[Tuple[int, str], asyncio.Task] = {}
+
+        def recreate_folder(parent_id: int, name: str) -> asyncio.Task:
+            key = (parent_id, name)
+            if key not in recreated:
+                recreated[key] = asyncio.ensure_future(
+                    folder_service.create_folder(name, parent_id, check_exists=False)
+                )
+            return recreated[key]
+
+        async def submit(req: CreateTaskArgs) -> TaskData:
+            if req.skip_folder_creation:
+                # 跳过文件夹创建，直接使用传入的 parent_dir_id 作为文件夹ID
+                folder_id = req.parent_dir_id
+            else:
+                folder_id = folder_ids[(req.parent_dir_id, req.folder_name)]
+                if isinstance(folder_id, BaseException):
+                    raise folder_id
+
+            # 尝试创建下载任务，如果文件夹 ID 失效，则重新创建文件夹；其他错误直接抛出
+            try:
+                download_task_id = await download_service.create_download_task(
+                    req.download_url,
+                    folder_id
+                )
+            except Pan123DirNotFoundError:
                 # 文件夹 ID 失效，重新创建文件夹（不检查是否存在，强制创建新的）
-                logger.warning(f"文件夹 ID {folder_id} 已失效，尝试重新创建文件夹: {folder_name}")
+                logger.warning(f"文件夹 ID {folder_id} 已失效，尝试重新创建文件夹: {req.folder_name}")
                 try:
-                    folder_service = Pan123FolderService(auth_service, user_id or "global")
-                    folder_id = await folder_service.create_folder(folder_name, parent_dir_id, check_exists=False)
-                    logger.info(f"重新创建文件夹成功: {folder_name}, 新 ID: {folder_id}")
+                    folder_id = await recreate_folder(req.parent_dir_id, req.folder_name)
+                    logger.info(f"重新创建文件夹成功: {req.folder_name}, 新 ID: {folder_id}")
                     # 再次尝试创建下载任务
                     download_task_id = await download_service.create_download_task(
-                        download_url,
+                        req.download_url,
                         folder_id
                     )
                 except Exception as retry_error:
                     logger.error(f"重新创建文件夹后仍然失败: {retry_error}")
                     raise
-            else:
-                # 其他错误，直接抛出
-                raise
 
-        # 创建任务记录
-        task = TaskData(
-            task_id=task_id,
-            video_id=video_id,
-            title=title,
-            folder_id=folder_id,
-            folder_name=folder_name,
-            download_task_id=download_task_id,
-            status=TaskStatus.DOWNLOADING.value,
-            progress=0.0,
-            file_id=None,
-            desired_name=desired_name if desired_name else title,
-            created_at=datetime.now().isoformat(),
-            updated_at=datetime.now().isoformat(),
-            error_message=None,
-            download_url=download_url,
-            retry_count=0,
-            user_id=user_id
-        )
+            # 创建任务记录
+            now = time.time()
+            return TaskData(
+                task_id=str(uuid.uuid4()),
+                video_id=req.video_id,
+                title=req.title,
+                folder_id=folder_id,
+                folder_name=req.folder_name,
+                download_task_id=download_task_id,
+                status=TaskStatus.DOWNLOADING.value,
+                progress=0.0,
+                file_id=None,
+                desired_name=req.desired_name if req.desired_name else req.title,
+                created_at=now,
+                updated_at=now,
+                error_message=None,
+                download_url=req.download_url,
+                retry_count=0,
+                user_id=user_id
+            )
+
+        results = await asyncio.gather(*(submit(req) for req in requests), return_exceptions=True)
+        tasks = [task for task in results if isinstance(task, TaskData)]
+        if not tasks:
+            return results
+
+        for task in tasks:
+            self.tasks_cache[task.task_id] = task
+            self._index_active(task)
+
+        # 保存到数据库（单个事务）
+        self.db.create_tasks_bulk([task.to_db_dict() for task in tasks])
+        self._notify_task_active()
 
-        self.tasks_cache[task_id] = task
-
-        # 保存到数据库
-        task_dict = {
-            "task_id": task.task_id,
-            "video_id": task.video_id,
-            "title": task.title,
-            "folder_id": task.folder_id,
-            "folder_name": task.folder_name,
-            "download_task_id": task.download_task_id,
-            "status": task.status,
-            "progress": task.progress,
-            "file_id": task.file_id,
-            "desired_name": task.desired_name,
-            "created_at": task.created_at,
-            "updated_at": task.updated_at,
-            "error_message": task.error_message,
-            "download_url": task.download_url,
-            "retry_count": task.retry_count,
-            "user_id": task.user_id
-        }
-        self.db.create_task(task_dict)
-
-        logger.info(f"创建任务成功: {task_id}, 文件夹ID: {folder_id}")
-        return task
+        for task in tasks:
+            logger.info(f"创建任务成功: {task.task_id}, 文件夹ID: {task.folder_id}")
+        return results
 
     def get_task(self, task_id: str) -> Optional[TaskData]:
         """获取任务"""
@@ -218,39 +397,121 @@ class TaskManager:
         if not task:
             return False
 
+        # 只包含传入的字段，同时用于更新缓存和写入数据库
+        update_data = {}
         if status:
-            task.status = status.value
+            update_data["status"] = status.value
         if progress is not None:
-            task.progress = progress
+            update_data["progress"] = progress
         if file_id is not None:
-            task.file_id = file_id
+            update_data["file_id"] = file_id
         if error_message is not None:
-            task.error_message = error_message
+            update_data["error_message"] = error_message
         if download_task_id is not None:
-            task.download_task_id = download_task_id
+            update_data["download_task_id"] = download_task_id
         if retry_count is not None:
-            task.retry_count = retry_count
+            update_data["retry_count"] = retry_count
+        # 分配了新的离线下载任务（重试）时，之前关联的文件不再属于该任务，清除 file_id
+        if download_task_id is not None and download_task_id != task.download_task_id and file_id is None:
+            update_data["file_id"] = None
+
+        file_id_changed = "file_id" in update_data and update_data["file_id"] != task.file_id
+        if file_id_changed:
+            self._unindex_file_id(task)
+        for key, value in update_data.items():
+            setattr(task, key, value)
+        if file_id_changed:
+            self._index_file_id(task)
+
+        # 缓存中保存时间戳，数据库中只在这里格式化一次
+        task.updated_at = time.time()
+        update_data["updated_at"] = _format_timestamp(task.updated_at)
+
+        # 合并到待写入的更新中，由后台任务批量写库；进入终态时立即写入
+        self._dirty.setdefault(task_id, {}).update(update_data)
+        if status in (TaskStatus.COMPLETED, TaskStatus.FAILED) or not self._start_flusher():
+            self.flush()
+
+        self._track_completed(task)
+        if status:
+            self._index_active(task)
+        if status and task.status in ACTIVE_STATUSES:
+            self._notify_task_active()
+        return True
 
-        task.updated_at = datetime.now().isoformat()
+    def _start_flusher(self) -> bool:
+        """确保后台写库任务在运行，没有事件循环时返回 False"""
+        if self._flush_task is not None and not self._flush_task.done():
+            return True
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        self._flush_task = loop.create_task(self._run_flusher())
+        return True
 
-        # 更新数据库
-        update_data = {"updated_at": task.updated_at}
-        if status:
-            update_data["status"] = task.status
-        if progress is not None:
-            update_data["progress"] = task.progress
-        if file_id is not None:
-            update_data["file_id"] = task.file_id
-        if error_message is not None:
-            update_data["error_message"] = task.error_message
-        if download_task_id is not None:
-            update_data["download_task_id"] = task.download_task_id
-        if retry_count is not None:
-            update_data["retry_count"] = task.retry_count
+    def _take_dirty(self) -> Dict[str, dict]:
+        """取出所有待写入的更新"""
+        updates, self._dirty = self._dirty, {}
+        return updates
+
+    def _restore_dirty(self, updates: Dict[str, dict]):
+        """写库失败时放回待写入的更新（保留之后产生的较新字段）"""
+        for task_id, update_data in updates.items():
+            if task_id in self.tasks_cache:
+                self._dirty[task_id] = {**update_data, **self._dirty.get(task_id, {})}
+
+    def _write_updates(self, updates: Dict[str, dict]) -> bool:
+        """将更新批量写入数据库"""
+        try:
+            self.db.update_tasks_bulk(updates)
+            return True
+        except Exception as e:
+            logger.error(f"批量写入任务更新失败: {e}")
+            return False
 
-        self.db.update_task(task_id, update_data)
+    def flush(self) -> bool:
+        """立即将待写入的更新写入数据库"""
+        updates = self._take_dirty()
+        if not updates:
+            return True
+        # 后台可能仍在写入同一任务的旧更新，合并进来一并写入；
+        # 旧更新随后落库时会因 updated_at 较旧而被跳过
+        for task_id, update_data in updates.items():
+            pending = self._inflight.get(task_id)
+            if pending:
+                updates[task_id] = {**pending, **update_data}
+        if not self._write_updates(updates):
+            self._restore_dirty(updates)
+            return False
         return True
 
+    async def _run_flusher(self):
+        """后台定期批量写入任务更新，将多次进度更新合并为一个事务"""
+        while True:
+            await asyncio.sleep(self.FLUSH_INTERVAL)
+            updates = self._take_dirty()
+            if not updates:
+                continue
+            # 在线程池中写库，避免磁盘 I/O 阻塞事件循环
+            self._inflight = updates
+            ok = await asyncio.to_thread(self._write_updates, updates)
+            self._inflight = {}
+            if not ok:
+                self._restore_dirty(updates)
+
+    async def aclose(self):
+        """停止后台写库任务并写入剩余更新（关闭服务时调用）"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            try:
+                await self._flush_task
+            except asyncio.CancelledError:
+                pass
+            self._flush_task = None
+        self.flush()
+        self._inflight = {}
+
     def cancel_task(self, task_id: str) -> bool:
         """取消任务（标记为失败）"""
         return self.update_task(
@@ -262,36 +523,48 @@ class TaskManager:
     def delete_task(self, task_id: str) -> bool:
         """删除任务记录"""
         if task_id in self.tasks_cache:
-            del self.tasks_cache[task_id]
+            task = self.tasks_cache.pop(task_id)
+            self._dirty.pop(task_id, None)
+            self._unindex_file_id(task)
+            self._index_active(task, removed=True)
             self.db.delete_task(task_id)
             return True
         return False
 
+    def _evict_deleted(self, task_ids: List[str]):
+        """从缓存和索引中移除已在数据库删除的任务"""
+        for task_id in task_ids:
+            task = self.tasks_cache.pop(task_id, None)
+            self._dirty.pop(task_id, None)
+            if task is not None:
+                self._unindex_file_id(task)
+                self._index_active(task, removed=True)
+
     def delete_tasks_by_status(self, status: str, user_id: Optional[str] = None) -> int:
         """根据状态批量删除任务"""
-        # 从数据库删除
-        deleted_count = self.db.delete_tasks_by_status(status, user_id)
-        # 清理缓存
-        self._load_cache()
-        return deleted_count
+        # 从数据库删除，只清理被删除的缓存条目（无需重新加载全部任务）
+        deleted_ids = self.db.delete_tasks_by_status(status, user_id)
+        self._evict_deleted(deleted_ids)
+        return len(deleted_ids)
 
     def delete_all_tasks(self, user_id: Optional[str] = None) -> int:
         """删除所有任务"""
-        # 从数据库删除
-        deleted_count = self.db.delete_all_tasks(user_id)
-        # 清理缓存
-        self._load_cache()
-        return deleted_count
+        deleted_ids = self.db.delete_all_tasks(user_id)
+        self._evict_deleted(deleted_ids)
+        return len(deleted_ids)
 
     def list_tasks(self, status_filter: Optional[str] = None, user_id: Optional[str] = None) -> List[TaskData]:
-        """列出任务"""
-        # 从数据库查询而不是使用缓存
-        task_dicts = self.db.get_all_tasks(status_filter, user_id)
-        tasks = [TaskData.from_dict(task_data) for task_data in task_dicts]
-        return tasks
+        """列出任务（直接使用缓存，按创建时间倒序）"""
+        tasks = self.tasks_cache.values()
+        if status_filter and status_filter != "all":
+            tasks = [task for task in tasks if task.status == status_filter]
+        if user_id:
+            tasks = [task for task in tasks if task.user_id == user_id]
+        return sorted(tasks, key=attrgetter("created_at"), reverse=True)
 
     def get_task_statistics(self, user_id: Optional[str] = None) -> dict:
         """获取任务统计"""
+        self.flush()
         return self.db.get_task_statistics(user_id)
 
 
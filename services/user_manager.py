@@ -1,26 +1,135 @@
 """
 用户管理服务
 负责用户登录、注册、会话管理
+
+登录时无论用户是否存在、是否被禁用，都会执行一次相同代价的 scrypt 计算，
+使响应时间不随用户名是否存在而变化，避免通过耗时枚举用户名。
 """
+import asyncio
+import base64
 import hashlib
+import hmac
 import secrets
 import json
-from typing import Optional, Dict, Any
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta
 from loguru import logger
 
 
+# scrypt 参数（n=2^14, r=8, p=1，约 16MB 内存）
+_SCRYPT_N = 2 ** 14
+_SCRYPT_R = 8
+_SCRYPT_P = 1
+_SCRYPT_DKLEN = 32
+
+# 运行时使用的 SQL 语句（模块级常量，配合连接的语句缓存复用已编译的语句）
+_INSERT_USER_SQL = """
+    INSERT INTO users (user_id, username, password_hash, api_key, api_key_id, created_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(username) DO NOTHING
+    RETURNING user_id
+"""
+_GET_USER_BY_NAME_SQL = """
+    SELECT user_id, username, password_hash, api_key, is_active
+    FROM users
+    WHERE username = ?
+"""
+_UPDATE_LAST_LOGIN_SQL = "UPDATE users SET last_login = ? WHERE user_id = ?"
+_UPDATE_PASSWORD_HASH_SQL = "UPDATE users SET password_hash = ? WHERE user_id = ?"
+_GET_USER_BY_API_KEY_ID_SQL = """
+    SELECT user_id, username, is_active, api_key
+    FROM users
+    WHERE api_key_id = ? AND is_active = 1
+"""
+_GET_USER_PASSWORD_SQL = "SELECT user_id, username, password_hash FROM users WHERE user_id = ?"
+_UPDATE_API_KEY_SQL = "UPDATE users SET api_key = ?, api_key_id = ? WHERE user_id = ?"
+_USER_SUMMARY_COLS = ("user_id", "username", "created_at", "last_login", "is_active")
+_LIST_USERS_SQL = f"""
+    SELECT {", ".join(_USER_SUMMARY_COLS)}
+    FROM users
+    ORDER BY created_at DESC
+"""
+_GET_USER_CONFIG_SQL = "SELECT config_json FROM users WHERE user_id = ?"
+_SET_USER_CONFIG_SQL = "UPDATE users SET config_json = ?, config_updated_at = ? WHERE user_id = ?"
+_DELETE_USER_SQL = "DELETE FROM users WHERE user_id = ?"
+_DELETE_USER_CONFIGS_SQL = "DELETE FROM user_configs WHERE user_id = ?"
+# token 相关的配置不应该从全局配置复制
+_SKIP_INIT_CONFIG_KEYS = frozenset({'access_token', 'token_expires_at'})
+
+
+# 用户不存在时用于比较的哈希，使该分支与真实验证的耗时一致
+_DUMMY_SALT = b"\0" * 16
+_DUMMY_HASH = hashlib.scrypt(b"dummy", salt=_DUMMY_SALT, n=_SCRYPT_N, r=_SCRYPT_R, p=_SCRYPT_P, dklen=_SCRYPT_DKLEN)
+
+
+# 当前时间字符串缓存 [整秒时间戳, ISO 字符串]，同一秒内复用
+_now_cache = [0, ""]
+
+
+def _now_iso() -> str:
+    """返回精确到秒的当前时间 ISO 字符串（同一秒内不重复格式化）"""
+    t = int(time.time())
+    if t != _now_cache[0]:
+        _now_cache[:] = [t, datetime.fromtimestamp(t).isoformat(timespec="seconds")]
+    return _now_cache[1]
+
+
+def _decode_legacy_config_value(value: Optional[str]) -> Any:
+    """按旧版 user_configs 表的读取方式还原配置值（先尝试 JSON，失败则保留字符串）"""
+    try:
+        return json.loads(value)
+    except (json.JSONDecodeError, TypeError):
+        return value
+
+
+def _merge_config(config: Dict[str, Any], config_data: Dict[str, Any]):
+    """将 {section: {key: value}} 按键合并到 config 中"""
+    for section_name, section_data in config_data.items():
+        section = config.setdefault(section_name, {})
+        section.update(section_data)
+
+
 class UserManager:
     """用户管理器"""
 
+    # API密钥验证缓存：有效期（秒）和最大条目数
+    API_KEY_CACHE_TTL = 60
+    API_KEY_CACHE_SIZE = 1024
+    # 最后登录时间合并写入间隔（秒）
+    LAST_LOGIN_FLUSH_INTERVAL = 0.5
+
     def __init__(self):
         from services.database import get_database
         self.db = get_database()
+        # 用户配置版本号，每次修改用户配置时递增，用于使配置缓存失效
+        self.config_version = 0
+        # API密钥验证缓存 {api_key_id: (用户信息, 过期时间)}，按最近使用排序（LRU）
+        self._api_key_cache: "OrderedDict[bytes, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        # 待写入的最后登录时间 {user_id: 时间}，由后台任务批量写入
+        self._pending_last_login: Dict[str, str] = {}
+        self._pending_last_login_lock = threading.Lock()
+        # 新用户默认配置模板 (全局配置版本号, 模板)
+        self._default_config: Optional[Tuple[int, Dict[str, Any]]] = None
+        self._api_key_secret = self._load_api_key_secret()
         self._init_users_table()
 
+    def _load_api_key_secret(self) -> bytes:
+        """获取计算 api_key_id 的服务端密钥（首次启动时生成并保存到数据库）"""
+        secret = self.db.get_config("api_key_secret")
+        if not secret:
+            secret = secrets.token_hex(32)
+            self.db.set_config("api_key_secret", secret)
+        return bytes.fromhex(secret)
+
     def _init_users_table(self):
         """初始化用户表"""
         with self.db.get_connection() as conn:
+            # 建表、迁移在同一个写事务内完成，只获取一次写锁
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
             cursor = conn.cursor()
 
             # 创建用户表
@@ -49,17 +158,91 @@ class UserManager:
                 )
             """)
 
-            # 创建索引
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_username ON users(username)")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_api_key ON users(api_key)")
+            cursor.execute("PRAGMA table_info(users)")
+            existing_columns = {row[1] for row in cursor.fetchall()}
+            for column, ddl in (("api_key_id", "BLOB"), ("config_json", "TEXT"), ("config_updated_at", "TEXT")):
+                if column not in existing_columns:
+                    cursor.execute(f"ALTER TABLE users ADD COLUMN {column} {ddl}")
+
+            # API密钥按定长 MAC 查找，旧数据补齐 api_key_id
+            cursor.execute("SELECT user_id, api_key FROM users WHERE api_key_id IS NULL")
+            missing = [(self._api_key_id(row["api_key"]), row["user_id"]) for row in cursor.fetchall()]
+            if missing:
+                cursor.executemany("UPDATE users SET api_key_id = ? WHERE user_id = ?", missing)
+                logger.info(f"已为 {len(missing)} 个用户生成 api_key_id")
+
+            # 创建索引（username、api_key 的 UNIQUE 约束已自带索引，删除旧版本重复建立的索引）
+            cursor.execute("DROP INDEX IF EXISTS idx_users_username")
+            cursor.execute("DROP INDEX IF EXISTS idx_users_api_key")
+            cursor.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_api_key_id ON users(api_key_id)")
             cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_configs_user_id ON user_configs(user_id)")
 
+            self._migrate_user_configs(cursor)
+
             conn.commit()
             logger.info("用户表初始化完成")
 
-    def _hash_password(self, password: str) -> str:
-        """密码哈希"""
-        return hashlib.sha256(password.encode('utf-8')).hexdigest()
+    def _migrate_user_configs(self, cursor):
+        """将旧版按键分行存储的 user_configs 合并为 users.config_json 单列"""
+        cursor.execute("""
+            SELECT c.user_id, c.config_key, c.config_value, c.updated_at
+            FROM user_configs c JOIN users u ON u.user_id = c.user_id
+            WHERE u.config_json IS NULL
+            ORDER BY c.user_id
+        """)
+        configs: Dict[str, Dict[str, Any]] = {}
+        updated: Dict[str, str] = {}
+        for row in cursor.fetchall():
+            config = configs.setdefault(row["user_id"], {})
+            value = _decode_legacy_config_value(row["config_value"])
+            # 解析配置键 (例如: pan123.client_id)
+            parts = row["config_key"].split(".", 1)
+            if len(parts) == 2:
+                config.setdefault(parts[0], {})[parts[1]] = value
+            else:
+                config[row["config_key"]] = value
+            updated[row["user_id"]] = max(updated.get(row["user_id"], ""), row["updated_at"])
+        if not configs:
+            return
+
+        cursor.executemany(_SET_USER_CONFIG_SQL, [
+            (json.dumps(config, ensure_ascii=False), updated[user_id], user_id)
+            for user_id, config in configs.items()
+        ])
+        cursor.executemany(_DELETE_USER_CONFIGS_SQL, [(user_id,) for user_id in configs])
+        logger.info(f"已将 {len(configs)} 个用户的配置迁移为单列 JSON")
+
+    def _hash_password(self, password: str, salt: Optional[bytes] = None) -> str:
+        """密码哈希（scrypt 加盐），返回 "盐$哈希" 的十六进制形式"""
+        if salt is None:
+            salt = secrets.token_bytes(16)
+        digest = hashlib.scrypt(
+            password.encode('utf-8'), salt=salt,
+            n=_SCRYPT_N, r=_SCRYPT_R, p=_SCRYPT_P, dklen=_SCRYPT_DKLEN
+        )
+        return f"{salt.hex()}${digest.hex()}"
+
+    def _verify_password(self, password: str, stored_hash: str) -> bool:
+        """验证密码（常量时间比较），兼容旧版无盐 SHA-256 哈希"""
+        if "$" not in stored_hash:
+            legacy = hashlib.sha256(password.encode('utf-8')).hexdigest()
+            return hmac.compare_digest(legacy, stored_hash)
+        salt_hex, _ = stored_hash.split("$", 1)
+        try:
+            salt = bytes.fromhex(salt_hex)
+        except ValueError:
+            return False
+        return hmac.compare_digest(self._hash_password(password, salt), stored_hash)
+
+    def _api_key_id(self, api_key: str) -> bytes:
+        """API密钥的定长标识（服务端密钥的 BLAKE2 MAC），用于索引查找和缓存键"""
+        return hashlib.blake2b(api_key.encode('utf-8'), digest_size=16, key=self._api_key_secret).digest()
+
+    def _invalidate_api_key_cache(self, user_id: str):
+        """移除某个用户的API密钥缓存（可能在线程池中调用，先复制条目再删除）"""
+        for key, (user, _) in list(self._api_key_cache.items()):
+            if user["user_id"] == user_id:
+                self._api_key_cache.pop(key, None)
 
     def _generate_api_key(self) -> str:
         """生成API密钥"""
@@ -67,40 +250,31 @@ class UserManager:
 
     def register_user(self, username: str, password: str) -> Dict[str, Any]:
         """注册用户"""
-        # 检查用户名是否已存在
+        # 生成用户ID和API密钥（一次取 48 字节随机数再切分，与 token_urlsafe(16)/token_urlsafe(32) 格式相同）
+        buf = secrets.token_bytes(48)
+        user_id = base64.urlsafe_b64encode(buf[:16]).rstrip(b"=").decode()
+        api_key = base64.urlsafe_b64encode(buf[16:]).rstrip(b"=").decode()
+        password_hash = self._hash_password(password)
+        now = _now_iso()
+
+        # 创建用户和默认配置在同一个事务内完成；用户名冲突由数据库判断，避免先查后插的竞争
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT user_id FROM users WHERE username = ?", (username,))
-            if cursor.fetchone():
+            cursor.execute(_INSERT_USER_SQL, (user_id, username, password_hash, api_key, self._api_key_id(api_key), now))
+            if cursor.fetchone() is None:
                 return {
                     "success": False,
                     "message": "用户名已存在"
                 }
 
-        # 生成用户ID和API密钥
-        user_id = secrets.token_urlsafe(16)
-        api_key = self._generate_api_key()
-        password_hash = self._hash_password(password)
-        now = datetime.now().isoformat()
-
-        # 创建用户
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT INTO users (user_id, username, password_hash, api_key, created_at)
-                VALUES (?, ?, ?, ?, ?)
-            """, (user_id, username, password_hash, api_key, now))
-
-            conn.commit()
+            # 创建默认配置（复制全局配置）
+            self._init_user_config(user_id)
             logger.info(f"用户注册成功: {username}")
 
-        # 创建默认配置（复制全局配置）
-        self._init_user_config(user_id)
-
-        # 为用户添加日志handler
+        # 为用户添加日志handler（后台创建，不阻塞注册请求）
         try:
-            from api.user_logger import add_user_log_handler
-            add_user_log_handler(user_id)
+            from api.user_logger import add_user_log_handler_background
+            add_user_log_handler_background(user_id)
             user_logger = logger.bind(user_id=user_id)
             user_logger.info(f"用户 {username} (ID: {user_id}) 注册成功")
         except Exception as e:
@@ -119,43 +293,47 @@ class UserManager:
             cursor = conn.cursor()
 
             # 先检查用户是否存在
-            cursor.execute("""
-                SELECT user_id, username, password_hash, api_key, is_active
-                FROM users
-                WHERE username = ?
-            """, (username,))
+            cursor.execute(_GET_USER_BY_NAME_SQL, (username,))
 
             row = cursor.fetchone()
 
             if not row:
+                # 执行一次同等代价的哈希计算，使耗时与用户存在时一致
+                hmac.compare_digest(
+                    hashlib.scrypt(password.encode('utf-8'), salt=_DUMMY_SALT,
+                                   n=_SCRYPT_N, r=_SCRYPT_R, p=_SCRYPT_P, dklen=_SCRYPT_DKLEN),
+                    _DUMMY_HASH
+                )
                 logger.warning(f"登录失败: 用户不存在 - {username}")
                 return {"success": False, "error": "user_not_found", "message": "用户不存在"}
 
+            # 被禁用的用户同样先验证密码，耗时与正常登录一致
+            password_ok = self._verify_password(password, row["password_hash"])
+
             # 检查用户是否被禁用
             if not row["is_active"]:
                 logger.warning(f"登录失败: 用户已被禁用 - {username}")
                 return {"success": False, "error": "user_disabled", "message": "用户已被禁用"}
 
             # 验证密码
-            password_hash = self._hash_password(password)
-            if password_hash != row["password_hash"]:
+            if not password_ok:
                 logger.warning(f"登录失败: 密码错误 - {username}")
                 return {"success": False, "error": "wrong_password", "message": "密码错误"}
 
-            # 更新最后登录时间
-            now = datetime.now().isoformat()
-            cursor.execute(
-                "UPDATE users SET last_login = ? WHERE user_id = ?",
-                (now, row["user_id"])
-            )
-            conn.commit()
+            # 最后登录时间交给后台任务批量写入，登录请求不等待写库
+            with self._pending_last_login_lock:
+                self._pending_last_login[row["user_id"]] = _now_iso()
+            # 旧版 SHA-256 哈希在登录成功后升级为 scrypt
+            if "$" not in row["password_hash"]:
+                cursor.execute(_UPDATE_PASSWORD_HASH_SQL, (self._hash_password(password), row["user_id"]))
+                conn.commit()
 
             logger.info(f"用户登录成功: {username}")
 
-            # 确保用户日志handler存在，并记录登录日志
+            # 确保用户日志handler存在（后台创建，不阻塞登录请求），并记录登录日志
             try:
-                from api.user_logger import add_user_log_handler
-                add_user_log_handler(row["user_id"])
+                from api.user_logger import add_user_log_handler_background
+                add_user_log_handler_background(row["user_id"])
                 user_logger = logger.bind(user_id=row["user_id"])
                 user_logger.info(f"用户 {username} 登录成功")
             except Exception as e:
@@ -168,43 +346,76 @@ class UserManager:
                 "api_key": row["api_key"]
             }
 
+    def flush_last_login(self) -> bool:
+        """将待写入的最后登录时间一次 executemany 写入数据库"""
+        with self._pending_last_login_lock:
+            pending, self._pending_last_login = self._pending_last_login, {}
+        if not pending:
+            return True
+        try:
+            with self.db.get_connection() as conn:
+                conn.executemany(_UPDATE_LAST_LOGIN_SQL, [(now, user_id) for user_id, now in pending.items()])
+            return True
+        except Exception as e:
+            logger.error(f"写入最后登录时间失败: {e}")
+            # 放回待写入队列，不覆盖期间产生的更新时间
+            with self._pending_last_login_lock:
+                for user_id, now in pending.items():
+                    self._pending_last_login.setdefault(user_id, now)
+            return False
+
+    async def run_flusher(self):
+        """后台定期写入最后登录时间，将并发登录的写操作合并为少量事务"""
+        try:
+            while True:
+                await asyncio.sleep(self.LAST_LOGIN_FLUSH_INTERVAL)
+                # 在线程池中写库，避免磁盘 I/O 阻塞事件循环
+                await asyncio.to_thread(self.flush_last_login)
+        finally:
+            self.flush_last_login()
+
     def get_user_by_api_key(self, api_key: str) -> Optional[Dict[str, Any]]:
-        """通过API密钥获取用户"""
+        """通过API密钥获取用户（验证结果缓存 API_KEY_CACHE_TTL 秒）"""
+        key_id = self._api_key_id(api_key)
+        entry = self._api_key_cache.get(key_id)
+        if entry is not None:
+            if entry[1] > time.monotonic():
+                self._api_key_cache.move_to_end(key_id)
+                return dict(entry[0])
+            del self._api_key_cache[key_id]
+
+        # 按定长 MAC 查找，再用常量时间比较确认完整密钥，避免按密钥前缀比较带来的时间差
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT user_id, username, is_active
-                FROM users
-                WHERE api_key = ? AND is_active = 1
-            """, (api_key,))
+            cursor.execute(_GET_USER_BY_API_KEY_ID_SQL, (key_id,))
 
             row = cursor.fetchone()
-            return dict(row) if row else None
+        if not row or not hmac.compare_digest(row["api_key"].encode('utf-8'), api_key.encode('utf-8')):
+            return None
+
+        user = {"user_id": row["user_id"], "username": row["username"], "is_active": row["is_active"]}
+        self._api_key_cache[key_id] = (user, time.monotonic() + self.API_KEY_CACHE_TTL)
+        if len(self._api_key_cache) > self.API_KEY_CACHE_SIZE:
+            self._api_key_cache.popitem(last=False)
+        return dict(user)
 
     def regenerate_api_key(self, user_id: str, password: str) -> Optional[Dict[str, Any]]:
         """重新生成API密钥"""
         # 验证密码
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
-            password_hash = self._hash_password(password)
-
-            cursor.execute("""
-                SELECT user_id, username FROM users
-                WHERE user_id = ? AND password_hash = ?
-            """, (user_id, password_hash))
+            cursor.execute(_GET_USER_PASSWORD_SQL, (user_id,))
 
             row = cursor.fetchone()
-            if not row:
+            if not row or not self._verify_password(password, row["password_hash"]):
                 return None
 
             # 生成新的API密钥
             new_api_key = self._generate_api_key()
 
-            cursor.execute(
-                "UPDATE users SET api_key = ? WHERE user_id = ?",
-                (new_api_key, user_id)
-            )
+            cursor.execute(_UPDATE_API_KEY_SQL, (new_api_key, self._api_key_id(new_api_key), user_id))
             conn.commit()
+            self._invalidate_api_key_cache(user_id)
 
             logger.info(f"用户 {row['username']} 重新生成API密钥")
 
@@ -218,102 +429,91 @@ class UserManager:
         """获取所有用户（管理员功能）"""
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT user_id, username, created_at, last_login, is_active
-                FROM users
-                ORDER BY created_at DESC
-            """)
-            rows = cursor.fetchall()
-            return [dict(row) for row in rows]
+            # 返回普通元组，按预先确定的列名构造 dict，省去逐行 sqlite3.Row 转换
+            cursor.row_factory = None
+            cursor.execute(_LIST_USERS_SQL)
+            return [dict(zip(_USER_SUMMARY_COLS, row)) for row in cursor.fetchall()]
 
     def _init_user_config(self, user_id: str):
-        """初始化用户配置（从全局配置复制）"""
+        """初始化用户配置（从全局配置复制）
+
+        在外层 get_connection 中调用时复用同一连接和事务，由外层统一提交
+        """
+        self._update_config_json(user_id, self._get_default_config())
+        logger.info(f"用户 {user_id} 默认配置已初始化")
+
+    def _get_default_config(self) -> Dict[str, Any]:
+        """获取新用户的默认配置模板（全局配置去掉不复制的项），全局配置版本变化前复用同一份"""
         from config import get_config_manager
         config_manager = get_config_manager()
-        global_config = config_manager.get().to_dict()
+        cached = self._default_config
+        if cached is not None and cached[0] == config_manager.version:
+            return cached[1]
 
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-            now = datetime.now().isoformat()
-
-            for section_name, section_data in global_config.items():
-                for key, value in section_data.items():
-                    # 跳过 token 相关的配置，这些不应该从全局配置复制
-                    if key in ['access_token', 'token_expires_at']:
-                        continue
+        template = {
+            section_name: {key: value for key, value in section_data.items() if key not in _SKIP_INIT_CONFIG_KEYS}
+            for section_name, section_data in config_manager.get().to_dict().items()
+        }
+        self._default_config = (config_manager.version, template)
+        return template
 
-                    config_key = f"{section_name}.{key}"
-                    cursor.execute("""
-                        INSERT OR REPLACE INTO user_configs (user_id, config_key, config_value, updated_at)
-                        VALUES (?, ?, ?, ?)
-                    """, (user_id, config_key, json.dumps(value) if isinstance(value, (dict, list)) else str(value), now))
+    def reset_user_config(self, user_id: str):
+        """清空用户配置并重新从全局配置初始化"""
+        with self.db.get_connection() as conn:
+            conn.execute(_SET_USER_CONFIG_SQL, (None, _now_iso(), user_id))
+            self._init_user_config(user_id)
 
-            conn.commit()
-            logger.info(f"用户 {user_id} 默认配置已初始化")
+    def _update_config_json(self, user_id: str, config_data: Dict[str, Any]):
+        """读取-合并-写回用户的配置 JSON（单个写事务内完成）"""
+        with self.db.get_connection() as conn:
+            # 先取得写锁，避免并发更新时互相覆盖
+            if not conn.in_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(_GET_USER_CONFIG_SQL, (user_id,)).fetchone()
+            stored = row["config_json"] if row else None
+            config = json.loads(stored) if stored else {}
+            _merge_config(config, config_data)
+            config_json = json.dumps(config, ensure_ascii=False)
+            # 内容未变化（例如原样提交的设置页面）时不写库，也不使配置缓存失效
+            if config_json == stored:
+                return
+            conn.execute(_SET_USER_CONFIG_SQL, (config_json, _now_iso(), user_id))
+            self.config_version += 1
 
     def get_user_config(self, user_id: str) -> Dict[str, Any]:
         """获取用户配置"""
-        config = {}
-
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT config_key, config_value
-                FROM user_configs
-                WHERE user_id = ?
-            """, (user_id,))
-
-            rows = cursor.fetchall()
-
-            for row in rows:
-                try:
-                    # 尝试解析为JSON，失败则直接使用字符串值
-                    try:
-                        value = json.loads(row["config_value"])
-                    except json.JSONDecodeError:
-                        value = row["config_value"]
-
-                    # 解析配置键 (例如: pan123.client_id)
-                    parts = row["config_key"].split(".", 1)
-                    if len(parts) == 2:
-                        section, key = parts
-                        if section not in config:
-                            config[section] = {}
-                        config[section][key] = value
-                    else:
-                        config[row["config_key"]] = value
-                except Exception as e:
-                    logger.warning(f"解析配置值失败: {row['config_key']}, {e}")
-
-        return config
+            cursor.execute(_GET_USER_CONFIG_SQL, (user_id,))
+            row = cursor.fetchone()
+
+        if not row or not row["config_json"]:
+            return {}
+        try:
+            return json.loads(row["config_json"])
+        except json.JSONDecodeError as e:
+            logger.warning(f"解析用户配置失败: {user_id}, {e}")
+            return {}
 
     def update_user_config(self, user_id: str, config_data: Dict[str, Any]) -> bool:
         """更新用户配置"""
-        with self.db.get_connection() as conn:
-            cursor = conn.cursor()
-            now = datetime.now().isoformat()
-
-            for section_name, section_data in config_data.items():
-                for key, value in section_data.items():
-                    config_key = f"{section_name}.{key}"
-                    cursor.execute("""
-                        INSERT OR REPLACE INTO user_configs (user_id, config_key, config_value, updated_at)
-                        VALUES (?, ?, ?, ?)
-                    """, (user_id, config_key, json.dumps(value) if isinstance(value, (dict, list)) else str(value), now))
-
-            conn.commit()
-            logger.info(f"用户 {user_id} 配置已更新")
-            return True
+        self._update_config_json(user_id, config_data)
+        logger.info(f"用户 {user_id} 配置已更新")
+        return True
 
     def delete_user(self, user_id: str) -> bool:
         """删除用户"""
         with self.db.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+            # 先按索引删除旧版配置行，删除用户时外键级联不再需要逐行查找
+            cursor.execute(_DELETE_USER_CONFIGS_SQL, (user_id,))
+            cursor.execute(_DELETE_USER_SQL, (user_id,))
             success = cursor.rowcount > 0
             conn.commit()
 
             if success:
+                self.config_version += 1
+                self._invalidate_api_key_cache(user_id)
                 logger.info(f"用户已删除: {user_id}")
 
             return success
@@ -321,11 +521,14 @@ class UserManager:
 
 # 全局用户管理器实例
 _user_manager: Optional[UserManager] = None
+_user_manager_lock = threading.Lock()
 
 
 def get_user_manager() -> UserManager:
     """获取用户管理器单例"""
     global _user_manager
     if _user_manager is None:
-        _user_manager = UserManager()
+        with _user_manager_lock:
+            if _user_manager is None:
+                _user_manager = UserManager()
     return _user_manager